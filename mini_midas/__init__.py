@@ -1,3 +1,50 @@
-from . import common
-from . import stock_utilities
-from . import plot
+"""
+submodules are imported on first attribute access, so `import mini_midas` stays cheap and
+a data collector never pays for matplotlib, which only plot pulls in
+
+    import mini_midas
+    mini_midas.stock_utilities.start_monitoring_tickers(['tsla'])  # imports stock_utilities here
+"""
+import importlib
+
+
+SUBMODULES = (
+    'market_calendar',
+    'common',
+    'metrics',
+    'series',
+    'merge',
+    'manifest',
+    'storage_codec',
+    'bar_store',
+    'bar_buffer',
+    'tick_log',
+    'partitioned_writer',
+    'live_feed',
+    'gaps',
+    'loader',
+    'resample',
+    'indicators',
+    'analytics',
+    'response_cache',
+    'stock_utilities',
+    'scheduler',
+    'backfill',
+    'consolidate',
+    'replay',
+    'fake_alphavantage',
+    'benchmark',
+    'plot',
+    'render',
+)
+
+
+def __getattr__(name):
+    if name in SUBMODULES:
+        # import_module binds the submodule on the package, later lookups don't come back here
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(SUBMODULES))
@@ -0,0 +1,291 @@
+"""
+cross-ticker analytics on one shared minute grid
+
+tickers trade different minutes, a minute without a trade has no bar, so every ticker is placed on the
+session minutes of the calendar, missing minutes are forward filled from the last bar and marked in
+`observed`, the result is one (minutes x tickers) float64 matrix read straight out of the bar store
+
+rolling statistics never re-add the window: sums come from prefix sums (cumsum) and a window is the
+difference of two prefixes, so a window of 60 or 6000 minutes costs the same, correlation matrices
+accumulate the cross products block by block between sample points, every row is added once and
+taken out once
+
+    matrix = align(['dal', 'aal', 'ual'], '20200401', '20200430')
+    returns, mask = matrix.returns()
+    ends, corr = rolling_correlation(returns, mask, window=390, every=390)    # one matrix a day
+    spread = pair_spreads(matrix, [('dal', 'aal')], window=120)
+    spread["zscore"][-1]
+"""
+import datetime
+import numpy as np
+import excalibur
+import mini_midas
+
+
+LOG_INSTANCE = excalibur.logger.getlogger_debug()
+
+# related names of the default tickers
+GROUPS = {
+    "airlines": ['dal', 'aal', 'ual'],
+    "gold": ['iau', 'gld'],
+    "chips": ['nvda', 'intc', 'amd'],
+}
+
+
+def session_grid(start_date, end_date) -> np.ndarray:
+    """
+    every session minute from start_date to end_date, both "%Y%m%d" and inclusive, half days are shorter
+    """
+    first = datetime.datetime.strptime(start_date, "%Y%m%d").date()
+    last = datetime.datetime.strptime(end_date, "%Y%m%d").date()
+    sessions = mini_midas.market_calendar.CALENDAR.sessions_between(first, last)
+    if not sessions:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate([
+        np.arange(mini_midas.gaps.to_minute(session_open), mini_midas.gaps.to_minute(session_close), dtype=np.int64)
+        for _, session_open, session_close in sessions
+    ])
+
+
+def forward_fill(values, observed) -> np.ndarray:
+    """
+    every cell takes the last observed value of its column above it, NaN before the first one
+    """
+    rows = np.where(observed, np.arange(len(values))[:, None], -1)
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    filled = values[np.maximum(rows, 0), np.arange(values.shape[1])]
+    filled[rows < 0] = np.nan
+    return filled
+
+
+class AlignedMatrix:
+    """
+    values of many tickers on one minute grid, rows are minutes and columns tickers,
+    observed is True where the ticker had a bar that minute, values are forward filled in between
+    """
+
+    def __init__(self, tickers, minutes, values, observed):
+        self.tickers = list(tickers)
+        self.minutes = minutes
+        self.values = values
+        self.observed = observed
+        self.columns = {ticker: index for index, ticker in enumerate(self.tickers)}
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def valid(self) -> np.ndarray:
+        # forward filled, only the minutes before a ticker's first bar are missing
+        return ~np.isnan(self.values)
+
+    @property
+    def time(self) -> np.ndarray:
+        return self.minutes.astype('datetime64[m]')
+
+    def column(self, ticker) -> np.ndarray:
+        return self.values[:, self.columns[ticker]]
+
+    def day_starts(self) -> np.ndarray:
+        """
+        True on the first minute of every day of the grid
+        """
+        days = self.minutes // mini_midas.series.MINUTES_PER_DAY
+        starts = np.ones(len(days), dtype=bool)
+        starts[1:] = days[1:] != days[:-1]
+        return starts
+
+    def returns(self, horizon=1, overnight=False) -> (np.ndarray, np.ndarray):
+        """
+        log returns over `horizon` minutes of the grid and where they are defined,
+        returns reaching back into the previous day are left out unless overnight
+        """
+        log_values = np.log(self.values)
+        returns = np.zeros_like(log_values)
+        mask = np.zeros(log_values.shape, dtype=bool)
+        if horizon >= len(log_values):
+            return returns, mask
+        returns[horizon:] = log_values[horizon:] - log_values[:-horizon]
+        mask[horizon:] = np.isfinite(returns[horizon:])
+        if not overnight:
+            days = self.minutes // mini_midas.series.MINUTES_PER_DAY
+            mask[horizon:] &= (days[horizon:] == days[:-horizon])[:, None]
+        returns[~mask] = 0.0
+        return returns, mask
+
+
+def align(tickers, start_date, end_date, column='close', grid=None) -> AlignedMatrix:
+    """
+    one column of every ticker's stored bars on the session grid, bars off the grid (extended hours) are dropped
+    """
+    minutes = session_grid(start_date, end_date) if grid is None else grid
+    values = np.full((len(minutes), len(tickers)), np.nan)
+    observed = np.zeros((len(minutes), len(tickers)), dtype=bool)
+    for index, ticker in enumerate(tickers):
+        bars = mini_midas.bar_store.read_range(ticker, start_date, end_date)
+        if not len(bars):
+            LOG_INSTANCE.warning("No bars of %s between %s and %s", ticker, start_date, end_date)
+            continue
+        rows = np.searchsorted(minutes, bars.minute)
+        on_grid = rows < len(minutes)
+        on_grid[on_grid] = minutes[rows[on_grid]] == bars.minute[on_grid]
+        values[rows[on_grid], index] = getattr(bars, column)[on_grid]
+        observed[rows[on_grid], index] = True
+    return AlignedMatrix(tickers, minutes, forward_fill(values, observed), observed)
+
+
+def window_sums(x, window) -> np.ndarray:
+    """
+    sum of the last `window` rows at every row (fewer at the start), from one prefix sum along axis 0
+    """
+    prefix = np.zeros((len(x) + 1,) + x.shape[1:], dtype=np.float64)
+    np.cumsum(x, axis=0, out=prefix[1:])
+    lagged = np.maximum(np.arange(1, len(x) + 1) - window, 0)
+    return prefix[1:] - prefix[lagged]
+
+
+def rolling_mean_std(x, mask, window, min_periods=2) -> (np.ndarray, np.ndarray):
+    """
+    mean and standard deviation of the valid values in the window ending at every row, NaN with too few of them
+    """
+    x = np.where(mask, x, 0.0)
+    # centered per column, the prefix sums stay small and the variance doesn't cancel out
+    counts_total = np.maximum(mask.sum(axis=0), 1)
+    center = x.sum(axis=0) / counts_total
+    centered = np.where(mask, x - center, 0.0)
+    count = window_sums(mask.astype(np.float64), window)
+    total = window_sums(centered, window)
+    total_squares = window_sums(centered * centered, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+        variance = np.maximum(total_squares / count - mean * mean, 0.0) * count / (count - 1)
+        std = np.sqrt(variance)
+    short = count < min_periods
+    mean[short] = np.nan
+    std[short] = np.nan
+    return mean + center, std
+
+
+def zscore(x, mask, window, min_periods=2) -> np.ndarray:
+    mean, std = rolling_mean_std(x, mask, window, min_periods)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scores = (x - mean) / std
+    scores[~mask] = np.nan
+    return scores
+
+
+def rolling_correlation(returns, mask, window, every=1, min_periods=2) -> (np.ndarray, np.ndarray):
+    """
+    correlation matrix of the columns over the window ending at every `every`-th row counted back from the last,
+    returns (last row of each window, (windows x tickers x tickers) correlations)
+
+    pairs only use rows where both are valid, from four running products: x'x, x'm, (x*x)'m and m'm,
+    they are advanced block by block between window edges and a window is the difference of its two ends,
+    only the snapshots at starts of windows still to come are kept, about window / every of them
+    """
+    rows, tickers = returns.shape
+    ends = np.arange(rows, min(window, rows) - 1, -every)[::-1] if rows else np.empty(0, dtype=np.int64)
+    correlations = np.empty((len(ends), tickers, tickers))
+    if not len(ends):
+        return ends, correlations
+    starts = np.maximum(ends - window, 0)
+    x = np.where(mask, returns, 0.0)
+    m = mask.astype(np.float64)
+    x_squared = x * x
+
+    running = [np.zeros((tickers, tickers)) for _ in range(4)]
+    snapshots = {0: [product.copy() for product in running]}
+    window_of_end = {int(end): index for index, end in enumerate(ends)}
+    needed_starts = set(int(start) for start in starts)
+    previous = 0
+    for point in np.unique(np.concatenate((starts, ends))):
+        point = int(point)
+        block = slice(previous, point)
+        running[0] += x[block].T @ x[block]
+        running[1] += x[block].T @ m[block]
+        running[2] += x_squared[block].T @ m[block]
+        running[3] += m[block].T @ m[block]
+        previous = point
+        if point in needed_starts and point not in snapshots:
+            snapshots[point] = [product.copy() for product in running]
+        index = window_of_end.get(point)
+        if index is None:
+            continue
+
+        cross, sum_x, sum_squares, count = (
+            upper - lower for upper, lower in zip(running, snapshots.pop(int(starts[index]))))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # sum_x[i, j] sums column i over rows where both are valid, its transpose is column j's sum
+            covariance = cross / count - sum_x * sum_x.T / (count * count)
+            variance_x = sum_squares / count - (sum_x / count) ** 2
+            correlation = covariance / np.sqrt(variance_x * variance_x.T)
+        correlation[count < min_periods] = np.nan
+        correlations[index] = np.clip(correlation, -1.0, 1.0)
+    return ends - 1, correlations
+
+
+def pair_spreads(matrix, pairs, window, hedge=False, min_periods=2) -> dict:
+    """
+    log price spread of every (a, b) pair and its rolling z-score, (minutes x pairs) arrays,
+    with hedge the spread is log a - beta * log b, beta the rolling regression slope of the window
+    """
+    log_values = np.log(matrix.values)
+    valid = matrix.valid
+    left = np.array([matrix.columns[a] for a, _ in pairs], dtype=np.int64)
+    right = np.array([matrix.columns[b] for _, b in pairs], dtype=np.int64)
+    log_a, log_b = log_values[:, left], log_values[:, right]
+    both = valid[:, left] & valid[:, right]
+
+    beta = np.ones(log_a.shape)
+    if hedge:
+        # centered, sums of log prices over months would swamp a window's variance
+        center_a = np.nanmean(np.where(both, log_a, np.nan), axis=0)
+        center_b = np.nanmean(np.where(both, log_b, np.nan), axis=0)
+        a = np.where(both, log_a - center_a, 0.0)
+        b = np.where(both, log_b - center_b, 0.0)
+        count = window_sums(both.astype(np.float64), window)
+        sum_a, sum_b = window_sums(a, window), window_sums(b, window)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            covariance = window_sums(a * b, window) / count - sum_a * sum_b / (count * count)
+            variance_b = window_sums(b * b, window) / count - (sum_b / count) ** 2
+            beta = covariance / variance_b
+        beta[(count < min_periods) | ~np.isfinite(beta)] = np.nan
+
+    spread = log_a - beta * log_b
+    spread_mask = both & np.isfinite(spread)
+    return {
+        "pairs": list(pairs),
+        "spread": np.where(spread_mask, spread, np.nan),
+        "beta": beta,
+        "zscore": zscore(np.where(spread_mask, spread, 0.0), spread_mask, window, min_periods),
+    }
+
+
+def group_pairs(tickers) -> list:
+    return [(a, b) for index, a in enumerate(tickers) for b in tickers[index + 1:]]
+
+
+def analyze_groups(start_date, end_date, groups=None, window=60) -> dict:
+    """
+    latest correlations and spread z-scores inside every group of related tickers
+    """
+    groups = GROUPS if groups is None else groups
+    tickers = sorted({ticker for members in groups.values() for ticker in members})
+    matrix = align(tickers, start_date, end_date)
+    returns, mask = matrix.returns()
+    _, correlations = rolling_correlation(returns, mask, window, every=max(len(returns), 1))
+    latest = correlations[-1] if len(correlations) else np.full((len(tickers), len(tickers)), np.nan)
+
+    summary = {}
+    for name, members in groups.items():
+        pairs = group_pairs(members)
+        spreads = pair_spreads(matrix, pairs, window)
+        summary[name] = {
+            f"{a}/{b}": {
+                "correlation": float(latest[matrix.columns[a], matrix.columns[b]]),
+                "zscore": float(spreads["zscore"][-1, index]) if len(matrix.minutes) else float('nan'),
+            }
+            for index, (a, b) in enumerate(pairs)
+        }
+    return summary
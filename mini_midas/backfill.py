@@ -0,0 +1,220 @@
+"""
+parallel resumable historical backfill
+
+pulls one full month of 1 minute bars per api call (TIME_SERIES_INTRADAY with month and outputsize=full),
+which is the fewest calls alphavantage allows, for every ticker of a universe over a date range
+
+all workers share one token bucket and one http session, finished months are recorded in a checkpoint
+manifest so a killed run picks up where it stopped, months whose trading days are already in the
+bar store are skipped without spending a call
+
+    engine = BackfillEngine(['tsla', 'aapl'], '20200101', '20200630')
+    engine.run()
+"""
+import collections
+import concurrent.futures
+import datetime
+import json
+import os
+import pathlib
+import threading
+import time
+import excalibur
+import mini_midas
+
+
+LOG_INSTANCE = excalibur.logger.getlogger_debug()
+
+
+def months_between(start_date, end_date) -> list:
+    """
+    "YYYY-MM" of every month touched by "%Y%m%d" start_date to end_date
+    """
+    year, month = int(start_date[:4]), int(start_date[4:6])
+    end_year, end_month = int(end_date[:4]), int(end_date[4:6])
+    months = []
+    while (year, month) <= (end_year, end_month):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def to_date(date_str) -> datetime.date:
+    return datetime.datetime.strptime(date_str, "%Y%m%d").date()
+
+
+class BackfillManifest:
+    """
+    checkpoint of finished (ticker, month) jobs, saved atomically after every job
+    """
+
+    def __init__(self, path=None):
+        self.path = path or f"{mini_midas.common.DATA_STORAGE_PATH}/backfill/manifest.json"
+        self.lock = threading.Lock()
+        self.done = collections.defaultdict(set)
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as fil:
+                for ticker, months in json.load(fil).get("done", {}).items():
+                    self.done[ticker].update(months)
+
+    def is_done(self, ticker, month) -> bool:
+        with self.lock:
+            return month in self.done[ticker]
+
+    def mark_done(self, ticker, month):
+        with self.lock:
+            self.done[ticker].add(month)
+            payload = {"done": {tick: sorted(months) for tick, months in self.done.items()}}
+            pathlib.Path(os.path.dirname(self.path)).mkdir(parents=True, exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w') as fil:
+                json.dump(payload, fil)
+            os.replace(temp_path, self.path)
+
+
+class BackfillEngine:
+    """
+    backfills minute bars of tickers from start_date to end_date, both "%Y%m%d" and inclusive
+    """
+    # share of a session's minutes a stored day needs to count as already backfilled
+    DAY_COVERAGE = 0.9
+    MAX_ATTEMPTS = 5
+    THROTTLE_BACKOFF = 60.0
+
+    def __init__(self, tickers, start_date, end_date, rate_limiter=None, session=None, token=None,
+                 max_workers=4, manifest=None):
+        self.tickers = list(tickers)
+        self.start_date = start_date
+        self.end_date = end_date
+        self.rate_limiter = rate_limiter if rate_limiter is not None else mini_midas.scheduler.TokenBucket()
+        self.session = session if session is not None else mini_midas.scheduler.make_session(max_workers)
+        self.token = token if token else mini_midas.common.read_api_token()
+        self.max_workers = max_workers
+        self.manifest = manifest if manifest is not None else BackfillManifest()
+        self.base_url = mini_midas.common.BASE_URL
+        self.stats = collections.Counter()
+        self.stats_lock = threading.Lock()
+
+    def count(self, key, value=1):
+        with self.stats_lock:
+            self.stats[key] += value
+
+    def trading_days(self, month, whole_month=False) -> list:
+        """
+        trading days of a month that fall inside the requested range, or all of them with whole_month
+        """
+        year, month_number = int(month[:4]), int(month[5:7])
+        first = datetime.date(year, month_number, 1)
+        last = datetime.date(year + month_number // 12, month_number % 12 + 1, 1) - datetime.timedelta(days=1)
+        if not whole_month:
+            first, last = max(first, to_date(self.start_date)), min(last, to_date(self.end_date))
+        return mini_midas.market_calendar.CALENDAR.sessions_between(first, last)
+
+    def is_day_on_disk(self, ticker, session) -> bool:
+        day, session_open, session_close = session
+        path = mini_midas.bar_store.get_day_file_path(ticker, day.strftime("%Y%m%d"))
+        if not os.path.exists(path):
+            return False
+        session_minutes = (session_close - session_open).total_seconds() / 60
+        return mini_midas.bar_store.read_header(path) >= session_minutes * self.DAY_COVERAGE
+
+    def is_month_finished(self, month) -> bool:
+        """
+        a month still being traded is never checkpointed, the next run has to pull it again
+        """
+        today = mini_midas.market_calendar.now_eastern().date()
+        return month < today.strftime("%Y-%m")
+
+    def needs_fetch(self, ticker, month) -> bool:
+        if self.manifest.is_done(ticker, month):
+            return False
+        sessions = self.trading_days(month)
+        if sessions and all(self.is_day_on_disk(ticker, session) for session in sessions):
+            # a range ending mid month only had its own days checked, a wider run still needs the rest
+            if self.is_month_finished(month) and all(
+                    self.is_day_on_disk(ticker, session) for session in self.trading_days(month, whole_month=True)):
+                self.manifest.mark_done(ticker, month)
+            return False
+        return True
+
+    def jobs(self) -> list:
+        """
+        (ticker, month) pairs that still need an api call, months are interleaved across tickers
+        so a partial run leaves every ticker covered up to roughly the same date
+        """
+        pending = []
+        for month in months_between(self.start_date, self.end_date):
+            for ticker in self.tickers:
+                if self.needs_fetch(ticker, month):
+                    pending.append((ticker, month))
+                else:
+                    self.count("skipped")
+        return pending
+
+    def fetch_month(self, ticker, month) -> dict:
+        def fetch():
+            self.rate_limiter.acquire()
+            self.count("api_calls")
+            return mini_midas.response_cache.timed_get(
+                self.session, self.base_url + function_string, "TIME_SERIES_INTRADAY", timeout=120)
+
+        function_string = (
+            f"TIME_SERIES_INTRADAY&symbol={ticker}&interval=1min&month={month}"
+            f"&outputsize=full&apikey={self.token}")
+        key = mini_midas.response_cache.make_key("TIME_SERIES_INTRADAY", ticker, "1min", "full", month)
+        # a month another process just pulled costs neither a token nor an api call
+        return mini_midas.response_cache.CACHE.get(key, fetch)
+
+    def store(self, ticker, json_obj) -> int:
+        """
+        merges every bar of the pulled month into the bar store, the store dedups by minute,
+        days outside the requested range are kept too, the call is paid for and the month is checkpointed whole
+        """
+        bars = mini_midas.series.parse_time_series(json_obj)
+        mini_midas.bar_store.merge_bars(ticker, bars, mini_midas.merge.SOURCE_OFFICIAL)
+        return len(bars)
+
+    def backfill_month(self, job) -> bool:
+        ticker, month = job
+        for attempt in range(1, self.MAX_ATTEMPTS + 1):
+            try:
+                json_obj = self.fetch_month(ticker, month)
+            except Exception as e:
+                LOG_INSTANCE.warning("%s %s fetch failed, attempt %s, error: %s", ticker, month, attempt, str(e))
+                self.count("errors")
+                time.sleep(min(2 ** attempt, self.THROTTLE_BACKOFF))
+                continue
+
+            if "Note" in json_obj or "Information" in json_obj:
+                # throttled, the bucket is out of sync with the server, back off a full window
+                LOG_INSTANCE.warning("%s %s throttled, attempt %s", ticker, month, attempt)
+                self.count("throttled")
+                time.sleep(self.THROTTLE_BACKOFF)
+                continue
+            if "Error Message" in json_obj:
+                LOG_INSTANCE.critical("%s %s rejected: %s", ticker, month, json_obj["Error Message"])
+                self.count("failed")
+                return False
+
+            bar_count = self.store(ticker, json_obj)
+            self.count("bars", bar_count)
+            if self.is_month_finished(month):
+                self.manifest.mark_done(ticker, month)
+            LOG_INSTANCE.info("%s %s backfilled %s bars", ticker, month, bar_count)
+            return True
+
+        self.count("failed")
+        return False
+
+    def run(self) -> collections.Counter:
+        pending = self.jobs()
+        LOG_INSTANCE.info("Backfilling %s ticker months, %s skipped", len(pending), self.stats["skipped"])
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for _ in executor.map(self.backfill_month, pending):
+                pass
+        LOG_INSTANCE.info("Backfill finished: %s", dict(self.stats))
+        return self.stats
+
+
+def backfill(tickers, start_date, end_date, **kwargs):
+    return BackfillEngine(tickers, start_date, end_date, **kwargs).run()
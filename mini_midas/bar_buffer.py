@@ -0,0 +1,113 @@
+"""
+fixed size ring buffer of minute bars
+
+the retriever keeps the day's bars here instead of the nested alphavantage dict,
+appending a tick and reading the latest bar are O(1) and memory is bounded by the capacity,
+when the buffer fills up the oldest half is handed to a spill callback (usually the bar store)
+"""
+import numpy as np
+import mini_midas
+
+
+class BarBuffer:
+    """
+    ring buffer of bars, columns are preallocated numpy arrays
+    """
+    __slots__ = ('capacity', 'spill', 'start', 'count', 'spilled',
+                 'minute', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, capacity=1024, spill=None):
+        """
+        spill: callable receiving the oldest Bars when the buffer is full,
+        without one the oldest bars are dropped
+        """
+        if capacity < 2:
+            raise Exception(f"BarBuffer capacity has to be at least 2, got {capacity}")
+        self.capacity = capacity
+        self.spill = spill
+        self.start = 0
+        self.count = 0
+        self.spilled = 0
+        for name, dtype in mini_midas.series.COLUMN_DTYPES.items():
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.start = 0
+        self.count = 0
+
+    def ordered_index(self, first=0, last=None) -> np.ndarray:
+        """
+        ring positions of the first..last oldest bars
+        """
+        last = self.count if last is None else last
+        return (self.start + np.arange(first, last)) % self.capacity
+
+    def spill_oldest(self):
+        """
+        frees the oldest half of the buffer, amortized O(1) per appended bar
+        """
+        spill_count = self.capacity // 2
+        if self.spill is not None:
+            index = self.ordered_index(last=spill_count)
+            self.spill(mini_midas.series.Bars(**{
+                name: getattr(self, name)[index] for name in mini_midas.series.COLUMNS
+            }))
+        self.spilled += spill_count
+        self.start = (self.start + spill_count) % self.capacity
+        self.count -= spill_count
+
+    def latest_position(self):
+        return (self.start + self.count - 1) % self.capacity
+
+    def append(self, minute, open_price, high_price, low_price, close_price, volume):
+        """
+        appends a bar, a bar of the same minute as the latest one replaces it
+        """
+        if self.count and self.minute[self.latest_position()] == minute:
+            position = self.latest_position()
+        else:
+            if self.count == self.capacity:
+                self.spill_oldest()
+            position = (self.start + self.count) % self.capacity
+            self.count += 1
+
+        self.minute[position] = minute
+        self.open[position] = open_price
+        self.high[position] = high_price
+        self.low[position] = low_price
+        self.close[position] = close_price
+        self.volume[position] = volume
+
+    def extend(self, bars):
+        """
+        appends sorted bars in bulk
+        """
+        for index in range(0, len(bars), self.capacity // 2):
+            chunk = bars.take(slice(index, index + self.capacity // 2))
+            while self.count + len(chunk) > self.capacity:
+                self.spill_oldest()
+            positions = self.ordered_index(self.count, self.count + len(chunk))
+            for name in mini_midas.series.COLUMNS:
+                getattr(self, name)[positions] = getattr(chunk, name)
+            self.count += len(chunk)
+
+    def latest(self) -> dict:
+        """
+        the newest bar as {column: value}
+        """
+        if not self.count:
+            raise Exception("Empty BarBuffer")
+        position = self.latest_position()
+        return {name: getattr(self, name)[position].item() for name in mini_midas.series.COLUMNS}
+
+    def to_bars(self) -> mini_midas.series.Bars:
+        """
+        copies buffered bars out, sorted with one bar per minute
+        """
+        index = self.ordered_index()
+        return mini_midas.series.Bars(**{
+            name: getattr(self, name)[index] for name in mini_midas.series.COLUMNS
+        }).sorted_unique()
@@ -0,0 +1,204 @@
+"""
+columnar bar store
+
+every ticker-day is one uncompressed file of typed columns,
+so readers can numpy.memmap it instead of gunzip + json.loads + float() every bar
+
+file layout, little endian:
+    header, HEADER_SIZE bytes: magic, number of bars
+    minute column: int64 * n
+    open, high, low, close columns: float64 * n each
+    volume column: int64 * n
+    source column: uint8 * n, which feed every bar came from (merge.SOURCE_*), MMBARS01 files have none
+
+    bars = read_range('tsla', '20200401', '20200409')
+    bars.close  # numpy array
+"""
+import contextlib
+import os
+import pathlib
+import struct
+import threading
+import numpy as np
+import excalibur
+import mini_midas
+
+
+LOG_INSTANCE = excalibur.logger.getlogger_debug()
+
+MAGIC = b"MMBARS02"
+# written before bars carried their source, read back as SOURCE_UNKNOWN
+MAGIC_V1 = b"MMBARS01"
+HEADER_FORMAT = "<8sQ"
+HEADER_SIZE = 64
+FILE_SUFFIX = ".bars"
+
+
+def get_day_file_path(ticker, date_str):
+    return f"{mini_midas.common.get_bar_storage_path(ticker)}/{ticker}.{date_str}{FILE_SUFFIX}"
+
+
+@contextlib.contextmanager
+def locked(ticker):
+    """
+    one flock per ticker around every read-merge-write of its days, the writer thread, the scheduler
+    workers and the consolidation processes all merge into the same files
+    """
+    with mini_midas.manifest.locked(mini_midas.common.get_bar_storage_path(ticker)):
+        yield
+
+
+def read_magic_and_count(path) -> (bytes, int):
+    with open(path, 'rb') as fil:
+        magic, bar_count = struct.unpack(HEADER_FORMAT, fil.read(struct.calcsize(HEADER_FORMAT)))
+    if magic not in (MAGIC, MAGIC_V1):
+        raise Exception(f"{path} is not a bar store file")
+    return magic, bar_count
+
+
+def read_header(path) -> int:
+    """
+    returns number of bars stored in the file
+    """
+    return read_magic_and_count(path)[1]
+
+
+def read_file(path) -> mini_midas.series.Bars:
+    """
+    maps every column of a day file read only, nothing is read until the arrays are touched
+    """
+    bar_count = read_header(path)
+    if not bar_count:
+        return mini_midas.series.Bars()
+
+    columns = {}
+    offset = HEADER_SIZE
+    for name in mini_midas.series.COLUMNS:
+        dtype = mini_midas.series.COLUMN_DTYPES[name]
+        columns[name] = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(bar_count,))
+        offset += bar_count * np.dtype(dtype).itemsize
+    return mini_midas.series.Bars(**columns)
+
+
+def read_sources(path) -> np.ndarray:
+    """
+    source of every bar in the file, the column follows volume
+    """
+    magic, bar_count = read_magic_and_count(path)
+    if magic == MAGIC_V1 or not bar_count:
+        return np.full(bar_count, mini_midas.merge.SOURCE_UNKNOWN, dtype=mini_midas.merge.SOURCE_DTYPE)
+    offset = HEADER_SIZE + bar_count * sum(np.dtype(dtype).itemsize for dtype in mini_midas.series.COLUMN_DTYPES.values())
+    return np.memmap(path, dtype=mini_midas.merge.SOURCE_DTYPE, mode='r', offset=offset, shape=(bar_count,))
+
+
+def write_file(path, bars, sources=None):
+    """
+    writes sorted bars, the file is swapped in atomically so a reader never sees half a day
+    """
+    if sources is None:
+        sources = mini_midas.merge.SOURCE_UNKNOWN
+    pathlib.Path(os.path.dirname(path)).mkdir(parents=True, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'wb') as fil:
+        fil.write(struct.pack(HEADER_FORMAT, MAGIC, len(bars)).ljust(HEADER_SIZE, b"\0"))
+        for name in mini_midas.series.COLUMNS:
+            dtype = mini_midas.series.COLUMN_DTYPES[name]
+            fil.write(np.ascontiguousarray(getattr(bars, name), dtype=dtype).tobytes())
+        fil.write(mini_midas.merge.source_array(sources, len(bars)).tobytes())
+    os.replace(temp_path, path)
+
+
+def read_day(ticker, date_str) -> mini_midas.series.Bars:
+    path = get_day_file_path(ticker, date_str)
+    if not os.path.exists(path):
+        return mini_midas.series.Bars()
+    return read_file(path)
+
+
+def read_day_with_sources(ticker, date_str) -> (mini_midas.series.Bars, np.ndarray):
+    path = get_day_file_path(ticker, date_str)
+    if not os.path.exists(path):
+        return mini_midas.series.Bars(), np.empty(0, dtype=mini_midas.merge.SOURCE_DTYPE)
+    return read_file(path), read_sources(path)
+
+
+def list_dates(ticker) -> list:
+    """
+    sorted dates that have a day file for this ticker
+    """
+    storage_path = mini_midas.common.get_bar_storage_path(ticker)
+    if not os.path.isdir(storage_path):
+        return []
+    prefix = f"{ticker}."
+    dates = [
+        file_name[len(prefix):-len(FILE_SUFFIX)] for file_name in os.listdir(storage_path)
+        if file_name.startswith(prefix) and file_name.endswith(FILE_SUFFIX)
+    ]
+    return sorted(dates)
+
+
+def read_range(ticker, start_date, end_date) -> mini_midas.series.Bars:
+    """
+    returns bars of a ticker from start_date to end_date, both "%Y%m%d" and inclusive
+    """
+    days = [
+        read_day(ticker, date_str) for date_str in list_dates(ticker)
+        if start_date <= date_str <= end_date
+    ]
+    return mini_midas.series.concat(days)
+
+
+def merge_bars(ticker, bars, source=None) -> mini_midas.merge.MergeStats:
+    """
+    merges bars into the stored days they belong to, on the same minute the stronger source wins,
+    between equal sources the new bar wins
+    """
+    source = mini_midas.merge.SOURCE_UNKNOWN if source is None else source
+    bars = bars.sorted_unique()
+    stats = mini_midas.merge.MergeStats()
+    with locked(ticker):
+        for date_str, day_bars in bars.days():
+            stored, stored_sources = read_day_with_sources(ticker, date_str)
+            merged, sources, day_stats = mini_midas.merge.merge_runs([(stored, stored_sources), (day_bars, source)])
+            path = get_day_file_path(ticker, date_str)
+            write_file(path, merged, sources)
+            mini_midas.manifest.record_file(ticker, path, merged, mini_midas.manifest.KIND_BARS)
+            stats.add(day_stats)
+    if stats.conflicts:
+        LOG_INSTANCE.debug("%s bar store merge: %s", ticker, stats)
+    return stats
+
+
+def store_time_series(ticker, json_obj, source=None):
+    """
+    stores an alphavantage intraday payload
+    """
+    merge_bars(ticker, mini_midas.series.parse_time_series(json_obj), source)
+
+
+def migrate_tree(root=None):
+    """
+    converts every gzip json file under the storage tree into the bar store,
+    intraday hour files and historical day files of the same ticker-day get merged together
+    """
+    root = root or mini_midas.common.DATA_STORAGE_PATH
+    file_paths = [
+        os.path.join(directory, file_name)
+        for directory, _, file_names in os.walk(root) for file_name in file_names
+        if file_name.endswith(".json.gzip")
+    ]
+    # historical files are full day pulls, apply them after the hourly ones so they win
+    historical_root = os.path.join(root, "historical")
+    file_paths.sort(key=lambda path: (path.startswith(historical_root), path))
+
+    migrated = 0
+    for file_path in file_paths:
+        ticker = os.path.basename(file_path).split(".")[0]
+        try:
+            json_obj = mini_midas.storage_codec.read_json(file_path)
+            store_time_series(ticker, json_obj, mini_midas.manifest.source_of_path(file_path))
+            migrated += 1
+        except Exception as e:
+            LOG_INSTANCE.critical("Unable to migrate %s, error: %s", file_path, str(e))
+    LOG_INSTANCE.info("Migrated %s files into bar store", migrated)
+    return migrated
@@ -0,0 +1,474 @@
+"""
+ingestion benchmarks against the local alphavantage stand-in
+
+every run starts a FakeAlphaVantageServer, points the retrievers at it and stores into a temporary
+data directory, so it never touches the real api quota or ~/data/stock_historical_data
+
+stages:
+    bootstrap: AlphaVantageTickerIntraPriceRetriever.start(), TIME_SERIES_INTRADAY fetch + save
+    enqueue: poll_once() rounds over every ticker, GLOBAL_QUOTE fetch + cache + handing the bar to the writer queue
+    drain: closing the writer, every queued bar appended to its tick log and synced
+    ticks: both together, quotes fetched to bars on disk, the throughput the collector sustains,
+           its percentiles are per bar, from entering the writer queue to the fsync of its tick log
+    compaction: tick logs folded into hourly files and the bar store
+    historical: save_price_only() per ticker, the path secure_ticker_prices takes
+
+codecs are measured on the stored files (or a generated session when there are none), every
+compression/level/encoding writes and reads the same payloads, throughput is in MB of av_json
+
+replay runs whole generated sessions through the live pipeline offline (mini_midas.replay) as fast as it goes,
+quotes are GLOBAL_QUOTE payloads handed to cache_ticker_minute_data, end_of_day is compaction plus the day files
+
+analytics aligns generated months of bars of every ticker on one grid and runs the rolling statistics over them,
+daily correlation matrices of all tickers and z-scored spreads of neighbouring tickers
+
+render draws one chart per ticker of the generated sessions in the worker pool (mini_midas.render), then the
+same report again, every chart is skipped the second time since no bar file changed
+
+import times are measured separately, each target is imported in a fresh interpreter and the data
+collection path has to stay under a time budget without loading any plotting module
+
+    python -m mini_midas.benchmark --tickers 15,100,500
+    python -m mini_midas.benchmark --imports --import-budget 0.5
+    python -m mini_midas.benchmark --codecs [--codec-files ~/data/stock_historical_data]
+    python -m mini_midas.benchmark --replay --tickers 500
+    python -m mini_midas.benchmark --analytics --tickers 100,500 --days 63
+    python -m mini_midas.benchmark --render --tickers 100,500 --days 5
+"""
+import argparse
+import concurrent.futures
+import contextlib
+import datetime
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import mini_midas
+
+
+@contextlib.contextmanager
+def temporary_storage():
+    """
+    points DATA_STORAGE_PATH at a temporary directory for the duration of the block
+    """
+    storage_path = tempfile.mkdtemp(prefix="mini_midas_bench_")
+    original = mini_midas.common.DATA_STORAGE_PATH
+    mini_midas.common.DATA_STORAGE_PATH = storage_path
+    try:
+        yield storage_path
+    finally:
+        mini_midas.common.DATA_STORAGE_PATH = original
+        shutil.rmtree(storage_path, ignore_errors=True)
+
+
+def directory_size(path) -> int:
+    return sum(
+        os.path.getsize(os.path.join(directory, file_name))
+        for directory, _, file_names in os.walk(path) for file_name in file_names
+    )
+
+
+def make_tickers(ticker_count) -> list:
+    return [f"t{index:04d}" for index in range(ticker_count)]
+
+
+def timed_calls(executor, func, items) -> (float, list):
+    """
+    runs func over items in the pool, returns wall time and every call's latency in seconds
+    """
+    def timed(item):
+        started = time.perf_counter()
+        func(item)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = list(executor.map(timed, items))
+    return time.perf_counter() - started, latencies
+
+
+def summarize(stage, ticker_count, operations, wall_time, latencies, bytes_written) -> dict:
+    """
+    percentiles are None for stages timed as a whole, there is no latency per operation to rank
+    """
+    percentiles = np.percentile(latencies, [50, 90, 99]) * 1000 if latencies else [None, None, None]
+    return {
+        "stage": stage,
+        "tickers": ticker_count,
+        "operations": operations,
+        "ops_per_second": operations / wall_time if wall_time else 0.0,
+        "p50_ms": percentiles[0],
+        "p90_ms": percentiles[1],
+        "p99_ms": percentiles[2],
+        "bytes_written": bytes_written,
+    }
+
+
+def bench_ingestion(ticker_count, rounds=5, workers=16, latency=0.0, error_rate=0.0) -> list:
+    """
+    runs every stage for ticker_count tickers, returns one summary dict per stage
+    """
+    tickers = make_tickers(ticker_count)
+    results = []
+    with mini_midas.fake_alphavantage.FakeAlphaVantageServer(latency=latency, error_rate=error_rate) as server:
+        session = mini_midas.scheduler.make_session(workers)
+        response_cache = mini_midas.response_cache.ResponseCache(ttls={}, use_disk=False)
+        sync_latencies = []
+        writer = mini_midas.partitioned_writer.PartitionedWriter(on_synced=sync_latencies.extend)
+
+        def create_retriever(ticker):
+            # no ttls, every call measured has to reach the server
+            retriever = mini_midas.stock_utilities.AlphaVantageTickerIntraPriceRetriever(
+                ticker, session=session, token="bench", response_cache=response_cache, writer=writer)
+            retriever.BASE_URL = server.base_url
+            return retriever
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            with temporary_storage() as storage_path:
+                retrievers = list(executor.map(create_retriever, tickers))
+
+                wall_time, latencies = timed_calls(executor, lambda retriever: retriever.start(), retrievers)
+                results.append(summarize(
+                    "bootstrap", ticker_count, len(retrievers), wall_time, latencies, directory_size(storage_path)))
+
+                bytes_before = directory_size(storage_path)
+                ticks = len(retrievers) * rounds
+                # a call returns once its bar is queued, the latencies stop there
+                enqueue_time, latencies = timed_calls(
+                    executor, lambda retriever: retriever.poll_once(), retrievers * rounds)
+                results.append(summarize("enqueue", ticker_count, ticks, enqueue_time, latencies, 0))
+                # what the pollers enqueued is on disk once the writer is closed
+                started = time.perf_counter()
+                writer.close()
+                drain_time = time.perf_counter() - started
+                bytes_written = directory_size(storage_path) - bytes_before
+                results.append(summarize("drain", ticker_count, ticks, drain_time, [], bytes_written))
+                results.append(summarize(
+                    "ticks", ticker_count, ticks, enqueue_time + drain_time, sync_latencies, bytes_written))
+
+                bytes_before = directory_size(storage_path)
+                logs = mini_midas.tick_log.list_logs()
+                wall_time, latencies = timed_calls(
+                    executor, lambda log: mini_midas.tick_log.compact_log(*log), logs)
+                results.append(summarize(
+                    "compaction", ticker_count, len(logs), wall_time, latencies,
+                    directory_size(storage_path) - bytes_before))
+                # bench tickers' live feeds would otherwise stay in shared memory
+                for retriever in retrievers:
+                    retriever.close_feed()
+                    mini_midas.live_feed.unlink(retriever.ticker)
+
+            with temporary_storage() as storage_path:
+                retrievers = list(executor.map(create_retriever, tickers))
+                wall_time, latencies = timed_calls(
+                    executor, lambda retriever: retriever.save_price_only(), retrievers)
+                results.append(summarize(
+                    "historical", ticker_count, len(retrievers), wall_time, latencies, directory_size(storage_path)))
+
+    return results
+
+
+def make_replay_source(root, tickers, session_date):
+    """
+    stores one generated session per ticker under root, the way backfill or the collectors would have
+    """
+    fake = mini_midas.fake_alphavantage.FakeAlphaVantage(session_date=session_date)
+    date_str = session_date.strftime("%Y%m%d")
+    for ticker in tickers:
+        bars = mini_midas.series.parse_time_series(fake.time_series_intraday(ticker, "full"))
+        mini_midas.bar_store.write_file(f"{root}/bars/{ticker}/{ticker}.{date_str}{mini_midas.bar_store.FILE_SUFFIX}", bars,
+                                         mini_midas.merge.SOURCE_OFFICIAL)
+
+
+def bench_replay(ticker_count, workers=16) -> list:
+    """
+    replays the last full session for ticker_count tickers at full speed
+    """
+    tickers = make_tickers(ticker_count)
+    calendar = mini_midas.market_calendar
+    session_date = calendar.CALENDAR.sessions_between(
+        calendar.now_eastern().date() - datetime.timedelta(days=10),
+        calendar.now_eastern().date() - datetime.timedelta(days=1))[-1][0]
+    date_str = session_date.strftime("%Y%m%d")
+    with temporary_storage() as source_path, temporary_storage() as output_path:
+        make_replay_source(source_path, tickers, session_date)
+        engine = mini_midas.replay.ReplayEngine(
+            tickers, date_str, date_str, max_workers=workers, source=source_path, output=output_path)
+        stats = engine.run()
+        bytes_written = directory_size(output_path)
+    quote_seconds = stats["wall_seconds"] - stats["end_of_day_seconds"]
+    return [
+        summarize("replay", ticker_count, stats["quotes"], quote_seconds, engine.latencies, bytes_written),
+        summarize("end_of_day", ticker_count, ticker_count, stats["end_of_day_seconds"], [], 0),
+    ]
+
+
+def make_analytics_source(root, tickers, sessions, seed=7):
+    """
+    random walks sharing a market factor for every ticker and session, a few minutes without a trade each day
+    """
+    rng = np.random.default_rng(seed)
+    prices = 100.0 * np.exp(rng.normal(0, 0.3, len(tickers)))
+    for day, session_open, session_close in sessions:
+        grid = np.arange(mini_midas.gaps.to_minute(session_open), mini_midas.gaps.to_minute(session_close))
+        market = rng.normal(0, 5e-4, len(grid))
+        for index, ticker in enumerate(tickers):
+            closes = prices[index] * np.exp(np.cumsum(market + rng.normal(0, 5e-4, len(grid))))
+            prices[index] = closes[-1]
+            traded = rng.random(len(grid)) > 0.02
+            bars = mini_midas.series.Bars(
+                minute=grid[traded], open=closes[traded], high=closes[traded], low=closes[traded],
+                close=closes[traded], volume=np.full(traded.sum(), 100, dtype=np.int64))
+            path = f"{root}/bars/{ticker}/{ticker}.{day.strftime('%Y%m%d')}{mini_midas.bar_store.FILE_SUFFIX}"
+            mini_midas.bar_store.write_file(path, bars, mini_midas.merge.SOURCE_OFFICIAL)
+
+
+def past_sessions(days) -> list:
+    """
+    the last `days` sessions that already closed
+    """
+    today = mini_midas.market_calendar.now_eastern().date()
+    sessions = mini_midas.market_calendar.CALENDAR.sessions_between(today - datetime.timedelta(days=days * 2), today)
+    return [session for session in sessions if session[2] < mini_midas.market_calendar.now_eastern()][-days:]
+
+
+def bench_analytics(ticker_count, days=63, window=390) -> list:
+    """
+    align, returns, daily correlation matrices and spreads of neighbouring tickers over `days` past sessions
+    """
+    tickers = make_tickers(ticker_count)
+    sessions = past_sessions(days)
+    start_date, end_date = sessions[0][0].strftime("%Y%m%d"), sessions[-1][0].strftime("%Y%m%d")
+    results = []
+    with temporary_storage() as storage_path:
+        make_analytics_source(storage_path, tickers, sessions)
+
+        started = time.perf_counter()
+        matrix = mini_midas.analytics.align(tickers, start_date, end_date)
+        results.append(summarize("align", ticker_count, matrix.values.size, time.perf_counter() - started, [],
+                                 matrix.values.nbytes))
+        started = time.perf_counter()
+        returns, mask = matrix.returns()
+        results.append(summarize("returns", ticker_count, returns.size, time.perf_counter() - started, [], 0))
+        started = time.perf_counter()
+        _, correlations = mini_midas.analytics.rolling_correlation(returns, mask, window, every=window)
+        results.append(summarize("correlation", ticker_count, len(correlations), time.perf_counter() - started, [],
+                                 correlations.nbytes))
+        started = time.perf_counter()
+        pairs = list(zip(tickers[:-1], tickers[1:]))
+        spreads = mini_midas.analytics.pair_spreads(matrix, pairs, window, hedge=True)
+        results.append(summarize("spreads", ticker_count, spreads["zscore"].size, time.perf_counter() - started, [],
+                                 spreads["zscore"].nbytes))
+    return results
+
+
+def bench_render(ticker_count, days=1, workers=None) -> list:
+    """
+    one chart per ticker over `days` generated sessions, then the same report again with nothing changed
+    """
+    tickers = make_tickers(ticker_count)
+    sessions = past_sessions(days)
+    start_date, end_date = sessions[0][0].strftime("%Y%m%d"), sessions[-1][0].strftime("%Y%m%d")
+    results = []
+    with temporary_storage() as storage_path:
+        make_analytics_source(storage_path, tickers, sessions)
+        for stage in ("render", "rerender"):
+            started = time.perf_counter()
+            statuses = mini_midas.render.render_charts(tickers, start_date, end_date, max_workers=workers)
+            elapsed = time.perf_counter() - started
+            output = mini_midas.render.get_output_path(start_date, end_date)
+            bytes_written = sum(entry.stat().st_size for entry in os.scandir(output) if entry.name.endswith(".png"))
+            results.append(summarize(stage, ticker_count, len(statuses), elapsed, [],
+                                     bytes_written if stage == "render" else 0))
+    return results
+
+
+# what a collector process imports on start, budgeted
+DATA_PATH_IMPORTS = ("mini_midas.stock_utilities", "mini_midas.scheduler")
+IMPORT_TARGETS = ("mini_midas",) + DATA_PATH_IMPORTS + ("mini_midas.plot",)
+# never allowed on the data path
+HEAVY_MODULES = ("matplotlib", "multiprocessing")
+IMPORT_PROBE = """
+import sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(elapsed, ",".join(name for name in {heavy!r} if name in sys.modules))
+"""
+
+
+def measure_import(module, repeat=5) -> dict:
+    """
+    best of repeat cold imports of module, each in a new interpreter so nothing is cached in sys.modules
+    """
+    timings = []
+    heavy_loaded = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            check=True, capture_output=True, text=True).stdout.split()
+        timings.append(float(output[0]))
+        heavy_loaded = output[1].split(",") if len(output) > 1 else []
+    return {"module": module, "best_s": min(timings), "median_s": float(np.median(timings)), "heavy": heavy_loaded}
+
+
+def bench_imports(repeat=5, budget=0.5) -> (list, list):
+    """
+    returns the measurements and the budget violations of the data collection path
+    """
+    results = [measure_import(module, repeat) for module in IMPORT_TARGETS]
+    violations = []
+    for result in results:
+        if result["module"] not in DATA_PATH_IMPORTS:
+            continue
+        if result["best_s"] > budget:
+            violations.append(f"{result['module']} took {result['best_s']:.3f}s, budget is {budget:.3f}s")
+        if result["heavy"]:
+            violations.append(f"{result['module']} imported {', '.join(result['heavy'])}")
+    return results, violations
+
+
+def format_import_results(results) -> str:
+    lines = [f"{'module':<30}{'best ms':>10}{'median ms':>11}  heavy"]
+    for result in results:
+        lines.append(
+            f"{result['module']:<30}{result['best_s'] * 1000:>10.1f}{result['median_s'] * 1000:>11.1f}"
+            f"  {','.join(result['heavy'])}"
+        )
+    return "\n".join(lines)
+
+
+CODEC_CANDIDATES = (
+    "gzip:1:av_json", "gzip:6:av_json", "gzip:9:av_json",
+    "zlib:1:row_json", "zlib:6:row_json", "lzma:6:row_json",
+    "zlib:1:delta", "zlib:6:delta", "gzip:9:delta", "lzma:6:delta", "lzma:9:delta", "bz2:9:delta",
+    "zstd:3:delta", "zstd:19:delta", "lz4:0:delta", "zstd:3:av_json", "lz4:0:av_json",
+)
+
+
+def load_codec_payloads(root=None, limit=200) -> list:
+    """
+    alphavantage payloads of stored files, a generated full session per ticker if nothing is stored
+    """
+    root = root or mini_midas.common.DATA_STORAGE_PATH
+    payloads = []
+    for directory, _, file_names in os.walk(root):
+        for file_name in sorted(file_names):
+            if file_name.endswith(".json.gzip") and len(payloads) < limit:
+                payloads.append(mini_midas.storage_codec.read_json(os.path.join(directory, file_name)))
+    if payloads:
+        return payloads
+    fake = mini_midas.fake_alphavantage.FakeAlphaVantage()
+    return [fake.time_series_intraday(ticker, "full") for ticker in make_tickers(20)]
+
+
+def bench_codecs(payloads, candidates=CODEC_CANDIDATES, repeat=3) -> list:
+    """
+    write MB/s, read MB/s (to Bars) and compression ratio of every installed candidate over the payloads
+    """
+    raw_bytes = sum(len(mini_midas.storage_codec.encode_av_json(payload)) for payload in payloads)
+    megabytes = raw_bytes / 1e6
+    results = []
+    for spec in candidates:
+        compression = spec.split(":")[0]
+        if compression not in mini_midas.storage_codec.COMPRESSIONS:
+            continue
+        codec = mini_midas.storage_codec.Codec.parse(spec)
+        write_times, read_times = [], []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            blobs = [codec.dumps(payload) for payload in payloads]
+            write_times.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            for blob in blobs:
+                mini_midas.storage_codec.loads_bars(blob)
+            read_times.append(time.perf_counter() - started)
+        stored_bytes = sum(len(blob) for blob in blobs)
+        results.append({
+            "codec": spec,
+            "write_mb_s": megabytes / min(write_times),
+            "read_mb_s": megabytes / min(read_times),
+            "ratio": raw_bytes / stored_bytes,
+            "bytes": stored_bytes,
+        })
+    return results
+
+
+def format_codec_results(results) -> str:
+    lines = [f"{'codec':<18}{'write MB/s':>12}{'read MB/s':>11}{'ratio':>8}{'bytes':>12}"]
+    for result in results:
+        lines.append(
+            f"{result['codec']:<18}{result['write_mb_s']:>12.1f}{result['read_mb_s']:>11.1f}"
+            f"{result['ratio']:>8.1f}{result['bytes']:>12}"
+        )
+    return "\n".join(lines)
+
+
+def format_ms(value) -> str:
+    return f"{'-':>9}" if value is None else f"{value:>9.2f}"
+
+
+def format_results(results) -> str:
+    lines = [f"{'stage':<12}{'tickers':>8}{'ops':>12}{'ops/s':>14}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'bytes':>12}"]
+    for result in results:
+        lines.append(
+            f"{result['stage']:<12}{result['tickers']:>8}{result['operations']:>12}{result['ops_per_second']:>14.1f}"
+            f"{format_ms(result['p50_ms'])}{format_ms(result['p90_ms'])}{format_ms(result['p99_ms'])}"
+            f"{result['bytes_written']:>12}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="mini_midas ingestion benchmark")
+    parser.add_argument("--tickers", default="15,100,500", help="comma separated ticker counts")
+    parser.add_argument("--rounds", type=int, default=5, help="quote polls per ticker")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every fake api call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of fake api calls failing")
+    parser.add_argument("--imports", action="store_true", help="only measure cold import times")
+    parser.add_argument("--import-budget", type=float, default=0.5, help="seconds allowed for the data path imports")
+    parser.add_argument("--codecs", action="store_true", help="only measure storage codecs")
+    parser.add_argument("--codec-files", default=None, help="directory of stored files, defaults to the data storage")
+    parser.add_argument("--replay", action="store_true", help="replay generated sessions through the pipeline")
+    parser.add_argument("--analytics", action="store_true", help="cross-ticker alignment and rolling statistics")
+    parser.add_argument("--days", type=int, default=63, help="sessions of generated bars for --analytics and --render")
+    parser.add_argument("--render", action="store_true", help="headless chart rendering in a process pool")
+    args = parser.parse_args(argv)
+
+    if args.codecs:
+        results = bench_codecs(load_codec_payloads(args.codec_files))
+        print(format_codec_results(results))
+        return results
+
+    if args.imports:
+        results, violations = bench_imports(budget=args.import_budget)
+        print(format_import_results(results))
+        for violation in violations:
+            print(f"OVER BUDGET: {violation}")
+        if violations:
+            sys.exit(1)
+        return results
+
+    results = []
+    for ticker_count in [int(count) for count in args.tickers.split(",")]:
+        if args.replay:
+            results.extend(bench_replay(ticker_count, workers=args.workers))
+            continue
+        if args.analytics:
+            results.extend(bench_analytics(ticker_count, days=args.days))
+            continue
+        if args.render:
+            results.extend(bench_render(ticker_count, days=args.days))
+            continue
+        results.extend(bench_ingestion(
+            ticker_count, rounds=args.rounds, workers=args.workers,
+            latency=args.latency, error_rate=args.error_rate))
+    print(format_results(results))
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,10 @@
 """
 common module
 """
-import datetime
 import os
 import excalibur
+import mini_midas
+from mini_midas import market_calendar
 
 
 LOG_INSTANCE = excalibur.logger.getlogger_debug()
@@ -11,57 +12,111 @@ LOG_INSTANCE = excalibur.logger.getlogger_debug()
 
 def is_market_closed():
     """
-    check if market closed
+    check if market closed for the day, either today's session ended or there is no session today
     """
-    dt_obj = datetime.datetime.now()
-    return dt_obj.hour >= 16
+    return market_calendar.has_closed()
 
 
 def is_market_open():
     """
     check if market is open
     """
-    dt_obj = datetime.datetime.now()
-    time_only_str = dt_obj.strftime('%H%M')
-    LOG_INSTANCE.info(time_only_str)
-    return time_only_str > '0930' and time_only_str < '1600'
+    return market_calendar.is_open()
 
 
 def is_weekend():
     """
-    check if now is weekend
+    check if now is weekend in US/Eastern
     """
-    dt_obj = datetime.datetime.now()
-    if dt_obj.isoweekday() > 5:
-        return True
-    return False
+    return market_calendar.now_eastern().isoweekday() > 5
 
 
 def split_date_string() -> (str, str):
     """
-    splits date, returns date and hour
+    splits US/Eastern date, returns date and hour, the same clock alphavantage timestamps use
     """
-    dat = datetime.datetime.now()
+    dat = market_calendar.now_eastern()
     date_str = dat.strftime("%Y%m%d")
     hour_str = dat.strftime("%H")
     return date_str, hour_str
 
 
 TOKEN_PATH = os.path.expanduser("~/.config/api_tokens/alphavantage.co.token")
-BASE_URL = "https://www.alphavantage.co/query?function="
+# can point at a local stand-in such as mini_midas.fake_alphavantage
+BASE_URL = os.environ.get("MINI_MIDAS_BASE_URL", "https://www.alphavantage.co/query?function=")
 DATA_STORAGE_PATH = os.path.expanduser("~/data/stock_historical_data")
+# alphavantage free tier allows 5 calls per minute for each api token
+API_CALLS_PER_MINUTE = 5
+
+
+def read_api_token(token_path=TOKEN_PATH):
+    """
+    reads alphavantage api token from token file
+    """
+    if not os.path.exists(token_path):
+        raise FileNotFoundError(f"Token file at {token_path} not found")
+
+    with open(token_path, 'r') as fil:
+        return fil.readline()
 
 
 def get_intraday_data_storage_path():
-    today = excalibur.time_conversion.get_current_date(date_format="%Y%m%d")
+    today, _ = split_date_string()
     return f"{DATA_STORAGE_PATH}/intraday/{today}"
 
 
 def get_historical_data_storage_path():
-    today = excalibur.time_conversion.get_current_date(date_format="%Y%m%d")
+    today, _ = split_date_string()
     return f"{DATA_STORAGE_PATH}/historical/{today}"
 
 
+def get_bar_storage_path(ticker):
+    return f"{DATA_STORAGE_PATH}/bars/{ticker}"
+
+
+def get_tick_log_storage_path():
+    return f"{DATA_STORAGE_PATH}/wal"
+
+
+def get_tick_log_path(ticker, date_str):
+    return f"{get_tick_log_storage_path()}/{ticker}.{date_str}.log"
+
+
+def get_intraday_file_path(ticker, date_str, hour):
+    """
+    hourly intraday file of a ticker, hour is zero padded the same way strftime("%H") pads it
+    """
+    return f"{DATA_STORAGE_PATH}/intraday/{date_str}/{ticker}.{date_str}.{int(hour):02d}.json.gzip"
+
+
+OFFICIAL_SUFFIX = ".official.json.gzip"
+
+
+def get_official_file_path(ticker, date_str):
+    """
+    intraday partition of the official TIME_SERIES_INTRADAY bars of a day, kept apart from the hourly tick files
+    """
+    return f"{DATA_STORAGE_PATH}/intraday/{date_str}/{ticker}.{date_str}{OFFICIAL_SUFFIX}"
+
+
+def get_snapshot_file_path(ticker):
+    """
+    where the official snapshot of today goes, its own intraday partition while the market is open,
+    the historical day file once it closed
+    """
+    if is_market_closed():
+        return get_file_saved_path(ticker)
+    date_str, _ = split_date_string()
+    return get_official_file_path(ticker, date_str)
+
+
+def get_historical_file_path(ticker, date_str):
+    """
+    one file holding a whole day of a ticker
+    """
+    return f"{DATA_STORAGE_PATH}/historical/{date_str}/{ticker}.{date_str}.json.gzip"
+
+
 def get_file_saved_path(ticker):
     """
     returns file save path,
@@ -73,10 +128,10 @@ def get_file_saved_path(ticker):
 
     if is_market_closed():
         # we need to give a full name and save it to full day path
-        save_path = f"{get_historical_data_storage_path()}/{ticker}.{date_str}.json.gzip"
+        save_path = get_historical_file_path(ticker, date_str)
     else:
         # we save it to intraday
-        save_path = f"{get_intraday_data_storage_path()}/{ticker}.{date_str}.{hour}.json.gzip"
+        save_path = get_intraday_file_path(ticker, date_str, hour)
 
     return save_path
 
@@ -84,17 +139,25 @@ def get_file_saved_path(ticker):
 def get_all_file_saved_path(ticker):
     """
     returns file save path list, this is for plot to load all files that have in a directory,
+    files are looked up in the ticker's manifest, the directory is only probed for files written before it existed
     """
     date_str, _ = split_date_string()
+    kind = mini_midas.manifest.KIND_HISTORICAL if is_market_closed() else mini_midas.manifest.KIND_INTRADAY
+    save_path = mini_midas.manifest.files_for_dates(ticker, date_str, date_str, kinds=(kind,))
+    if save_path:
+        return save_path
 
     if is_market_closed():
         # we need to give a full name and save it to full day path
-        save_path = [f"{get_historical_data_storage_path()}/{ticker}.{date_str}.json.gzip"]
+        save_path = [get_historical_file_path(ticker, date_str)]
     else:
         # we save it to intraday
         save_path = []
+        official_path = get_official_file_path(ticker, date_str)
+        if os.path.exists(official_path):
+            save_path.append(official_path)
         for hour in range(9, 17):
-            temp = f"{get_intraday_data_storage_path()}/{ticker}.{date_str}.{hour}.json.gzip"
+            temp = get_intraday_file_path(ticker, date_str, hour)
             if os.path.exists(temp):
                 save_path.append(temp)
 
@@ -105,9 +168,18 @@ def is_market_holiday():
     """
     returns if this is market holiday
     """
-    # TODO: need to implement this
-    return False
+    return market_calendar.CALENDAR.is_holiday(market_calendar.now_eastern().date())
 
 
 def is_market_not_available():
-    return (is_market_closed() and not is_market_open()) or is_weekend() or is_market_holiday()
+    return not market_calendar.is_open()
+
+
+def sleep_until_market_open():
+    """
+    sleeps exactly until the next session opens, returns right away while the market is open
+    """
+    seconds = market_calendar.seconds_until_open()
+    if seconds > 0:
+        LOG_INSTANCE.info("Market Closed, sleeping %.0f seconds until %s", seconds, market_calendar.next_open())
+        market_calendar.sleep(seconds)
@@ -0,0 +1,222 @@
+"""
+end of day consolidation, step 5 of the retriever's run(): all files of a day into one file
+
+a collected day ends as up to eight hour files of ticks, the official partition and the bar store day,
+and every reader merges them again, after the close this pulls the official full day once per ticker,
+merges it with the day's fragments, checks the bar count against the session calendar and writes one
+sorted historical/{date}/{ticker}.{date}.json.gzip, the fragments are only removed once that file was
+read back and the day had enough of its session
+
+api calls are paced by the token bucket in this process, the merging runs in a process pool,
+parsing and compressing a day is cpu bound and one ticker doesn't wait for another
+
+    consolidator = Consolidator(['tsla', 'aapl'])     # the session that closed last
+    consolidator.run()                                # {ticker: result}
+"""
+import collections
+import concurrent.futures
+import datetime
+import multiprocessing
+import os
+import excalibur
+import mini_midas
+
+
+LOG_INSTANCE = excalibur.logger.getlogger_debug()
+
+# share of the session's minutes a day needs before its fragments are removed, same as a backfilled day
+MIN_COVERAGE = 0.9
+
+CONSOLIDATED_DAYS = mini_midas.metrics.counter(
+    "mini_midas_consolidated_days_total", "ticker-days written into one historical file", ("outcome",))
+
+
+def find_fragments(ticker, date_str) -> list:
+    """
+    paths of the day's intraday partitions, the manifest knows them, the directory is only probed
+    for files written before it existed
+    """
+    fragments = mini_midas.manifest.files_for_dates(
+        ticker, date_str, date_str, kinds=(mini_midas.manifest.KIND_INTRADAY,))
+    candidates = [mini_midas.common.get_intraday_file_path(ticker, date_str, hour) for hour in range(24)]
+    candidates.append(mini_midas.common.get_official_file_path(ticker, date_str))
+    fragments.extend(path for path in candidates if path not in fragments and os.path.exists(path))
+    return fragments
+
+
+def read_runs(ticker, date_str, fragments) -> list:
+    """
+    [(bars, source)] of everything stored for the day, weakest first so equal sources go to the later run
+    """
+    day_start = mini_midas.series.date_string_to_minute(date_str)
+    sources = {entry["path"]: mini_midas.merge.SOURCE_CODES[entry["source"]]
+               for entry in mini_midas.manifest.load(ticker).entries if "source" in entry}
+    historical_path = mini_midas.common.get_historical_file_path(ticker, date_str)
+    paths = [path for path in fragments if not path.endswith(mini_midas.common.OFFICIAL_SUFFIX)]
+    if os.path.exists(historical_path):
+        paths.append(historical_path)
+
+    runs = []
+    for path in paths:
+        bars = mini_midas.storage_codec.read_bars(path)
+        runs.append((bars, sources.get(path, mini_midas.manifest.source_of_path(path))))
+    runs.append(mini_midas.bar_store.read_day_with_sources(ticker, date_str))
+    runs.extend((mini_midas.storage_codec.read_bars(path), mini_midas.merge.SOURCE_OFFICIAL)
+                for path in fragments if path.endswith(mini_midas.common.OFFICIAL_SUFFIX))
+    return [(bars.between(day_start, day_start + mini_midas.series.MINUTES_PER_DAY), source) for bars, source in runs]
+
+
+def prune(ticker, date_str, fragments):
+    for path in fragments:
+        os.remove(path)
+        mini_midas.manifest.remove_file(ticker, path)
+    intraday_path = f"{mini_midas.common.DATA_STORAGE_PATH}/intraday/{date_str}"
+    if os.path.isdir(intraday_path) and not os.listdir(intraday_path):
+        os.rmdir(intraday_path)
+
+
+def consolidate_ticker(ticker, date_str, root, min_coverage=MIN_COVERAGE) -> dict:
+    """
+    runs in a worker process, merges one ticker-day into its historical file and prunes the fragments
+    """
+    mini_midas.common.DATA_STORAGE_PATH = root
+    # ticks still in the log would otherwise only reach an hour file after we pruned it
+    mini_midas.tick_log.compact_log(ticker, date_str)
+    fragments = find_fragments(ticker, date_str)
+    bar_path = mini_midas.bar_store.get_day_file_path(ticker, date_str)
+    # a merge_bars landing between reading the bar store day and writing it back would be lost
+    with mini_midas.bar_store.locked(ticker):
+        bars, sources, stats = mini_midas.merge.merge_runs(read_runs(ticker, date_str, fragments))
+        if len(bars):
+            mini_midas.bar_store.write_file(bar_path, bars, sources)
+            mini_midas.manifest.record_file(ticker, bar_path, bars, mini_midas.manifest.KIND_BARS)
+            stat = os.stat(bar_path)
+    result = {"ticker": ticker, "bars": len(bars), "fragments": len(fragments), "pruned": 0,
+              "valid": False, "merge": stats.as_dict()}
+    if not len(bars):
+        return result
+
+    session_open, session_close = mini_midas.gaps.session_minutes(date_str)
+    expected = session_close - session_open
+    in_session = len(bars.between(session_open, session_close))
+    result.update(expected=expected, in_session=in_session)
+
+    path = mini_midas.common.get_historical_file_path(ticker, date_str)
+    json_obj = {
+        "Meta Data": {
+            "1. Information": "Intraday (1min) open, high, low, close prices and volume",
+            "2. Symbol": ticker, "3. Last Refreshed": mini_midas.series.minutes_to_timestamps(bars.minute[-1:])[0],
+            "4. Interval": "1min", "5. Output Size": "Full size", "6. Time Zone": "US/Eastern",
+        },
+        "Time Series (1min)": bars.to_time_series(),
+    }
+    mini_midas.storage_codec.write_json(path, json_obj, mini_midas.storage_codec.TIER_COLD)
+    mini_midas.manifest.record_file(ticker, path, bars, mini_midas.manifest.KIND_HISTORICAL,
+                                    mini_midas.merge.SOURCE_UNKNOWN)
+
+    written = mini_midas.storage_codec.read_bars(path)
+    if len(written) != len(bars) or (written.minute != bars.minute).any():
+        LOG_INSTANCE.critical("%s %s historical file doesn't read back, keeping the fragments", ticker, date_str)
+        return result
+    if in_session < expected * min_coverage:
+        LOG_INSTANCE.warning("%s %s has %s of %s session minutes, keeping the fragments",
+                             ticker, date_str, in_session, expected)
+        return result
+    result["valid"] = True
+    mini_midas.manifest.mark_consolidated(ticker, bar_path, (stat.st_mtime_ns, stat.st_size))
+    prune(ticker, date_str, fragments)
+    result["pruned"] = len(fragments)
+    return result
+
+
+class Consolidator:
+    """
+    consolidates one day of tickers, date_str "%Y%m%d" defaults to the session that closed last
+    """
+
+    def __init__(self, tickers, date_str=None, rate_limiter=None, session=None, token=None, max_workers=None,
+                 fetch=True, min_coverage=MIN_COVERAGE):
+        self.tickers = list(tickers)
+        self.date_str = date_str or mini_midas.market_calendar.last_close().strftime("%Y%m%d")
+        self.fetch = fetch
+        self.rate_limiter = rate_limiter
+        self.session = session
+        self.token = token
+        if fetch:
+            self.rate_limiter = rate_limiter if rate_limiter is not None else mini_midas.scheduler.TokenBucket()
+            self.session = session if session is not None else mini_midas.scheduler.make_session(1)
+            self.token = token if token else mini_midas.common.read_api_token()
+        self.max_workers = max_workers or os.cpu_count()
+        self.min_coverage = min_coverage
+        self.base_url = mini_midas.common.BASE_URL
+        self.stats = collections.Counter()
+
+    def fetch_official(self, ticker) -> int:
+        """
+        official full day into the official partition, returns number of bars of the day
+        """
+        self.rate_limiter.acquire()
+        # a past day is only in the month's pull, the latest day is in the plain full output
+        latest = mini_midas.market_calendar.last_close().strftime("%Y%m%d")
+        month = None if self.date_str == latest else f"{self.date_str[:4]}-{self.date_str[4:6]}"
+        json_obj = mini_midas.response_cache.fetch_json(
+            self.session, self.base_url, self.token, "TIME_SERIES_INTRADAY", ticker, interval="1min",
+            outputsize="full", month=month)
+        if not mini_midas.response_cache.is_cacheable(json_obj):
+            LOG_INSTANCE.warning("Unable to pull the official day of %s: %s", ticker, json_obj)
+            return 0
+        day_start = mini_midas.series.date_string_to_minute(self.date_str)
+        bars = mini_midas.series.parse_time_series(json_obj).between(
+            day_start, day_start + mini_midas.series.MINUTES_PER_DAY)
+        if len(bars):
+            mini_midas.tick_log.fold_into_official_file(ticker, self.date_str, bars, json_obj.get("Meta Data"))
+        return len(bars)
+
+    def fetch_all(self):
+        for ticker in self.tickers:
+            try:
+                self.stats["official_bars"] += self.fetch_official(ticker)
+                self.stats["official_pulls"] += 1
+            except Exception as e:
+                LOG_INSTANCE.critical("Unable to pull the official day of %s, error: %s", ticker, str(e))
+                self.stats["fetch_errors"] += 1
+
+    def run(self) -> dict:
+        day = datetime.datetime.strptime(self.date_str, "%Y%m%d").date()
+        if mini_midas.market_calendar.CALENDAR.session(day) is None:
+            raise Exception(f"{self.date_str} is not a trading day")
+        results = {}
+        if not self.tickers:
+            return results
+        if self.fetch:
+            self.fetch_all()
+
+        root = mini_midas.common.DATA_STORAGE_PATH
+        # the collectors calling this run threads, forking them could copy a lock some thread holds
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(self.max_workers, len(self.tickers)), mp_context=multiprocessing.get_context("spawn"))
+        with executor:
+            futures = {
+                executor.submit(consolidate_ticker, ticker, self.date_str, root, self.min_coverage): ticker
+                for ticker in self.tickers
+            }
+            for future in concurrent.futures.as_completed(futures):
+                ticker = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    LOG_INSTANCE.critical("Unable to consolidate %s %s, error: %s", ticker, self.date_str, str(e))
+                    CONSOLIDATED_DAYS.inc(outcome="failed")
+                    self.stats["failed"] += 1
+                    continue
+                results[ticker] = result
+                outcome = "valid" if result["valid"] else "kept_fragments"
+                CONSOLIDATED_DAYS.inc(outcome=outcome)
+                self.stats[outcome] += 1
+                self.stats["pruned"] += result["pruned"]
+        LOG_INSTANCE.info("Consolidated %s: %s", self.date_str, dict(self.stats))
+        return results
+
+
+def consolidate(tickers, date_str=None, **kwargs) -> dict:
+    return Consolidator(tickers, date_str, **kwargs).run()
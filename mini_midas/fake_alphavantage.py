@@ -0,0 +1,237 @@
+"""
+local stand-in for the alphavantage query endpoint
+
+serves deterministic TIME_SERIES_INTRADAY and GLOBAL_QUOTE payloads, every symbol gets its own
+seeded random walk so two runs see the same prices, latency, error rate and the 5 calls per minute
+throttle answer can be configured to exercise the retry paths
+
+    server = FakeAlphaVantageServer(latency=0.05, calls_per_minute=5)
+    server.start()
+    retriever.BASE_URL = server.base_url
+    ...
+    server.stop()
+"""
+import collections
+import datetime
+import http.server
+import json
+import random
+import threading
+import time
+import urllib.parse
+import zlib
+
+
+SESSION_MINUTES = 390  # 09:31 to 16:00
+THROTTLE_NOTE = (
+    "Thank you for using Alpha Vantage! Our standard API call frequency is 5 calls per minute "
+    "and 500 calls per day. Please visit https://www.alphavantage.co/premium/ "
+    "if you would like to target a higher API call frequency."
+)
+
+
+def symbol_seed(symbol) -> int:
+    return zlib.crc32(symbol.lower().encode())
+
+
+def session_prices(symbol) -> list:
+    """
+    deterministic minute closes of a symbol's session
+    """
+    rand = random.Random(symbol_seed(symbol))
+    price = rand.uniform(10, 500)
+    prices = []
+    for _ in range(SESSION_MINUTES):
+        price = max(1.0, price * (1 + rand.gauss(0, 0.001)))
+        prices.append(price)
+    return prices
+
+
+def format_bar(open_price, close_price, volume) -> dict:
+    high_price = max(open_price, close_price) * 1.0005
+    low_price = min(open_price, close_price) * 0.9995
+    return {
+        "1. open": f"{open_price:.4f}", "2. high": f"{high_price:.4f}",
+        "3. low": f"{low_price:.4f}", "4. close": f"{close_price:.4f}", "5. volume": str(volume),
+    }
+
+
+class FakeAlphaVantage:
+    """
+    payload generation and throttling, separate from the http plumbing
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, calls_per_minute=None, session_date=None, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls_per_minute = calls_per_minute
+        self.session_date = session_date or datetime.date.today()
+        self.random = random.Random(seed)
+        self.prices = {}
+        self.calls = collections.defaultdict(collections.deque)
+        self.lock = threading.Lock()
+        self.stats = collections.Counter()
+
+    def get_prices(self, symbol):
+        with self.lock:
+            if symbol not in self.prices:
+                self.prices[symbol] = session_prices(symbol)
+            return self.prices[symbol]
+
+    def is_throttled(self, api_key) -> bool:
+        """
+        sliding 60 second window of calls per api key
+        """
+        if not self.calls_per_minute:
+            return False
+        now = time.monotonic()
+        with self.lock:
+            calls = self.calls[api_key]
+            while calls and now - calls[0] >= 60:
+                calls.popleft()
+            if len(calls) >= self.calls_per_minute:
+                return True
+            calls.append(now)
+            return False
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+    def time_series_intraday(self, symbol, outputsize) -> dict:
+        prices = self.get_prices(symbol)
+        session_open = datetime.datetime.combine(self.session_date, datetime.time(9, 30))
+        time_series = {}
+        # alphavantage returns newest first
+        for index in reversed(range(len(prices))):
+            stamp = (session_open + datetime.timedelta(minutes=index + 1)).strftime("%Y-%m-%d %H:%M:%S")
+            open_price = prices[index - 1] if index else prices[0]
+            time_series[stamp] = format_bar(open_price, prices[index], 1000 + symbol_seed(symbol) % 1000 + index)
+            if outputsize != "full" and len(time_series) >= 100:
+                break
+        last_refreshed = next(iter(time_series))
+        return {
+            "Meta Data": {
+                "1. Information": "Intraday (1min) open, high, low, close prices and volume",
+                "2. Symbol": symbol, "3. Last Refreshed": last_refreshed, "4. Interval": "1min",
+                "5. Output Size": "Full size" if outputsize == "full" else "Compact", "6. Time Zone": "US/Eastern",
+            },
+            "Time Series (1min)": time_series,
+        }
+
+    def global_quote(self, symbol) -> dict:
+        prices = self.get_prices(symbol)
+        now = datetime.datetime.now()
+        index = (now.hour * 60 + now.minute) % len(prices)
+        return {
+            "Global Quote": {
+                "01. symbol": symbol.upper(),
+                "02. open": f"{prices[0]:.4f}",
+                "03. high": f"{max(prices[:index + 1]):.4f}",
+                "04. low": f"{min(prices[:index + 1]):.4f}",
+                "05. price": f"{prices[index]:.4f}",
+                "06. volume": str(10000 + index * 100),
+                "07. latest trading day": self.session_date.strftime("%Y-%m-%d"),
+                "08. previous close": f"{prices[0]:.4f}",
+                "09. change": f"{prices[index] - prices[0]:.4f}",
+                "10. change percent": f"{(prices[index] / prices[0] - 1) * 100:.4f}%",
+            }
+        }
+
+    def respond(self, query) -> (int, dict):
+        """
+        returns http status and json payload for a parsed query string
+        """
+        params = {key: values[-1] for key, values in urllib.parse.parse_qs(query).items()}
+        function = params.get("function", "")
+        symbol = params.get("symbol", "")
+        self.stats["requests"] += 1
+
+        if self.latency:
+            time.sleep(self.latency)
+        if self.should_fail():
+            self.stats["errors"] += 1
+            return 500, {"Error Message": "Internal error"}
+        if self.is_throttled(params.get("apikey", "")):
+            self.stats["throttled"] += 1
+            return 200, {"Note": THROTTLE_NOTE}
+        if not symbol:
+            return 200, {"Error Message": "Invalid API call. Please retry or visit the documentation."}
+
+        if function == "TIME_SERIES_INTRADAY":
+            self.stats[function] += 1
+            return 200, self.time_series_intraday(symbol, params.get("outputsize", "compact"))
+        if function == "GLOBAL_QUOTE":
+            self.stats[function] += 1
+            return 200, self.global_quote(symbol)
+        return 200, {"Error Message": f"Invalid API call, unknown function {function}"}
+
+
+class FakeAlphaVantageHandler(http.server.BaseHTTPRequestHandler):
+    # keep alive, so pooled sessions reuse connections like they would against alphavantage
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        status, payload = self.server.fake.respond(urllib.parse.urlparse(self.path).query)
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        # keep benchmark output clean
+        pass
+
+
+class FakeHTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    # the default backlog of 5 makes hundreds of concurrent tickers hit connect retries
+    request_queue_size = 1024
+
+
+class FakeAlphaVantageServer:
+    """
+    threaded http server running FakeAlphaVantage in a background thread
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, **fake_kwargs):
+        self.fake = FakeAlphaVantage(**fake_kwargs)
+        self.httpd = FakeHTTPServer((host, port), FakeAlphaVantageHandler)
+        self.httpd.fake = self.fake
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/query?function="
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def serve_forever(port=8765, **fake_kwargs):
+    """
+    runs the stand-in in the foreground, point MINI_MIDAS_BASE_URL at the printed url
+    """
+    server = FakeAlphaVantageServer(port=port, **fake_kwargs)
+    print(f"MINI_MIDAS_BASE_URL={server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    finally:
+        server.httpd.server_close()
@@ -0,0 +1,192 @@
+"""
+gap detection of a ticker-day against the session calendar
+
+a ticker-day should have one bar per minute of its session, bars go missing when a retriever
+restarts, when the 65 second poll sleep drifts past a minute or when a quote call fails,
+this finds the missing windows so only they are fetched again instead of the whole day
+
+alphavantage has no start/end parameters, the smallest call covering a window is picked:
+compact holds the latest 100 minutes, full the whole day
+
+minutes that had no trade stay missing forever, so every fetch records what it covered in a
+coverage file next to the day's bar file, windows covered by a fetch are not gaps anymore
+
+    windows = find_gaps('tsla', '20200409', bars)      # [(start_minute, end_minute), ...] end exclusive
+    outputsize_for(windows)                             # 'compact' or 'full'
+"""
+import datetime
+import json
+import os
+import pathlib
+import numpy as np
+import excalibur
+import mini_midas
+
+
+LOG_INSTANCE = excalibur.logger.getlogger_debug()
+
+COVERAGE_SUFFIX = ".coverage.json"
+# bars in a compact response, a little slack as the newest one may still be missing
+COMPACT_MINUTES = 100
+COMPACT_SLACK = 5
+# the current minute is still forming and alphavantage publishes a bar a minute or two late
+SETTLE_MINUTES = 2
+
+
+def to_minute(dt) -> int:
+    """
+    epoch minute of an aware datetime, on the US/Eastern wall clock like every bar
+    """
+    wall_clock = dt.astimezone(mini_midas.market_calendar.EASTERN).replace(tzinfo=None)
+    return int(np.datetime64(wall_clock, 'm').astype(np.int64))
+
+
+def now_minute(now=None) -> int:
+    return to_minute(mini_midas.market_calendar.now_eastern(now))
+
+
+def session_minutes(date_str):
+    """
+    (open, close) epoch minutes of a date's session, close exclusive, None if the market doesn't trade
+    """
+    day = datetime.datetime.strptime(date_str, "%Y%m%d").date()
+    session = mini_midas.market_calendar.CALENDAR.session(day)
+    if session is None:
+        return None
+    session_open, session_close = session
+    return to_minute(session_open), to_minute(session_close)
+
+
+def missing_windows(minutes, start, end) -> list:
+    """
+    [(start, end)] runs of minutes in start..end (exclusive) that have no bar
+    """
+    if start >= end:
+        return []
+    minutes = np.asarray(minutes, dtype=np.int64)
+    present = np.unique(minutes[(minutes >= start) & (minutes < end)])
+    edges = np.concatenate(([start - 1], present, [end]))
+    holes = np.flatnonzero(np.diff(edges) > 1)
+    return [(int(edges[index]) + 1, int(edges[index + 1])) for index in holes]
+
+
+def merge_windows(windows) -> list:
+    merged = []
+    for start, end in sorted(windows):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_windows(windows, covered) -> list:
+    """
+    parts of windows not inside any covered window, both sorted and without overlaps
+    """
+    result = []
+    for start, end in windows:
+        for covered_start, covered_end in covered:
+            if covered_end <= start or covered_start >= end:
+                continue
+            if covered_start > start:
+                result.append((start, covered_start))
+            start = max(start, covered_end)
+            if start >= end:
+                break
+        if start < end:
+            result.append((start, end))
+    return result
+
+
+def clip_windows(windows, start, end) -> list:
+    return [(max(window_start, start), min(window_end, end)) for window_start, window_end in windows
+            if window_start < end and window_end > start]
+
+
+def in_windows(minutes, windows) -> np.ndarray:
+    """
+    mask of minutes falling inside any of the sorted windows
+    """
+    minutes = np.asarray(minutes, dtype=np.int64)
+    if not windows:
+        return np.zeros(len(minutes), dtype=bool)
+    starts = np.array([start for start, _ in windows], dtype=np.int64)
+    ends = np.array([end for _, end in windows], dtype=np.int64)
+    index = np.searchsorted(starts, minutes, side='right') - 1
+    return (index >= 0) & (minutes < ends[np.maximum(index, 0)])
+
+
+def window_minutes(windows) -> int:
+    return sum(end - start for start, end in windows)
+
+
+def get_coverage_path(ticker, date_str):
+    return f"{mini_midas.common.get_bar_storage_path(ticker)}/{ticker}.{date_str}{COVERAGE_SUFFIX}"
+
+
+class Coverage:
+    """
+    windows of a ticker-day some fetch already covered, with or without bars in them
+    """
+
+    def __init__(self, ticker, date_str):
+        self.ticker = ticker
+        self.date_str = date_str
+        self.path = get_coverage_path(ticker, date_str)
+        self.windows = []
+        self.fetches = 0
+        self.bars_filled = 0
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as fil:
+                payload = json.load(fil)
+            self.windows = [tuple(window) for window in payload.get("windows", [])]
+            self.fetches = payload.get("fetches", 0)
+            self.bars_filled = payload.get("bars_filled", 0)
+
+    def add(self, windows, bars_filled=0):
+        self.windows = merge_windows(self.windows + list(windows))
+        self.fetches += 1
+        self.bars_filled += bars_filled
+
+    def save(self):
+        payload = {"windows": self.windows, "fetches": self.fetches, "bars_filled": self.bars_filled}
+        pathlib.Path(os.path.dirname(self.path)).mkdir(parents=True, exist_ok=True)
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as fil:
+            json.dump(payload, fil)
+        os.replace(temp_path, self.path)
+
+
+def find_gaps(ticker, date_str, bars, now=None, coverage=None) -> list:
+    """
+    missing windows of a ticker-day's session up to now that no fetch has covered yet
+    """
+    session = session_minutes(date_str)
+    if session is None:
+        return []
+    session_open, session_close = session
+    end = min(session_close, now_minute(now) - SETTLE_MINUTES + 1)
+    coverage = coverage if coverage is not None else Coverage(ticker, date_str)
+    return subtract_windows(missing_windows(bars.minute, session_open, end), coverage.windows)
+
+
+def outputsize_for(windows, now=None) -> str:
+    """
+    compact when every window is inside the latest 100 minutes, full otherwise
+    """
+    if windows and windows[0][0] < now_minute(now) - COMPACT_MINUTES + COMPACT_SLACK:
+        return "full"
+    return "compact"
+
+
+def covered_by_response(windows, bars, outputsize) -> list:
+    """
+    parts of the requested windows a response vouches for, a window the response spans without bars had no trades
+    """
+    if not len(bars):
+        return []
+    last = int(bars.minute.max()) + 1
+    # compact only goes back 100 minutes, full goes back to the start of the day
+    first = int(bars.minute.min()) if outputsize == "compact" else min(start for start, _ in windows)
+    return clip_windows(windows, first, last)
@@ -0,0 +1,483 @@
+"""
+streaming technical indicators over the retriever's minute bars
+
+every indicator keeps a small running state and is updated in O(1) when a bar is committed,
+the bar of the current minute is still moving (a second quote of the same minute replaces it),
+so it is only peeked at, it gets committed once a bar of a later minute arrives
+
+the engine seeds every indicator with one vectorized pass over the TIME_SERIES_INTRADAY snapshot
+and saves state plus current values next to the day's bar file, so the plotter and alerting
+read indicators from there without touching the raw series
+
+    engine = IndicatorEngine('tsla')
+    engine.seed(bars)
+    engine.on_bar(minute, open, high, low, close, volume)
+    engine.values()                # {'sma_20': ..., 'rsi_14': ..., 'bollinger_20': {...}, ...}
+    read_values('tsla')            # same, from another process
+"""
+import abc
+import collections
+import json
+import math
+import os
+import pathlib
+import numpy as np
+import excalibur
+import mini_midas
+
+
+LOG_INSTANCE = excalibur.logger.getlogger_debug()
+
+STATE_SUFFIX = ".indicators.json"
+
+
+def ewm_last(values, alpha, initial) -> float:
+    """
+    last value of s[i] = (1 - alpha) * s[i - 1] + alpha * values[i] with s[-1] = initial, without a python loop,
+    weights of old values underflow to 0 which is exactly their contribution
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return initial
+    powers = np.arange(len(values) - 1, -1, -1, dtype=np.float64)
+    weights = alpha * np.exp(powers * math.log1p(-alpha))
+    return float(initial * math.exp(len(values) * math.log1p(-alpha)) + np.dot(weights, values))
+
+
+def day_of(minute) -> int:
+    return int(minute) // mini_midas.series.MINUTES_PER_DAY
+
+
+class Indicator(abc.ABC):
+    """
+    seed(bars) runs once over committed bars, update(bar) commits one bar,
+    peek(bar) is the value as if bar was committed without changing any state
+    """
+
+    @abc.abstractmethod
+    def seed(self, bars):
+        pass
+
+    @abc.abstractmethod
+    def update(self, bar):
+        pass
+
+    @abc.abstractmethod
+    def peek(self, bar):
+        pass
+
+    @abc.abstractmethod
+    def value(self):
+        pass
+
+    def get_state(self) -> dict:
+        return dict(self.__dict__)
+
+    def set_state(self, state):
+        self.__dict__.update(state)
+
+
+class WindowedCloses(Indicator):
+    """
+    last `window` closes with their running sum and sum of squares
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.closes = collections.deque(maxlen=window)
+        self.total = 0.0
+        self.total_squares = 0.0
+
+    def seed(self, bars):
+        closes = np.asarray(bars.close, dtype=np.float64)[-self.window:]
+        self.closes = collections.deque(closes.tolist(), maxlen=self.window)
+        self.total = float(closes.sum())
+        self.total_squares = float(np.dot(closes, closes))
+
+    def update(self, bar):
+        if len(self.closes) == self.window:
+            oldest = self.closes[0]
+            self.total -= oldest
+            self.total_squares -= oldest * oldest
+        self.closes.append(bar['close'])
+        self.total += bar['close']
+        self.total_squares += bar['close'] * bar['close']
+
+    def window_sums(self, bar=None) -> (int, float, float):
+        """
+        count, sum and sum of squares of the window, with bar appended if given
+        """
+        count, total, total_squares = len(self.closes), self.total, self.total_squares
+        if bar is not None:
+            if count == self.window:
+                total -= self.closes[0]
+                total_squares -= self.closes[0] * self.closes[0]
+            else:
+                count += 1
+            total += bar['close']
+            total_squares += bar['close'] * bar['close']
+        return count, total, total_squares
+
+    def get_state(self) -> dict:
+        return {"window": self.window, "closes": list(self.closes), "total": self.total,
+                "total_squares": self.total_squares}
+
+    def set_state(self, state):
+        self.window = state["window"]
+        self.closes = collections.deque(state["closes"], maxlen=self.window)
+        self.total = state["total"]
+        self.total_squares = state["total_squares"]
+
+
+class SMA(WindowedCloses):
+    """
+    simple moving average of closes, None until the window is full
+    """
+
+    def compute(self, count, total, _):
+        return total / count if count == self.window else None
+
+    def value(self):
+        return self.compute(*self.window_sums())
+
+    def peek(self, bar):
+        return self.compute(*self.window_sums(bar))
+
+
+class Bollinger(WindowedCloses):
+    """
+    sma of closes +- k population standard deviations
+    """
+
+    def __init__(self, window=20, k=2.0):
+        super().__init__(window)
+        self.k = k
+
+    def compute(self, count, total, total_squares):
+        if count < self.window:
+            return None
+        mean = total / count
+        # running sums drift a little, never let that turn into a negative variance
+        std = math.sqrt(max(total_squares / count - mean * mean, 0.0))
+        return {"middle": mean, "upper": mean + self.k * std, "lower": mean - self.k * std}
+
+    def value(self):
+        return self.compute(*self.window_sums())
+
+    def peek(self, bar):
+        return self.compute(*self.window_sums(bar))
+
+    def get_state(self) -> dict:
+        return dict(super().get_state(), k=self.k)
+
+    def set_state(self, state):
+        super().set_state(state)
+        self.k = state["k"]
+
+
+class EMA(Indicator):
+    """
+    exponential moving average of closes, alpha = 2 / (span + 1), starts at the first close
+    """
+
+    def __init__(self, span):
+        self.span = span
+        self.alpha = 2.0 / (span + 1)
+        self.ema = None
+
+    def seed(self, bars):
+        closes = np.asarray(bars.close, dtype=np.float64)
+        self.ema = ewm_last(closes[1:], self.alpha, float(closes[0])) if len(closes) else None
+
+    def step(self, close):
+        return close if self.ema is None else self.ema + self.alpha * (close - self.ema)
+
+    def update(self, bar):
+        self.ema = self.step(bar['close'])
+
+    def peek(self, bar):
+        return self.step(bar['close'])
+
+    def value(self):
+        return self.ema
+
+
+class RSI(Indicator):
+    """
+    wilder's relative strength index, None until period price changes were seen
+    """
+
+    def __init__(self, period=14):
+        self.period = period
+        self.previous_close = None
+        self.changes = 0
+        self.average_gain = 0.0
+        self.average_loss = 0.0
+
+    def seed(self, bars):
+        closes = np.asarray(bars.close, dtype=np.float64)
+        self.__init__(self.period)
+        if not len(closes):
+            return
+        self.previous_close = float(closes[-1])
+        changes = np.diff(closes)
+        gains, losses = np.clip(changes, 0, None), np.clip(-changes, 0, None)
+        self.changes = len(changes)
+        if self.changes < self.period:
+            # still averaging the first period plainly, keep the sums as averages of what we have
+            self.average_gain = float(gains.mean()) if self.changes else 0.0
+            self.average_loss = float(losses.mean()) if self.changes else 0.0
+            return
+        alpha = 1.0 / self.period
+        self.average_gain = ewm_last(gains[self.period:], alpha, float(gains[:self.period].mean()))
+        self.average_loss = ewm_last(losses[self.period:], alpha, float(losses[:self.period].mean()))
+
+    def step(self, close) -> (int, float, float):
+        if self.previous_close is None:
+            return 0, 0.0, 0.0
+        change = close - self.previous_close
+        gain, loss = max(change, 0.0), max(-change, 0.0)
+        changes = self.changes + 1
+        # plain mean over the first period, wilder smoothing after
+        weight = 1.0 / min(changes, self.period)
+        return (changes,
+                self.average_gain + weight * (gain - self.average_gain),
+                self.average_loss + weight * (loss - self.average_loss))
+
+    def compute(self, changes, average_gain, average_loss):
+        if changes < self.period:
+            return None
+        if not average_loss:
+            return 100.0
+        return 100.0 - 100.0 / (1.0 + average_gain / average_loss)
+
+    def update(self, bar):
+        self.changes, self.average_gain, self.average_loss = self.step(bar['close'])
+        self.previous_close = bar['close']
+
+    def peek(self, bar):
+        return self.compute(*self.step(bar['close']))
+
+    def value(self):
+        return self.compute(self.changes, self.average_gain, self.average_loss)
+
+
+class VWAP(Indicator):
+    """
+    volume weighted average typical price since the start of the bar's day
+    """
+
+    def __init__(self):
+        self.day = None
+        self.traded_value = 0.0
+        self.volume = 0
+
+    @staticmethod
+    def typical(bar):
+        return (bar['high'] + bar['low'] + bar['close']) / 3.0
+
+    def seed(self, bars):
+        self.__init__()
+        if not len(bars):
+            return
+        self.day = day_of(bars.minute[-1])
+        today = bars.between(self.day * mini_midas.series.MINUTES_PER_DAY, (self.day + 1) * mini_midas.series.MINUTES_PER_DAY)
+        self.traded_value = float(np.dot(today.typical, today.volume))
+        self.volume = int(np.asarray(today.volume).sum())
+
+    def step(self, bar) -> (int, float, int):
+        day = day_of(bar['minute'])
+        traded_value, volume = (self.traded_value, self.volume) if day == self.day else (0.0, 0)
+        return day, traded_value + self.typical(bar) * bar['volume'], volume + bar['volume']
+
+    @staticmethod
+    def compute(_, traded_value, volume):
+        return traded_value / volume if volume else None
+
+    def update(self, bar):
+        self.day, self.traded_value, self.volume = self.step(bar)
+
+    def peek(self, bar):
+        return self.compute(*self.step(bar))
+
+    def value(self):
+        return self.compute(self.day, self.traded_value, self.volume)
+
+
+class HighLow(Indicator):
+    """
+    intraday high and low of the bar's day
+    """
+
+    def __init__(self):
+        self.day = None
+        self.high = None
+        self.low = None
+
+    def seed(self, bars):
+        self.__init__()
+        if not len(bars):
+            return
+        self.day = day_of(bars.minute[-1])
+        today = bars.between(self.day * mini_midas.series.MINUTES_PER_DAY, (self.day + 1) * mini_midas.series.MINUTES_PER_DAY)
+        self.high = float(np.max(today.high))
+        self.low = float(np.min(today.low))
+
+    def step(self, bar) -> (int, float, float):
+        day = day_of(bar['minute'])
+        if day != self.day:
+            return day, bar['high'], bar['low']
+        return day, max(self.high, bar['high']), min(self.low, bar['low'])
+
+    @staticmethod
+    def compute(_, high, low):
+        return None if high is None else {"high": high, "low": low}
+
+    def update(self, bar):
+        self.day, self.high, self.low = self.step(bar)
+
+    def peek(self, bar):
+        return self.compute(*self.step(bar))
+
+    def value(self):
+        return self.compute(self.day, self.high, self.low)
+
+
+INDICATOR_TYPES = {
+    "SMA": SMA, "EMA": EMA, "RSI": RSI, "VWAP": VWAP, "Bollinger": Bollinger, "HighLow": HighLow,
+}
+
+
+def default_indicators() -> dict:
+    return {
+        "sma_20": SMA(20),
+        "ema_12": EMA(12),
+        "ema_26": EMA(26),
+        "rsi_14": RSI(14),
+        "vwap": VWAP(),
+        "bollinger_20": Bollinger(20, 2.0),
+        "high_low": HighLow(),
+    }
+
+
+def get_state_path(ticker, date_str):
+    return f"{mini_midas.common.get_bar_storage_path(ticker)}/{ticker}.{date_str}{STATE_SUFFIX}"
+
+
+class IndicatorEngine:
+    """
+    feeds one ticker's bars to its registered indicators
+    """
+
+    def __init__(self, ticker, indicators=None, persist=True, writer=None):
+        """
+        with a PartitionedWriter the state file is written by its background thread
+        """
+        self.ticker = ticker
+        self.indicators = default_indicators() if indicators is None else dict(indicators)
+        self.persist = persist
+        self.writer = writer
+        # bar of the current minute, not committed yet
+        self.pending = None
+
+    def register(self, name, indicator):
+        """
+        an indicator added after seeding starts from the next committed bar
+        """
+        self.indicators[name] = indicator
+
+    def seed(self, bars):
+        """
+        one vectorized pass over sorted bars, the last bar stays pending
+        """
+        bars = bars.sorted_unique()
+        if not len(bars):
+            return
+        committed = bars.take(slice(0, len(bars) - 1))
+        for indicator in self.indicators.values():
+            indicator.seed(committed)
+        last = len(bars) - 1
+        self.pending = {name: getattr(bars, name)[last].item() for name in mini_midas.series.COLUMNS}
+        self.save()
+
+    def on_bar(self, minute, open_price, high_price, low_price, close_price, volume):
+        """
+        O(1) per indicator, a later minute commits the pending bar, the same minute replaces it
+        """
+        bar = {"minute": int(minute), "open": open_price, "high": high_price, "low": low_price,
+               "close": close_price, "volume": int(volume)}
+        if self.pending is not None:
+            if bar["minute"] < self.pending["minute"]:
+                return
+            if bar["minute"] > self.pending["minute"]:
+                for indicator in self.indicators.values():
+                    indicator.update(self.pending)
+        self.pending = bar
+        self.save()
+
+    def values(self) -> dict:
+        """
+        current value of every indicator, including the pending bar
+        """
+        if self.pending is None:
+            return {name: indicator.value() for name, indicator in self.indicators.items()}
+        return {name: indicator.peek(self.pending) for name, indicator in self.indicators.items()}
+
+    def get_state(self) -> dict:
+        return {
+            "ticker": self.ticker,
+            "pending": self.pending,
+            "values": self.values(),
+            "indicators": {
+                name: {"type": type(indicator).__name__, "state": indicator.get_state()}
+                for name, indicator in self.indicators.items()
+            },
+        }
+
+    def save(self):
+        """
+        state and values replace the day's state file atomically, readers never see half a file
+        """
+        if not self.persist or self.pending is None:
+            return
+        path = get_state_path(self.ticker, mini_midas.series.minute_to_date_string(self.pending["minute"]))
+        if self.writer is not None:
+            self.writer.submit_document(path, self.get_state())
+            return
+        pathlib.Path(os.path.dirname(path)).mkdir(parents=True, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as fil:
+            json.dump(self.get_state(), fil)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, ticker, date_str=None, persist=False):
+        """
+        engine restored from a saved state file, None if there is none
+        """
+        date_str = date_str or mini_midas.common.split_date_string()[0]
+        path = get_state_path(ticker, date_str)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as fil:
+            state = json.load(fil)
+        indicators = {}
+        for name, saved in state["indicators"].items():
+            indicator = INDICATOR_TYPES[saved["type"]].__new__(INDICATOR_TYPES[saved["type"]])
+            indicator.set_state(saved["state"])
+            indicators[name] = indicator
+        engine = cls(ticker, indicators, persist=persist)
+        engine.pending = state["pending"]
+        return engine
+
+
+def read_values(ticker, date_str=None) -> dict:
+    """
+    latest indicator values saved by the retriever of ticker, {} if it hasn't written any today
+    """
+    date_str = date_str or mini_midas.common.split_date_string()[0]
+    path = get_state_path(ticker, date_str)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as fil:
+        return json.load(fil)["values"]
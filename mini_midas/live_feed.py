@@ -0,0 +1,258 @@
+"""
+shared memory live feed of minute bars between collectors and plotters
+
+files only show a bar once the writer folded it into an hour file, this gives plotters
+every bar as soon as the retriever has it: one ring per ticker in multiprocessing.shared_memory,
+the retriever is the only writer, any number of local readers map the same memory
+
+memory layout:
+    header, 64 bytes of little endian uint64: magic, capacity, instance, sequence, count
+    capacity records of (minute, open, high, low, close, volume), same columns as series.Bars
+
+seqlock: the writer makes sequence odd, writes the record and count, makes sequence even again,
+a reader copies what it needs and retries when sequence was odd or moved meanwhile,
+so readers never lock and never slow the writer down
+
+a second quote of the same minute rewrites the newest record instead of adding one,
+so readers always re-read the newest record they have seen
+
+rings outlive the processes using them, a restarted retriever carries on with the ring readers
+already have mapped, unlink(ticker) removes one
+
+    feed = LiveFeedWriter('tsla')
+    feed.publish(minute, open, high, low, close, volume)
+
+    reader = LiveFeedReader('tsla')
+    bars = reader.read_new()    # Bars published since the last call, empty when no retriever runs
+"""
+import inspect
+import os
+import time
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+import numpy as np
+import excalibur
+import mini_midas
+
+
+LOG_INSTANCE = excalibur.logger.getlogger_debug()
+
+MAGIC = 0x4d4d4c4956454649
+# magic, capacity, instance, sequence, count
+HEADER_FIELDS = 5
+HEADER_SIZE = 64
+MAGIC_FIELD, CAPACITY_FIELD, INSTANCE_FIELD, SEQUENCE_FIELD, COUNT_FIELD = range(HEADER_FIELDS)
+RECORD_DTYPE = np.dtype([(name, np.dtype(dtype).newbyteorder('<'))
+                         for name, dtype in mini_midas.series.COLUMN_DTYPES.items()])
+# a whole extended hours session is 960 minutes, a few days fit
+DEFAULT_CAPACITY = 4096
+# keeps rings of a replay apart from the live collectors' rings of the same tickers
+NAMESPACE = os.environ.get("MINI_MIDAS_FEED_NAMESPACE", "")
+
+OVERRUNS = mini_midas.metrics.counter(
+    "mini_midas_live_feed_overruns_total", "bars a reader missed because the ring wrapped before it read them")
+
+
+def get_feed_name(ticker) -> str:
+    if NAMESPACE:
+        return f"mini_midas_{NAMESPACE}_{ticker.lower()}"
+    return f"mini_midas_{ticker.lower()}"
+
+
+def get_size(capacity) -> int:
+    return HEADER_SIZE + capacity * RECORD_DTYPE.itemsize
+
+
+# python 3.13 can leave segments untracked, before that we unregister them ourselves
+TRACK_SUPPORTED = 'track' in inspect.signature(shared_memory.SharedMemory).parameters
+
+
+def open_segment(name, create=False, size=0):
+    """
+    python unlinks segments a process created or attached to when that process exits,
+    a reader or a retriever exiting must not take the ring away from everyone else
+    """
+    if TRACK_SUPPORTED:
+        return shared_memory.SharedMemory(name=name, create=create, size=size, track=False)
+    shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def attach(name):
+    """
+    maps an existing ring, None if there is none
+    """
+    try:
+        return open_segment(name)
+    except FileNotFoundError:
+        return None
+
+
+def unlink(ticker):
+    shm = attach(get_feed_name(ticker))
+    if shm is None:
+        return
+    if not TRACK_SUPPORTED:
+        # unlink unregisters the segment, it has to be registered for that
+        resource_tracker.register(shm._name, "shared_memory")
+    shm.close()
+    shm.unlink()
+
+
+class Ring:
+    """
+    numpy views over a ring segment
+    """
+
+    def __init__(self, shm):
+        self.shm = shm
+        self.header = np.ndarray((HEADER_FIELDS,), dtype='<u8', buffer=shm.buf)
+        if int(self.header[MAGIC_FIELD]) != MAGIC:
+            self.close()
+            raise Exception(f"Shared memory {shm.name} is not a mini_midas live feed")
+        self.capacity = int(self.header[CAPACITY_FIELD])
+        self.instance = int(self.header[INSTANCE_FIELD])
+        self.records = np.ndarray((self.capacity,), dtype=RECORD_DTYPE, buffer=shm.buf, offset=HEADER_SIZE)
+
+    def close(self):
+        # views keep the buffer exported, release them before the mapping goes
+        self.header = self.records = None
+        self.shm.close()
+
+
+class LiveFeedWriter:
+    """
+    publishing side, one per ticker, only one process may publish a ticker
+    """
+
+    def __init__(self, ticker, capacity=DEFAULT_CAPACITY):
+        self.ticker = ticker
+        name = get_feed_name(ticker)
+        try:
+            shm = open_segment(name, create=True, size=get_size(capacity))
+            header = np.ndarray((HEADER_FIELDS,), dtype='<u8', buffer=shm.buf)
+            header[CAPACITY_FIELD] = capacity
+            header[INSTANCE_FIELD] = int.from_bytes(os.urandom(8), 'little')
+            header[SEQUENCE_FIELD] = 0
+            header[COUNT_FIELD] = 0
+            # magic last, a reader attaching half way through init refuses the segment
+            header[MAGIC_FIELD] = MAGIC
+            del header
+        except FileExistsError:
+            # a restarted retriever carries on with the ring its predecessor left behind
+            shm = open_segment(name)
+        self.ring = Ring(shm)
+        if self.ring.header[SEQUENCE_FIELD] % 2:
+            # predecessor died half way through a publish, readers would wait on it forever
+            self.ring.header[SEQUENCE_FIELD] += 1
+
+    def publish(self, minute, open_price, high_price, low_price, close_price, volume):
+        ring = self.ring
+        header, records = ring.header, ring.records
+        sequence = header[SEQUENCE_FIELD]
+        header[SEQUENCE_FIELD] = sequence + 1
+        count = int(header[COUNT_FIELD])
+        if count and records['minute'][(count - 1) % ring.capacity] == minute:
+            count -= 1
+        records[count % ring.capacity] = (minute, open_price, high_price, low_price, close_price, volume)
+        header[COUNT_FIELD] = count + 1
+        header[SEQUENCE_FIELD] = sequence + 2
+
+    def publish_bars(self, bars):
+        for index in range(len(bars)):
+            self.publish(bars.minute[index], bars.open[index], bars.high[index], bars.low[index],
+                         bars.close[index], bars.volume[index])
+
+    def close(self):
+        """
+        unmaps the ring, it stays around for readers and the next retriever
+        """
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+
+class LiveFeedReader:
+    """
+    reading side, attaches lazily and follows a retriever restart to its new ring
+    """
+    RETRIES = 100
+    # a silent ring is checked this often for having been replaced by a new retriever
+    REATTACH_SECONDS = 5.0
+
+    def __init__(self, ticker):
+        self.ticker = ticker
+        self.ring = None
+        self.seen = 0
+        self.last_attach = None
+
+    def try_attach(self):
+        """
+        attaches when there is no ring yet or the ring was replaced, at most every REATTACH_SECONDS
+        """
+        now = time.monotonic()
+        if self.last_attach is not None and now - self.last_attach < self.REATTACH_SECONDS:
+            return
+        self.last_attach = now
+        shm = attach(get_feed_name(self.ticker))
+        if shm is None:
+            return
+        try:
+            ring = Ring(shm)
+        except Exception as e:
+            LOG_INSTANCE.warning("Unable to attach live feed of %s, error: %s", self.ticker, str(e))
+            return
+        if self.ring is not None and ring.instance == self.ring.instance:
+            ring.close()
+            return
+        if self.ring is not None:
+            LOG_INSTANCE.info("Live feed of %s was restarted, following the new one", self.ticker)
+            self.ring.close()
+        self.ring = ring
+        self.seen = 0
+
+    @property
+    def is_attached(self) -> bool:
+        return self.ring is not None
+
+    def snapshot(self):
+        """
+        consistent (count, records) copy of what was published since we last read, None if the writer kept us out
+        """
+        header, records, capacity = self.ring.header, self.ring.records, self.ring.capacity
+        for _ in range(self.RETRIES):
+            sequence = header[SEQUENCE_FIELD]
+            if sequence % 2:
+                time.sleep(0)
+                continue
+            count = int(header[COUNT_FIELD])
+            # the newest record we saw may have been rewritten by a later quote of the same minute
+            first = max(self.seen - 1, count - capacity, 0)
+            copied = records.take(np.arange(first, count) % capacity)
+            if header[SEQUENCE_FIELD] == sequence:
+                if self.seen and first > self.seen:
+                    OVERRUNS.inc(first - self.seen)
+                return count, copied
+        return None
+
+    def read_new(self) -> mini_midas.series.Bars:
+        """
+        bars published since the last call, the newest bar seen before is returned again
+        """
+        if self.ring is None or self.seen == self.ring.header[COUNT_FIELD]:
+            self.try_attach()
+        if self.ring is None:
+            return mini_midas.series.Bars()
+        snapshot = self.snapshot()
+        if snapshot is None:
+            return mini_midas.series.Bars()
+        self.seen, copied = snapshot
+        # gap fills publish bars older than the newest one, readers get them sorted
+        return mini_midas.series.Bars(**{name: copied[name].astype(dtype)
+                                         for name, dtype in mini_midas.series.COLUMN_DTYPES.items()}).sorted_unique()
+
+    def close(self):
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
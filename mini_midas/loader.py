@@ -0,0 +1,192 @@
+"""
+incremental loading of a ticker's saved files
+
+the plotter refreshes every 20 seconds, re-reading every hour file of the day each time is wasteful,
+the loader remembers which files it has ingested by (path, mtime, size)
+and only reads the files that are new or changed since the last refresh
+
+with live=True bars the retriever publishes to its shared memory feed are merged in on every refresh,
+files are then only looked at every file_interval seconds, they mostly hold what the feed already gave us
+
+every bar remembers the source it came from, official bars from the official partition are not
+overwritten by ticks of the same minute arriving later from the hour files or the feed
+
+    loader = IncrementalLoader('tsla')
+    bars = loader.refresh()
+"""
+import os
+import time
+import numpy as np
+import excalibur
+import mini_midas
+
+
+LOG_INSTANCE = excalibur.logger.getlogger_debug()
+
+
+class BarArrays:
+    """
+    growable sorted columns, appending n bars costs O(n) amortized instead of copying the whole day
+    """
+    INITIAL_CAPACITY = 512
+
+    def __init__(self):
+        self.length = 0
+        self.columns = {
+            name: np.empty(self.INITIAL_CAPACITY, dtype=dtype)
+            for name, dtype in mini_midas.series.COLUMN_DTYPES.items()
+        }
+        self.sources = np.empty(self.INITIAL_CAPACITY, dtype=mini_midas.merge.SOURCE_DTYPE)
+
+    def __len__(self):
+        return self.length
+
+    def view(self) -> mini_midas.series.Bars:
+        """
+        returns the loaded bars without copying
+        """
+        return mini_midas.series.Bars(**{name: column[:self.length] for name, column in self.columns.items()})
+
+    def reserve(self, length):
+        capacity = len(self.columns['minute'])
+        if length <= capacity:
+            return
+        while capacity < length:
+            capacity *= 2
+        for name, column in self.columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.length] = column[:self.length]
+            self.columns[name] = grown
+        grown = np.empty(capacity, dtype=self.sources.dtype)
+        grown[:self.length] = self.sources[:self.length]
+        self.sources = grown
+
+    def replace(self, bars, sources):
+        self.length = 0
+        self.append(bars, sources)
+
+    def append(self, bars, sources):
+        """
+        appends sorted bars that are all newer than what we have
+        """
+        new_length = self.length + len(bars)
+        self.reserve(new_length)
+        for name, column in self.columns.items():
+            column[self.length:new_length] = getattr(bars, name)
+        self.sources[self.length:new_length] = sources
+        self.length = new_length
+
+    def merge(self, bars, source=None) -> int:
+        """
+        merges sorted unique bars in, returns number of bars added
+
+        the common case is every bar being newer than the last one we have, that is a plain append,
+        bars we already have are updated in place unless they came from a stronger source,
+        only bars landing in a hole force a rebuild
+        """
+        if not len(bars):
+            return 0
+        source = mini_midas.merge.SOURCE_UNKNOWN if source is None else source
+        last_minute = self.columns['minute'][self.length - 1] if self.length else None
+        if last_minute is None or bars.minute[0] > last_minute:
+            self.append(bars, source)
+            return len(bars)
+
+        minutes = self.columns['minute'][:self.length]
+        is_new = bars.minute > last_minute
+        old_bars, new_bars = bars.take(~is_new), bars.take(is_new)
+
+        positions = np.searchsorted(minutes, old_bars.minute)
+        positions_in_range = np.minimum(positions, self.length - 1)
+        is_known = minutes[positions_in_range] == old_bars.minute
+        if not is_known.all():
+            merged, sources, _ = mini_midas.merge.merge_runs(
+                [(self.view(), self.sources[:self.length]), (bars, source)])
+            added = len(merged) - self.length
+            self.replace(merged, sources)
+            return added
+
+        wins = mini_midas.merge.PRECEDENCE[source] >= mini_midas.merge.PRECEDENCE[self.sources[positions]]
+        for name, column in self.columns.items():
+            column[positions[wins]] = getattr(old_bars, name)[wins]
+        self.sources[positions[wins]] = source
+        self.append(new_bars, source)
+        return len(new_bars)
+
+
+class IncrementalLoader:
+    """
+    loads one ticker's files of the day, only reading what changed since the last refresh
+    """
+
+    def __init__(self, ticker, live=False, file_interval=0.0):
+        self.ticker = ticker
+        self.feed = mini_midas.live_feed.LiveFeedReader(ticker) if live else None
+        self.file_interval = file_interval
+        self.last_file_refresh = None
+        self.reset()
+
+    def reset(self):
+        self.date_str = None
+        self.ingested = {}
+        self.arrays = BarArrays()
+
+    @staticmethod
+    def fingerprint(file_path):
+        """
+        (mtime, size) of a file, None if it is gone
+        """
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def changed_files(self) -> list:
+        """
+        returns [(path, fingerprint)] of files new or changed since they were ingested
+        """
+        changed = []
+        for file_path in mini_midas.common.get_all_file_saved_path(self.ticker):
+            fingerprint = self.fingerprint(file_path)
+            if fingerprint is not None and self.ingested.get(file_path) != fingerprint:
+                changed.append((file_path, fingerprint))
+        return changed
+
+    def refresh(self) -> mini_midas.series.Bars:
+        """
+        ingests new or changed files and the live feed, returns all bars of the day
+        """
+        date_str, _ = mini_midas.common.split_date_string()
+        if date_str != self.date_str:
+            # new day, start over
+            self.reset()
+            self.date_str = date_str
+            self.last_file_refresh = None
+
+        if self.last_file_refresh is None or time.monotonic() - self.last_file_refresh >= self.file_interval:
+            self.refresh_files()
+            self.last_file_refresh = time.monotonic()
+        if self.feed is not None:
+            self.refresh_feed()
+        return self.arrays.view()
+
+    def refresh_feed(self):
+        day_start = mini_midas.series.date_string_to_minute(self.date_str)
+        bars = self.feed.read_new().between(day_start, day_start + mini_midas.series.MINUTES_PER_DAY)
+        added = self.arrays.merge(bars, mini_midas.merge.SOURCE_SYNTHESIZED)
+        if added:
+            LOG_INSTANCE.debug("%s bars added from the live feed", added)
+
+    def refresh_files(self):
+        for file_path, fingerprint in self.changed_files():
+            LOG_INSTANCE.info("Reading from %s", file_path)
+            try:
+                bars = mini_midas.storage_codec.read_bars(file_path)
+            except Exception as e:
+                # writer may be in the middle of replacing the file, we will pick it up next refresh
+                LOG_INSTANCE.warning("Unable to read %s, error: %s", file_path, str(e))
+                continue
+            added = self.arrays.merge(bars, mini_midas.manifest.source_of_path(file_path))
+            self.ingested[file_path] = fingerprint
+            LOG_INSTANCE.debug("%s bars added from %s", added, file_path)
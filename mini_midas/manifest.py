@@ -0,0 +1,223 @@
+"""
+per ticker storage manifest
+
+every data file written for a ticker (hourly intraday, historical day, bar store day) gets an entry
+with its first/last minute, bar count and checksum, entries are kept sorted by first minute so a
+range query bisects to the files overlapping the window instead of probing or globbing the tree
+
+    manifest.record_file('tsla', path, bars, 'intraday')
+    manifest.files_for_range('tsla', start_minute, end_minute)
+"""
+import bisect
+import contextlib
+import fcntl
+import json
+import os
+import pathlib
+import threading
+import zlib
+import mini_midas
+
+
+KIND_INTRADAY = "intraday"
+KIND_HISTORICAL = "historical"
+KIND_BARS = "bars"
+
+
+def get_manifest_path(ticker):
+    return f"{mini_midas.common.DATA_STORAGE_PATH}/manifest/{ticker}.json"
+
+
+def file_checksum(path) -> str:
+    checksum = 0
+    with open(path, 'rb') as fil:
+        for chunk in iter(lambda: fil.read(1 << 20), b""):
+            checksum = zlib.crc32(chunk, checksum)
+    return f"{checksum:08x}"
+
+
+@contextlib.contextmanager
+def locked(path):
+    """
+    exclusive lock shared by every process writing this manifest
+    """
+    pathlib.Path(os.path.dirname(path)).mkdir(parents=True, exist_ok=True)
+    with open(f"{path}.lock", 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class Manifest:
+    """
+    sorted entries of one ticker with bisect friendly index arrays
+    """
+
+    def __init__(self, entries=None):
+        self.entries = sorted(entries or [], key=lambda entry: (entry["first"], entry["path"]))
+        self.build_index()
+
+    def build_index(self):
+        self.firsts = [entry["first"] for entry in self.entries]
+        # running max of last minutes, lets us bisect away every entry ending before a window
+        self.max_lasts = []
+        running_max = None
+        for entry in self.entries:
+            running_max = entry["last"] if running_max is None else max(running_max, entry["last"])
+            self.max_lasts.append(running_max)
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return cls()
+        with open(path, 'r') as fil:
+            return cls(json.load(fil).get("entries", []))
+
+    def save(self, path):
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as fil:
+            json.dump({"entries": self.entries}, fil)
+        os.replace(temp_path, path)
+
+    def upsert(self, entry):
+        """
+        a rewritten file replaces its old entry
+        """
+        entries = [old for old in self.entries if old["path"] != entry["path"]]
+        entries.append(entry)
+        self.entries = sorted(entries, key=lambda old: (old["first"], old["path"]))
+        self.build_index()
+
+    def remove(self, path):
+        self.entries = [entry for entry in self.entries if entry["path"] != path]
+        self.build_index()
+
+    def overlapping(self, start_minute, end_minute, kinds=None) -> list:
+        """
+        entries holding any bar with start_minute <= minute < end_minute
+        """
+        low = bisect.bisect_left(self.max_lasts, start_minute)
+        high = bisect.bisect_left(self.firsts, end_minute)
+        return [
+            entry for entry in self.entries[low:high]
+            if entry["last"] >= start_minute and (kinds is None or entry["kind"] in kinds)
+        ]
+
+
+# parsed manifests of this process, keyed by ticker, reloaded only when the file changes
+CACHE = {}
+CACHE_LOCK = threading.Lock()
+
+
+def load(ticker) -> Manifest:
+    path = get_manifest_path(ticker)
+    try:
+        stat = os.stat(path)
+        fingerprint = (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        return Manifest()
+    with CACHE_LOCK:
+        cached = CACHE.get(ticker)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+    manifest = Manifest.load(path)
+    with CACHE_LOCK:
+        CACHE[ticker] = (fingerprint, manifest)
+    return manifest
+
+
+def kind_of_path(path) -> str:
+    if "/historical/" in path:
+        return KIND_HISTORICAL
+    if "/intraday/" in path:
+        return KIND_INTRADAY
+    return KIND_BARS
+
+
+def source_of_path(path) -> int:
+    """
+    official snapshots have their own intraday partition, hour files only hold ticks,
+    historical and bar store days can hold both
+    """
+    if path.endswith(mini_midas.common.OFFICIAL_SUFFIX):
+        return mini_midas.merge.SOURCE_OFFICIAL
+    if "/intraday/" in path:
+        return mini_midas.merge.SOURCE_SYNTHESIZED
+    return mini_midas.merge.SOURCE_UNKNOWN
+
+
+def record_file(ticker, path, bars, kind=None, source=None):
+    """
+    adds or refreshes the entry of a file just written with these bars
+    """
+    if not len(bars):
+        return
+    stat = os.stat(path)
+    source = source_of_path(path) if source is None else source
+    entry = {
+        "path": path,
+        "kind": kind or kind_of_path(path),
+        "source": mini_midas.merge.SOURCE_NAMES[source],
+        "first": int(bars.minute[0]),
+        "last": int(bars.minute[-1]),
+        "bars": len(bars),
+        "checksum": file_checksum(path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+    manifest_path = get_manifest_path(ticker)
+    with locked(manifest_path):
+        manifest = Manifest.load(manifest_path)
+        manifest.upsert(entry)
+        manifest.save(manifest_path)
+
+
+def remove_file(ticker, path):
+    manifest_path = get_manifest_path(ticker)
+    with locked(manifest_path):
+        manifest = Manifest.load(manifest_path)
+        manifest.remove(path)
+        manifest.save(manifest_path)
+
+
+def mark_consolidated(ticker, path, fingerprint):
+    """
+    flags the entry of a bar store day whose consolidation was validated, fingerprint is the (mtime_ns, size)
+    consolidation wrote, a file rewritten since then keeps its entry unflagged, so does every later rewrite
+    """
+    manifest_path = get_manifest_path(ticker)
+    with locked(manifest_path):
+        manifest = Manifest.load(manifest_path)
+        for entry in manifest.entries:
+            if entry["path"] == path and (entry["mtime_ns"], entry["size"]) == tuple(fingerprint):
+                entry["consolidated"] = True
+        manifest.save(manifest_path)
+
+
+def files_for_range(ticker, start_minute, end_minute, kinds=None) -> list:
+    """
+    paths of files overlapping start_minute <= minute < end_minute, ordered by their first bar
+    """
+    return [entry["path"] for entry in load(ticker).overlapping(start_minute, end_minute, kinds)]
+
+
+def files_for_dates(ticker, start_date, end_date, kinds=None) -> list:
+    """
+    same as files_for_range for "%Y%m%d" dates, both inclusive
+    """
+    start_minute = mini_midas.series.date_string_to_minute(start_date)
+    end_minute = mini_midas.series.date_string_to_minute(end_date) + mini_midas.series.MINUTES_PER_DAY
+    return files_for_range(ticker, start_minute, end_minute, kinds)
+
+
+def verify(ticker) -> list:
+    """
+    returns paths whose file is missing or no longer matches its checksum
+    """
+    broken = []
+    for entry in load(ticker).entries:
+        if not os.path.exists(entry["path"]) or file_checksum(entry["path"]) != entry["checksum"]:
+            broken.append(entry["path"])
+    return broken
@@ -0,0 +1,293 @@
+"""
+NYSE trading session calendar in US/Eastern time
+
+sessions of FIRST_YEAR to LAST_YEAR are computed once from the exchange holiday rules,
+regular sessions are 09:30 to 16:00, half days close at 13:00
+
+    market_calendar.is_open()             # O(1), one dict lookup
+    market_calendar.next_open()           # O(log n), bisect over session opens
+    market_calendar.seconds_until_open()  # what the collectors sleep on
+
+everything asks this module for the time, set_clock swaps the wall clock for a simulated one (mini_midas.replay)
+"""
+import bisect
+import datetime
+import time
+import zoneinfo
+
+
+EASTERN = zoneinfo.ZoneInfo("America/New_York")
+FIRST_YEAR = 2015
+LAST_YEAR = 2035
+OPEN_TIME = datetime.time(9, 30)
+CLOSE_TIME = datetime.time(16, 0)
+HALF_DAY_CLOSE_TIME = datetime.time(13, 0)
+
+# closures that don't follow any rule, national days of mourning etc.
+SPECIAL_CLOSURES = {
+    datetime.date(2018, 12, 5),  # president george h.w. bush
+    datetime.date(2025, 1, 9),  # president jimmy carter
+}
+
+
+def nth_weekday(year, month, weekday, nth) -> datetime.date:
+    """
+    nth (1 based) weekday of a month, nth=-1 is the last one, weekday is 0 for monday
+    """
+    if nth > 0:
+        first = datetime.date(year, month, 1)
+        return first + datetime.timedelta(days=(weekday - first.weekday()) % 7 + 7 * (nth - 1))
+    next_month = datetime.date(year + month // 12, month % 12 + 1, 1)
+    last = next_month - datetime.timedelta(days=1)
+    return last - datetime.timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def easter_sunday(year) -> datetime.date:
+    """
+    anonymous gregorian algorithm
+    """
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return datetime.date(year, month, day + 1)
+
+
+def observed(day) -> datetime.date:
+    """
+    a holiday on saturday is observed on friday, on sunday it is observed on monday
+    """
+    if day.weekday() == 5:
+        return day - datetime.timedelta(days=1)
+    if day.weekday() == 6:
+        return day + datetime.timedelta(days=1)
+    return day
+
+
+def holidays(year) -> set:
+    """
+    full day closures of a year
+    """
+    days = {
+        nth_weekday(year, 1, 0, 3),  # martin luther king jr. day
+        nth_weekday(year, 2, 0, 3),  # washington's birthday
+        easter_sunday(year) - datetime.timedelta(days=2),  # good friday
+        nth_weekday(year, 5, 0, -1),  # memorial day
+        observed(datetime.date(year, 7, 4)),  # independence day
+        nth_weekday(year, 9, 0, 1),  # labor day
+        nth_weekday(year, 11, 3, 4),  # thanksgiving
+        observed(datetime.date(year, 12, 25)),  # christmas
+    }
+    # new year's day on a saturday is not moved back into the previous year
+    new_year = datetime.date(year, 1, 1)
+    if new_year.weekday() != 5:
+        days.add(observed(new_year))
+    if year >= 2022:
+        days.add(observed(datetime.date(year, 6, 19)))  # juneteenth
+    days.update(day for day in SPECIAL_CLOSURES if day.year == year)
+    return days
+
+
+def half_days(year) -> set:
+    """
+    sessions closing at 13:00, only the candidates that are trading days count
+    """
+    return {
+        datetime.date(year, 7, 3),  # day before independence day
+        nth_weekday(year, 11, 3, 4) + datetime.timedelta(days=1),  # day after thanksgiving
+        datetime.date(year, 12, 24),  # christmas eve
+    }
+
+
+class MarketCalendar:
+    """
+    precomputed sessions, date -> (open, close) as aware US/Eastern datetimes
+    """
+
+    def __init__(self, first_year=FIRST_YEAR, last_year=LAST_YEAR):
+        self.first_year = first_year
+        self.last_year = last_year
+        self.sessions = {}
+        for year in range(first_year, last_year + 1):
+            closed_days = holidays(year)
+            short_days = half_days(year)
+            day = datetime.date(year, 1, 1)
+            while day.year == year:
+                if day.weekday() < 5 and day not in closed_days:
+                    close_time = HALF_DAY_CLOSE_TIME if day in short_days else CLOSE_TIME
+                    self.sessions[day] = (
+                        datetime.datetime.combine(day, OPEN_TIME, tzinfo=EASTERN),
+                        datetime.datetime.combine(day, close_time, tzinfo=EASTERN),
+                    )
+                day += datetime.timedelta(days=1)
+
+        self.days = sorted(self.sessions)
+        ordered = [self.sessions[day] for day in self.days]
+        self.opens = [session_open.timestamp() for session_open, _ in ordered]
+        self.closes = [session_close.timestamp() for _, session_close in ordered]
+        self.ordered = ordered
+
+    def check_range(self, day):
+        if not self.first_year <= day.year <= self.last_year:
+            raise Exception(f"{day} is outside of the market calendar range {self.first_year}-{self.last_year}")
+
+    def session(self, day):
+        """
+        (open, close) of a date, None if the market doesn't trade that day
+        """
+        self.check_range(day)
+        return self.sessions.get(day)
+
+    def is_trading_day(self, day) -> bool:
+        return self.session(day) is not None
+
+    def is_holiday(self, day) -> bool:
+        """
+        weekday without a session
+        """
+        return day.weekday() < 5 and not self.is_trading_day(day)
+
+    def is_half_day(self, day) -> bool:
+        session = self.session(day)
+        return session is not None and session[1].time() == HALF_DAY_CLOSE_TIME
+
+    def is_open(self, now=None) -> bool:
+        now = now_eastern(now)
+        session = self.session(now.date())
+        return session is not None and session[0] <= now < session[1]
+
+    def has_closed(self, now=None) -> bool:
+        """
+        True when no more trading happens today, either the session ended or there is none today
+        """
+        now = now_eastern(now)
+        session = self.session(now.date())
+        return session is None or now >= session[1]
+
+    def next_open(self, now=None) -> datetime.datetime:
+        """
+        the next session open at or after now
+        """
+        now = now_eastern(now)
+        index = bisect.bisect_left(self.opens, now.timestamp())
+        if index == len(self.opens):
+            raise Exception(f"No session after {now} in the market calendar")
+        return self.ordered[index][0]
+
+    def next_close(self, now=None) -> datetime.datetime:
+        """
+        close of the current session if open, otherwise close of the next session
+        """
+        now = now_eastern(now)
+        index = bisect.bisect_right(self.closes, now.timestamp())
+        if index == len(self.closes):
+            raise Exception(f"No session after {now} in the market calendar")
+        return self.ordered[index][1]
+
+    def last_close(self, now=None) -> datetime.datetime:
+        """
+        close of the latest session that ended at or before now
+        """
+        now = now_eastern(now)
+        index = bisect.bisect_right(self.closes, now.timestamp())
+        if index == 0:
+            raise Exception(f"No session before {now} in the market calendar")
+        return self.ordered[index - 1][1]
+
+    def seconds_until_open(self, now=None) -> float:
+        """
+        0 while the market is open, otherwise seconds until the next session opens
+        """
+        now = now_eastern(now)
+        if self.is_open(now):
+            return 0.0
+        # timestamps, datetimes sharing a tzinfo subtract on the wall clock and miss a dst change in between
+        return self.next_open(now).timestamp() - now.timestamp()
+
+    def seconds_until_close(self, now=None) -> float:
+        now = now_eastern(now)
+        return max(0.0, self.next_close(now).timestamp() - now.timestamp())
+
+    def sessions_between(self, start_day, end_day) -> list:
+        """
+        [(date, open, close)] of trading days from start_day to end_day inclusive
+        """
+        first = bisect.bisect_left(self.days, start_day)
+        last = bisect.bisect_right(self.days, end_day)
+        return [(day, *self.sessions[day]) for day in self.days[first:last]]
+
+
+class SystemClock:
+    """
+    the wall clock, a clock only needs now() returning an aware datetime and sleep(seconds)
+    """
+
+    def now(self) -> datetime.datetime:
+        return datetime.datetime.now(EASTERN)
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+CLOCK = SystemClock()
+
+
+def set_clock(clock):
+    """
+    returns the clock that was in use, so it can be put back
+    """
+    global CLOCK
+    previous, CLOCK = CLOCK, clock
+    return previous
+
+
+def sleep(seconds):
+    CLOCK.sleep(seconds)
+
+
+def now_eastern(now=None) -> datetime.datetime:
+    """
+    aware US/Eastern datetime, naive datetimes passed in are taken as US/Eastern wall clock
+    """
+    if now is None:
+        return CLOCK.now().astimezone(EASTERN)
+    if now.tzinfo is None:
+        return now.replace(tzinfo=EASTERN)
+    return now.astimezone(EASTERN)
+
+
+CALENDAR = MarketCalendar()
+
+
+def is_open(now=None) -> bool:
+    return CALENDAR.is_open(now)
+
+
+def has_closed(now=None) -> bool:
+    return CALENDAR.has_closed(now)
+
+
+def next_open(now=None) -> datetime.datetime:
+    return CALENDAR.next_open(now)
+
+
+def next_close(now=None) -> datetime.datetime:
+    return CALENDAR.next_close(now)
+
+
+def last_close(now=None) -> datetime.datetime:
+    return CALENDAR.last_close(now)
+
+
+def seconds_until_open(now=None) -> float:
+    return CALENDAR.seconds_until_open(now)
+
+
+def seconds_until_close(now=None) -> float:
+    return CALENDAR.seconds_until_close(now)
@@ -0,0 +1,155 @@
+"""
+k-way merge of sorted bar runs with source precedence
+
+every partition we store (an hour file, a day in the bar store, the official intraday snapshot, the live feed)
+is already sorted by minute, merging them is one pass over preallocated columns: the runs are copied
+back to back and a stable argsort, which is timsort, finds the k runs and merges them in O(n log k)
+
+when several runs have a bar for the same minute the source decides, official TIME_SERIES_INTRADAY bars
+beat GLOBAL_QUOTE ticks we synthesized at receive time, equal sources go to the newer run (the later one),
+which is what every merge did before sources were tracked
+
+    MINI_MIDAS_SOURCE_PRECEDENCE=official,unknown,synthesized  (default, strongest first)
+
+    bars, sources, stats = merge_runs([(stored, stored_sources), (ticks, SOURCE_SYNTHESIZED)])
+    stats.as_dict()   # {'inputs': ..., 'duplicates': ..., 'conflicts': ..., 'overrides': {'official>synthesized': ...}}
+"""
+import collections
+import os
+import numpy as np
+import mini_midas
+
+
+# source codes, stored as uint8 next to the bars
+SOURCE_UNKNOWN = 0  # written before sources were tracked, or a cache dump holding both
+SOURCE_SYNTHESIZED = 1
+SOURCE_OFFICIAL = 2
+SOURCE_CODES = {"unknown": SOURCE_UNKNOWN, "synthesized": SOURCE_SYNTHESIZED, "official": SOURCE_OFFICIAL}
+SOURCE_NAMES = {code: name for name, code in SOURCE_CODES.items()}
+SOURCE_DTYPE = np.uint8
+
+VALUE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+MERGED_BARS = mini_midas.metrics.counter(
+    "mini_midas_merge_bars_total", "bars going through partition merges", ("outcome",))
+
+
+def parse_precedence(spec) -> np.ndarray:
+    """
+    "official,unknown,synthesized" strongest first -> rank of every source code, higher wins
+    """
+    names = [name.strip() for name in spec.split(",") if name.strip()]
+    if sorted(names) != sorted(SOURCE_CODES):
+        raise Exception(f"Source precedence has to order all of {list(SOURCE_CODES)}, got {spec}")
+    ranks = np.zeros(len(SOURCE_CODES), dtype=np.int64)
+    for rank, name in enumerate(reversed(names)):
+        ranks[SOURCE_CODES[name]] = rank
+    return ranks
+
+
+PRECEDENCE = parse_precedence(os.environ.get("MINI_MIDAS_SOURCE_PRECEDENCE", "official,unknown,synthesized"))
+
+
+class MergeStats:
+    """
+    what a merge did, duplicates are bars that lost their minute to another bar,
+    conflicts are duplicates whose prices or volume differ from the winner,
+    overrides count duplicates decided by precedence rather than by recency
+    """
+
+    def __init__(self):
+        self.inputs = 0
+        self.outputs = 0
+        self.duplicates = 0
+        self.conflicts = 0
+        self.overrides = collections.Counter()
+
+    def add(self, other):
+        self.inputs += other.inputs
+        self.outputs += other.outputs
+        self.duplicates += other.duplicates
+        self.conflicts += other.conflicts
+        self.overrides.update(other.overrides)
+
+    def as_dict(self) -> dict:
+        return {"inputs": self.inputs, "outputs": self.outputs, "duplicates": self.duplicates,
+                "conflicts": self.conflicts, "overrides": dict(self.overrides)}
+
+    def __repr__(self):
+        return str(self.as_dict())
+
+
+def source_array(source, length) -> np.ndarray:
+    """
+    per bar source codes from a single code or an array of them
+    """
+    if np.isscalar(source):
+        return np.full(length, source, dtype=SOURCE_DTYPE)
+    return np.asarray(source, dtype=SOURCE_DTYPE)
+
+
+def merge_runs(runs, precedence=None) -> (mini_midas.series.Bars, np.ndarray, MergeStats):
+    """
+    runs: [(bars, source)] oldest first, bars sorted by minute, source a code or one code per bar,
+    returns the merged bars with one bar per minute, their sources and what happened
+    """
+    precedence = PRECEDENCE if precedence is None else precedence
+    runs = [(bars, source) for bars, source in runs if len(bars)]
+    stats = MergeStats()
+    if not runs:
+        return mini_midas.series.Bars(), np.empty(0, dtype=SOURCE_DTYPE), stats
+
+    total = sum(len(bars) for bars, _ in runs)
+    columns = {name: np.empty(total, dtype=dtype) for name, dtype in mini_midas.series.COLUMN_DTYPES.items()}
+    sources = np.empty(total, dtype=SOURCE_DTYPE)
+    run_index = np.empty(total, dtype=np.int64)
+    offset = 0
+    for index, (bars, source) in enumerate(runs):
+        end = offset + len(bars)
+        for name in mini_midas.series.COLUMNS:
+            columns[name][offset:end] = getattr(bars, name)
+        sources[offset:end] = source_array(source, len(bars))
+        run_index[offset:end] = index
+        offset = end
+
+    # timsort merges the k sorted runs, equal minutes keep run order
+    order = np.argsort(columns['minute'], kind='stable')
+    minutes = columns['minute'][order]
+    group_starts = np.concatenate(([0], np.flatnonzero(np.diff(minutes)) + 1))
+    group_sizes = np.diff(np.append(group_starts, total))
+
+    # stronger source first, then the newer run, then the later bar of a run
+    ranks = precedence[sources[order]]
+    keys = ranks * len(runs) + run_index[order]
+    best_keys = np.repeat(np.maximum.reduceat(keys, group_starts), group_sizes)
+    positions = np.arange(total)
+    winners = np.maximum.reduceat(np.where(keys == best_keys, positions, -1), group_starts)
+
+    merged = mini_midas.series.Bars(**{name: columns[name][order[winners]] for name in mini_midas.series.COLUMNS})
+    merged_sources = sources[order[winners]]
+
+    stats.inputs = total
+    stats.outputs = len(winners)
+    stats.duplicates = total - len(winners)
+    if stats.duplicates:
+        winner_rows = order[np.repeat(winners, group_sizes)]
+        losers = order[positions != np.repeat(winners, group_sizes)]
+        loser_winners = winner_rows[positions != np.repeat(winners, group_sizes)]
+        differs = np.zeros(len(losers), dtype=bool)
+        for name in VALUE_COLUMNS:
+            differs |= columns[name][losers] != columns[name][loser_winners]
+        stats.conflicts = int(differs.sum())
+        overridden = precedence[sources[loser_winners]] > precedence[sources[losers]]
+        pairs, counts = np.unique(
+            sources[loser_winners][overridden].astype(np.int64) * len(SOURCE_CODES) + sources[losers][overridden],
+            return_counts=True)
+        for pair, count in zip(pairs, counts):
+            winner_name = SOURCE_NAMES[int(pair) // len(SOURCE_CODES)]
+            loser_name = SOURCE_NAMES[int(pair) % len(SOURCE_CODES)]
+            stats.overrides[f"{winner_name}>{loser_name}"] += int(count)
+
+    MERGED_BARS.inc(stats.inputs, outcome="input")
+    MERGED_BARS.inc(stats.duplicates, outcome="duplicate")
+    MERGED_BARS.inc(stats.conflicts, outcome="conflict")
+    MERGED_BARS.inc(sum(stats.overrides.values()), outcome="override")
+    return merged, merged_sources, stats
@@ -0,0 +1,463 @@
+"""
+counters, histograms and gauges for the ingestion hot paths
+
+everything registers in the process wide REGISTRY, which is exposed three ways:
+    prometheus text on http://host:port/metrics        MetricsServer, started when MINI_MIDAS_METRICS_PORT is set,
+                                                       localhost only unless MINI_MIDAS_METRICS_HOST says otherwise
+    a json snapshot rewritten every interval seconds   StatsFileWriter, DATA_STORAGE_PATH/metrics/{name}.json
+    per stage sampling profile                         SamplingProfiler, opt in with MINI_MIDAS_PROFILE=1
+
+a stage is a timed block, its duration goes into the mini_midas_stage_seconds histogram and,
+while the profiler runs, every sample taken inside it is attributed to it
+
+    with mini_midas.metrics.stage("storage_write", tier="hot"):
+        ...
+    mini_midas.metrics.counter("mini_midas_restarts_total", "monitor restarts", ("ticker",)).inc(ticker="tsla")
+"""
+import abc
+import bisect
+import collections
+import contextlib
+import http.server
+import json
+import os
+import pathlib
+import sys
+import threading
+import time
+import excalibur
+import mini_midas
+
+
+LOG_INSTANCE = excalibur.logger.getlogger_debug()
+
+# seconds, covers a cached lookup up to a slow full month download
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def format_labels(labelnames, values, extra=()) -> str:
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Metric:
+    """
+    one named metric, a value per combination of label values
+    """
+    TYPE = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def key(self, labels) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise Exception(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.TYPE}"]
+
+
+class Counter(Metric):
+    TYPE = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        with self.lock:
+            return self.values.get(self.key(labels), 0)
+
+    def render(self) -> list:
+        with self.lock:
+            values = sorted(self.values.items())
+        return self.header() + [f"{self.name}{format_labels(self.labelnames, key)} {value}" for key, value in values]
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {",".join(key): value for key, value in self.values.items()}
+
+
+class Gauge(Metric):
+    """
+    set directly, or computed by a callback returning {label values tuple: value} at read time
+    """
+    TYPE = "gauge"
+
+    def __init__(self, name, help_text, labelnames=(), callback=None):
+        super().__init__(name, help_text, labelnames)
+        self.callback = callback
+
+    def set(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def collect(self) -> list:
+        if self.callback is not None:
+            try:
+                return sorted(self.callback().items())
+            except Exception as e:
+                LOG_INSTANCE.warning("Unable to collect gauge %s, error: %s", self.name, str(e))
+                return []
+        with self.lock:
+            return sorted(self.values.items())
+
+    def render(self) -> list:
+        return self.header() + [
+            f"{self.name}{format_labels(self.labelnames, key)} {value}"
+            for key, value in self.collect() if value is not None
+        ]
+
+    def snapshot(self) -> dict:
+        return {",".join(key): value for key, value in self.collect()}
+
+
+class Histogram(Metric):
+    """
+    per label values: count of observations per bucket, their sum and count
+    """
+    TYPE = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list:
+        with self.lock:
+            values = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self.values.items())
+        lines = self.header()
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{format_labels(self.labelnames, key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, key)} {count}")
+        return lines
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                ",".join(key): {"count": count, "sum": total, "mean": total / count if count else 0.0}
+                for key, (_, total, count) in self.values.items()
+            }
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric_class, name, *args, **kwargs):
+        """
+        returns the metric of that name, created on first use so modules can declare it where they use it
+        """
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = metric_class(name, *args, **kwargs)
+            elif not isinstance(metric, metric_class):
+                raise Exception(f"Metric {name} already registered as a {metric.TYPE}")
+            return metric
+
+    def render(self) -> str:
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help_text, labelnames=()) -> Counter:
+    return REGISTRY.register(Counter, name, help_text, labelnames)
+
+
+def gauge(name, help_text, labelnames=(), callback=None) -> Gauge:
+    return REGISTRY.register(Gauge, name, help_text, labelnames, callback=callback)
+
+
+def histogram(name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram, name, help_text, labelnames, buckets=buckets)
+
+
+STAGE_SECONDS = histogram("mini_midas_stage_seconds", "wall time of hot path stages", ("stage",))
+# stage stack of every thread, the profiler reads it from its own thread
+THREAD_STAGES = {}
+
+
+def prune_thread_stages():
+    """
+    drops the stacks of threads that are gone, retrievers and scheduler workers come and go all day
+    """
+    # idents are listed before the live threads, a thread registering in between is left alone
+    idents = list(THREAD_STAGES)
+    alive = {thread.ident for thread in threading.enumerate()}
+    for ident in idents:
+        if ident not in alive:
+            THREAD_STAGES.pop(ident, None)
+
+
+@contextlib.contextmanager
+def stage(name, **labels):
+    """
+    times the block into mini_midas_stage_seconds, extra labels are folded into the stage name
+    """
+    stage_name = name + "".join(f":{value}" for _, value in sorted(labels.items()))
+    ident = threading.get_ident()
+    stack = THREAD_STAGES.get(ident)
+    if stack is None:
+        # once per new thread, so the stacks of finished ones don't pile up
+        prune_thread_stages()
+        stack = THREAD_STAGES.setdefault(ident, [])
+    stack.append(stage_name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage_name)
+        stack.pop()
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        # scrapes every few seconds would drown the log
+        pass
+
+
+class MetricsServer:
+    """
+    prometheus text endpoint served from a background thread,
+    it names tickers and file paths, so it only listens on localhost unless given a wider host like "0.0.0.0"
+    """
+
+    def __init__(self, host="127.0.0.1", port=9108, registry=None):
+        self.httpd = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.registry = registry or REGISTRY
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+
+def get_metrics_path(name, suffix="json"):
+    return f"{mini_midas.common.DATA_STORAGE_PATH}/metrics/{name}.{suffix}"
+
+
+def write_json_atomically(path, payload):
+    pathlib.Path(os.path.dirname(path)).mkdir(parents=True, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as fil:
+        json.dump(payload, fil, indent=1, default=str)
+    os.replace(temp_path, path)
+
+
+class PeriodicWriter(threading.Thread, metaclass=abc.ABCMeta):
+    """
+    background thread calling write() every `interval` seconds and once more on stop
+    """
+
+    def __init__(self, interval):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    @abc.abstractmethod
+    def write(self):
+        pass
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.write()
+        self.write()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class StatsFileWriter(PeriodicWriter):
+    """
+    rewrites a json snapshot of the registry
+    """
+
+    def __init__(self, name, interval=60.0, registry=None):
+        super().__init__(interval)
+        self.path = get_metrics_path(name)
+        self.registry = registry or REGISTRY
+
+    def write(self):
+        try:
+            write_json_atomically(self.path, {"time": time.time(), "pid": os.getpid(), **self.registry.snapshot()})
+        except Exception as e:
+            LOG_INSTANCE.warning("Unable to write stats file %s, error: %s", self.path, str(e))
+
+
+class SamplingProfiler(PeriodicWriter):
+    """
+    samples every thread's stack each `sample_interval` seconds, counts samples per stage and
+    per innermost mini_midas function, dumps the counts every `interval` seconds
+    """
+
+    def __init__(self, name, sample_interval=0.005, interval=60.0):
+        super().__init__(interval)
+        self.path = get_metrics_path(name, "profile.json")
+        self.sample_interval = sample_interval
+        self.samples = 0
+        self.stages = collections.Counter()
+        self.functions = collections.Counter()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def innermost_function(frame) -> str:
+        """
+        first frame of our package walking outwards, so time in numpy or requests lands on the caller,
+        frames of this module are skipped so a timed block is charged to the code inside it
+        """
+        package_path = os.path.dirname(__file__)
+        while frame is not None:
+            file_name = frame.f_code.co_filename
+            if file_name.startswith(package_path) and file_name != __file__:
+                module = os.path.basename(frame.f_code.co_filename)[:-3]
+                return f"{module}.{frame.f_code.co_name}"
+            frame = frame.f_back
+        return "<other>"
+
+    def sample(self):
+        own_ident = threading.get_ident()
+        frames = sys._current_frames()
+        with self.lock:
+            for ident, frame in frames.items():
+                if ident == own_ident:
+                    continue
+                # the thread pushes and pops while we look, a slice never raises on a stack emptied in between
+                top = THREAD_STAGES.get(ident, [])[-1:]
+                function = self.innermost_function(frame)
+                if not top and function == "<other>":
+                    # not running our code, an http server or interpreter thread
+                    continue
+                self.stages[top[0] if top else "<no stage>"] += 1
+                self.functions[function] += 1
+            self.samples += 1
+
+    def write(self):
+        prune_thread_stages()
+        with self.lock:
+            seconds = self.sample_interval
+            payload = {
+                "samples": self.samples,
+                "sample_interval": self.sample_interval,
+                "stage_seconds": {name: count * seconds for name, count in self.stages.most_common()},
+                "function_seconds": {name: count * seconds for name, count in self.functions.most_common(50)},
+            }
+        try:
+            write_json_atomically(self.path, payload)
+        except Exception as e:
+            LOG_INSTANCE.warning("Unable to write profile %s, error: %s", self.path, str(e))
+
+    def run(self):
+        next_write = time.monotonic() + self.interval
+        while not self.stopped.wait(self.sample_interval):
+            self.sample()
+            if time.monotonic() >= next_write:
+                self.write()
+                next_write = time.monotonic() + self.interval
+        self.write()
+
+
+class Reporting:
+    """
+    the exporters one collector process runs, see start_reporting
+    """
+
+    def __init__(self, name, stats_interval=60.0):
+        self.workers = [StatsFileWriter(name, stats_interval)]
+        if os.environ.get("MINI_MIDAS_PROFILE"):
+            self.workers.append(SamplingProfiler(name))
+        self.server = None
+        port = os.environ.get("MINI_MIDAS_METRICS_PORT")
+        if port:
+            self.server = MetricsServer(os.environ.get("MINI_MIDAS_METRICS_HOST", "127.0.0.1"), int(port))
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+        if self.server is not None:
+            self.server.start()
+            LOG_INSTANCE.info("Serving metrics on %s", self.server.url)
+        return self
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+        if self.server is not None:
+            self.server.stop()
+
+
+def start_reporting(name, stats_interval=60.0) -> Reporting:
+    return Reporting(name, stats_interval).start()
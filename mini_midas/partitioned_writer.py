@@ -0,0 +1,223 @@
+"""
+background writer so fetch loops never wait on the disk
+
+pollers only enqueue, bars go into a bounded queue and a single background thread appends them to
+the tick log partition of the bar's own day, the hour and day of a partition come from the bar
+timestamp, never from the wall clock, so a late quote of 15:59 still lands in the 15:00 hour file
+
+the writer thread:
+    appends bars to per (ticker, day) tick logs, fsync once per flush_interval instead of per batch of ticks
+    folds an hour into its hourly file as soon as a bar of a later hour arrives for that ticker
+    closes a day's log once the ticker has a bar of a later day
+    writes coalesced json documents (indicator state), only the newest one per path
+
+a full queue blocks the poller for at most put_timeout seconds, then the bar is dropped and counted,
+queue depth, wait time, drops and the time from enqueueing a bar to its fsync are exported through mini_midas.metrics
+
+    writer = PartitionedWriter().start()
+    writer.submit_bar('tsla', minute, open, high, low, close, volume)
+    writer.close()
+"""
+import json
+import os
+import pathlib
+import queue
+import threading
+import time
+import excalibur
+import mini_midas
+
+
+LOG_INSTANCE = excalibur.logger.getlogger_debug()
+
+QUEUE_WAIT_SECONDS = mini_midas.metrics.histogram(
+    "mini_midas_writer_enqueue_wait_seconds", "time pollers waited for room in the writer queue")
+DROPPED = mini_midas.metrics.counter(
+    "mini_midas_writer_dropped_total", "items dropped because the writer queue stayed full", ("kind",))
+WRITTEN = mini_midas.metrics.counter(
+    "mini_midas_writer_written_total", "items written by the background writer", ("kind",))
+ROLLS = mini_midas.metrics.counter(
+    "mini_midas_writer_rolls_total", "partitions rolled by the background writer", ("partition",))
+SYNC_LATENCY_SECONDS = mini_midas.metrics.histogram(
+    "mini_midas_writer_sync_latency_seconds", "time from enqueueing a bar to its tick log being fsynced")
+
+BAR = "bar"
+DOCUMENT = "document"
+STOP = "stop"
+
+
+def hour_of(minute) -> int:
+    return (int(minute) // 60) % 24
+
+
+class PartitionedWriter:
+    """
+    bounded queue drained by one background thread,
+    on_synced is called from that thread with the enqueue to fsync latencies of every batch of bars that reached the disk
+    """
+
+    def __init__(self, maxsize=8192, put_timeout=1.0, flush_interval=5.0, batch_size=512, on_synced=None):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.put_timeout = put_timeout
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.thread = None
+        # (ticker, date_str) -> TickLog
+        self.logs = {}
+        # (ticker, date_str) -> enqueue times of the bars appended to that log since its last fsync
+        self.unsynced = {}
+        self.on_synced = on_synced
+        # ticker -> (date_str, hour) of the newest bar written
+        self.partitions = {}
+        self.documents = {}
+        self.last_flush = time.monotonic()
+        mini_midas.metrics.gauge(
+            "mini_midas_writer_queue_depth", "items waiting in the writer queue",
+        ).callback = lambda: {(): self.queue.qsize()}
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+        return self
+
+    def put(self, kind, item) -> bool:
+        started = time.perf_counter()
+        try:
+            self.queue.put_nowait((kind, item, started))
+            return True
+        except queue.Full:
+            pass
+        try:
+            self.queue.put((kind, item, started), timeout=self.put_timeout)
+            return True
+        except queue.Full:
+            DROPPED.inc(kind=kind)
+            LOG_INSTANCE.critical("Writer queue full for %ss, dropped a %s", self.put_timeout, kind)
+            return False
+        finally:
+            QUEUE_WAIT_SECONDS.observe(time.perf_counter() - started)
+
+    def submit_bar(self, ticker, minute, open_price, high_price, low_price, close_price, volume) -> bool:
+        return self.put(BAR, (ticker, int(minute), open_price, high_price, low_price, close_price, int(volume)))
+
+    def submit_document(self, path, payload) -> bool:
+        """
+        payload is json dumped by the writer, documents queued for the same path only write the newest
+        """
+        return self.put(DOCUMENT, (path, payload))
+
+    def get_log(self, ticker, date_str):
+        tick_log = self.logs.get((ticker, date_str))
+        if tick_log is None:
+            tick_log = self.logs[(ticker, date_str)] = mini_midas.tick_log.TickLog(
+                ticker, date_str, fsync_every=self.batch_size, fsync_interval=self.flush_interval)
+        return tick_log
+
+    def roll(self, ticker, date_str, hour):
+        """
+        a bar of a later hour or day arrived, the previous partition of the ticker is complete
+        """
+        previous = self.partitions.get(ticker)
+        # a late bar (a gap fill) doesn't move the partition back
+        if previous is not None and previous >= (date_str, hour):
+            return
+        self.partitions[ticker] = (date_str, hour)
+        if previous is None:
+            return
+        previous_date, _ = previous
+        if previous_date != date_str:
+            tick_log = self.logs.pop((ticker, previous_date), None)
+            if tick_log is not None:
+                tick_log.close()
+                self.report_synced([(ticker, previous_date)])
+            ROLLS.inc(partition="day")
+        else:
+            self.logs[(ticker, date_str)].sync()
+            ROLLS.inc(partition="hour")
+        # the compactor folds by bar timestamp too, this just doesn't wait for its next pass
+        mini_midas.tick_log.compact_log(ticker, previous_date)
+
+    def write_bar(self, bar, enqueued):
+        ticker, minute = bar[0], bar[1]
+        date_str = mini_midas.series.minute_to_date_string(minute)
+        tick_log = self.get_log(ticker, date_str)
+        tick_log.append(*bar[1:])
+        self.unsynced.setdefault((ticker, date_str), []).append(enqueued)
+        WRITTEN.inc(kind=BAR)
+        self.roll(ticker, date_str, hour_of(minute))
+        # the log syncs itself every batch_size records or flush_interval seconds, an hour roll syncs it too
+        if not tick_log.unsynced:
+            self.report_synced([(ticker, date_str)])
+
+    def report_synced(self, keys):
+        synced = time.perf_counter()
+        latencies = [synced - enqueued for key in keys for enqueued in self.unsynced.pop(key, [])]
+        for latency in latencies:
+            SYNC_LATENCY_SECONDS.observe(latency)
+        if latencies and self.on_synced is not None:
+            self.on_synced(latencies)
+
+    def write_documents(self):
+        documents, self.documents = self.documents, {}
+        for path, payload in documents.items():
+            pathlib.Path(os.path.dirname(path)).mkdir(parents=True, exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w') as fil:
+                json.dump(payload, fil)
+            os.replace(temp_path, path)
+            WRITTEN.inc(kind=DOCUMENT)
+
+    def flush(self):
+        for tick_log in self.logs.values():
+            tick_log.sync()
+        self.report_synced(list(self.logs))
+        self.write_documents()
+        self.last_flush = time.monotonic()
+
+    def handle(self, kind, item, enqueued):
+        try:
+            if kind == BAR:
+                self.write_bar(item, enqueued)
+            elif kind == DOCUMENT:
+                path, payload = item
+                self.documents[path] = payload
+        except Exception as e:
+            LOG_INSTANCE.critical("Writer failed on a %s, error: %s", kind, str(e))
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            timeout = max(0.0, self.last_flush + self.flush_interval - time.monotonic())
+            try:
+                items = [self.queue.get(timeout=timeout)]
+            except queue.Empty:
+                items = []
+            # drain what is already there without waiting, one flush per batch
+            while items and len(items) < self.batch_size:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            with mini_midas.metrics.stage("writer_batch"):
+                for kind, item, enqueued in items:
+                    if kind == STOP:
+                        stopping = True
+                        continue
+                    self.handle(kind, item, enqueued)
+                if stopping or time.monotonic() - self.last_flush >= self.flush_interval:
+                    self.flush()
+        for tick_log in self.logs.values():
+            tick_log.close()
+        self.report_synced(list(self.logs))
+        self.logs.clear()
+
+    def close(self):
+        """
+        writes everything queued so far and stops the thread
+        """
+        if self.thread is None:
+            return
+        self.queue.put((STOP, None, time.perf_counter()))
+        self.thread.join()
+        self.thread = None
@@ -1,16 +1,39 @@
 import multiprocessing
+import math
+import datetime
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 from matplotlib import style
 from matplotlib import ticker
 import mini_midas
-import datetime
+import numpy as np
 import excalibur
 import time
 
 
 LOG_INSTANCE = excalibur.logger.getlogger_debug()
 style.use('fivethirtyeight')
+# seconds between frames, the live feed is read every frame
+FRAME_INTERVAL = 1
+# seconds between looks at the saved files, same cadence the plots used to refresh at
+FILE_INTERVAL = 20
+
+
+def draw_bars(ax, bars, title, line=None):
+    """
+    mid prices of the bars on ax, returns the line,
+    a line drawn before is only given the new data instead of clearing the axes
+    """
+    if line is None:
+        ax.clear()
+        ax.yaxis.set_major_locator(ticker.MaxNLocator(nbins='auto'))
+        line, = ax.plot(bars.time, bars.mid)
+    else:
+        line.set_data(bars.time, bars.mid)
+        ax.relim()
+        ax.autoscale_view()
+    ax.set_title(title)
+    return line
 
 
 class Plotter:
@@ -19,12 +42,21 @@ class Plotter:
         self.fig = plt.figure()
         self.ax1 = self.fig.add_subplot(1, 1, 1)
         self.path_finder = mini_midas.stock_utilities.AlphaVantageTickerIntraPriceRetriever(self.ticker)
+        # bars come from the retriever's live feed as they happen, files are only checked every FILE_INTERVAL
+        self.loader = mini_midas.loader.IncrementalLoader(self.ticker, live=True, file_interval=FILE_INTERVAL)
+        # frames after the first only give the line new data, no clear and replot every second
+        self.line = None
+        # the indicators file is written at the retriever's pace, it's read again every FILE_INTERVAL
+        self.title = None
+        self.title_read_at = None
 
     def get_ticker_file_path(self):
         return self.path_finder.get_file_saved_path()
 
-    def parse_json_data_to_graph_data(self, json_obj: dict) -> (list, list):
+    def parse_json_data_to_graph_data(self, json_obj: dict) -> (np.ndarray, np.ndarray):
         """
+        returns datetime64[m] times and mid prices of the minute bars
+
         {
             "Meta Data": {
                 "1. Information": "Intraday (1min) open, high, low, close prices and volume",
@@ -39,29 +71,22 @@ class Plotter:
             }, ...
         }
         """
-        time_prices_dict = json_obj["Time Series (1min)"]
-        xs_date, ys_price = [], []
-        for date_string in sorted(time_prices_dict.keys()):
-            xs_date.append(datetime.datetime.strptime(date_string, "%Y-%m-%d %H:%M:%S"))
-            ys_price.append((
-                float(time_prices_dict[date_string]['2. high']) + float(time_prices_dict[date_string]['3. low'])) / 2.0
-            )
-            # ys_price.append(time_prices_dict[date_string]['4. close'])
-        return xs_date, ys_price
-
-    def merge_historical_data(self, old_json, new_json_data):
+        bars = mini_midas.series.parse_time_series(json_obj)
+        return bars.time, bars.mid
+
+    def merge_historical_data(self, old_json, new_json_data, old_source=None, new_source=None):
+        """
+        both payloads are sorted runs, one merge pass instead of dict.update and re-sorting every key,
+        on the same minute the stronger source wins, between equal sources the new payload
+        """
         if not old_json:
             return new_json_data
 
-        old_json["Time Series (1min)"].update(new_json_data["Time Series (1min)"])
-
-        # now we want to sort this dict by dates, so we can have a nice plot
-        time_series = old_json["Time Series (1min)"]
-        new_time_series_dict = {}
-        for dt in sorted(time_series.keys()):
-            new_time_series_dict[dt] = time_series[dt]
-        old_json["Time Series (1min)"] = new_time_series_dict
-
+        merged, _, _ = mini_midas.merge.merge_runs([
+            (mini_midas.series.parse_time_series(old_json), old_source or mini_midas.merge.SOURCE_UNKNOWN),
+            (mini_midas.series.parse_time_series(new_json_data), new_source or mini_midas.merge.SOURCE_UNKNOWN),
+        ])
+        old_json["Time Series (1min)"] = merged.to_time_series()
         return old_json
 
     def merge_data(self, old_json, new_json_data):
@@ -72,26 +97,37 @@ class Plotter:
 
     # TODO: now expand this to multiple
     def animate(self, interval):
-
-        data_file_path_list = mini_midas.common.get_all_file_saved_path(self.ticker)
-        ticker_data = {}
-        for file_path in data_file_path_list:
-            json_data = excalibur.file_utility.read_gzip_file_as_json_obj(file_path)
-            LOG_INSTANCE.info("Reading from %s", file_path)
-            ticker_data = self.merge_data(ticker_data, json_data)
-        xs, ys = self.parse_json_data_to_graph_data(ticker_data)
+        # only files new or changed since last frame are read
+        bars = self.loader.refresh()
 
         # plot the graph
-        self.ax1.clear()
-        self.ax1.yaxis.set_major_locator(ticker.MaxNLocator(nbins='auto'))
         # self.ax1.yaxis.set_major_locator(ticker.MultipleLocator(6))
-        self.ax1.plot(xs, ys)
+        self.line = draw_bars(self.ax1, bars, self.get_cached_title(), self.line)
         # self.ax1.xlabel("时间")
         # self.ax1.ylabel("价格")
-        self.ax1.set_title(f"{self.ticker}")
+
+    def get_cached_title(self):
+        if self.title_read_at is None or time.monotonic() - self.title_read_at >= FILE_INTERVAL:
+            self.title = self.get_title()
+            self.title_read_at = time.monotonic()
+        return self.title
+
+    def get_title(self):
+        """
+        ticker with the indicators its retriever last saved, the raw series isn't scanned for them
+        """
+        values = mini_midas.indicators.read_values(self.ticker)
+        parts = [self.ticker]
+        if values.get("vwap") is not None:
+            parts.append(f"vwap {values['vwap']:.2f}")
+        if values.get("rsi_14") is not None:
+            parts.append(f"rsi {values['rsi_14']:.1f}")
+        if values.get("high_low") is not None:
+            parts.append(f"high {values['high_low']['high']:.2f} low {values['high_low']['low']:.2f}")
+        return "  ".join(parts)
 
     def run(self):
-        ani = animation.FuncAnimation(self.fig, self.animate, interval=20000)
+        ani = animation.FuncAnimation(self.fig, self.animate, interval=FRAME_INTERVAL * 1000)
         # self.get_market_plot_figure()
         plt.show()
 
@@ -113,3 +149,136 @@ def plot_tickers(tickers):
     # wait for process to end
     for p in procs:
         p.join()
+
+
+class Dashboard:
+    """
+    every ticker in one window as a grid of subplots
+
+    lines are updated with set_data and blitted over a cached background,
+    the full figure is only redrawn when a price leaves the current y range
+    """
+    # seconds between refreshes, same cadence as Plotter
+    INTERVAL = FRAME_INTERVAL
+    # about every 10 minutes at one frame a second
+    FRAME_STATS_EVERY = 600
+
+    def __init__(self, tickers, ncols=None, sharex=True, figsize=None):
+        self.tickers = list(tickers)
+        ncols = ncols or math.ceil(math.sqrt(len(self.tickers)))
+        nrows = math.ceil(len(self.tickers) / ncols)
+        self.fig, axes = plt.subplots(nrows, ncols, sharex=sharex, squeeze=False, figsize=figsize)
+        self.axes = axes.flatten()
+        for ax in self.axes[len(self.tickers):]:
+            ax.set_visible(False)
+
+        self.loaders = [mini_midas.loader.IncrementalLoader(tick, live=True, file_interval=FILE_INTERVAL)
+                        for tick in self.tickers]
+        self.lines = []
+        for ax, tick in zip(self.axes, self.tickers):
+            line, = ax.plot([], [], animated=True)
+            ax.set_title(tick, fontsize='small')
+            ax.yaxis.set_major_locator(ticker.MaxNLocator(nbins='auto'))
+            self.lines.append(line)
+
+        self.background = None
+        self.frame_times = []
+        self.fig.canvas.mpl_connect('draw_event', self.on_draw)
+
+    def set_session_xlim(self):
+        """
+        x axis covers the whole session up front so it never needs rescaling during the day
+        """
+        calendar = mini_midas.market_calendar
+        today = calendar.now_eastern().date()
+        # half days close early, days without a session just show regular hours
+        session_open, session_close = calendar.CALENDAR.session(today) or (
+            datetime.datetime.combine(today, calendar.OPEN_TIME), datetime.datetime.combine(today, calendar.CLOSE_TIME))
+        self.axes[0].set_xlim(
+            np.datetime64(session_open.replace(tzinfo=None), 'm'), np.datetime64(session_close.replace(tzinfo=None), 'm'))
+
+    def on_draw(self, event):
+        """
+        a full draw happened (first show, resize, rescale), cache the background without the lines
+        """
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self.draw_lines()
+
+    def draw_lines(self):
+        for ax, line in zip(self.axes, self.lines):
+            ax.draw_artist(line)
+
+    @staticmethod
+    def rescale_y(ax, ys) -> bool:
+        """
+        widens y limits when prices leave them, returns True if a full redraw is needed
+        """
+        if not len(ys):
+            return False
+        low, high = float(np.min(ys)), float(np.max(ys))
+        bottom, top = ax.get_ylim()
+        if bottom <= low and high <= top:
+            return False
+        margin = max((high - low) * 0.1, high * 0.001)
+        ax.set_ylim(low - margin, high + margin)
+        return True
+
+    def update(self):
+        """
+        one frame, returns how long it took in seconds
+        """
+        started = time.perf_counter()
+        needs_full_redraw = self.background is None
+        for ax, line, loader in zip(self.axes, self.lines, self.loaders):
+            bars = loader.refresh()
+            line.set_data(bars.time, bars.mid)
+            needs_full_redraw = self.rescale_y(ax, bars.mid) or needs_full_redraw
+
+        canvas = self.fig.canvas
+        if needs_full_redraw:
+            # on_draw caches the new background and draws the lines on top
+            canvas.draw()
+        else:
+            canvas.restore_region(self.background)
+            self.draw_lines()
+        canvas.blit(self.fig.bbox)
+        canvas.flush_events()
+
+        frame_time = time.perf_counter() - started
+        self.record_frame_time(frame_time)
+        return frame_time
+
+    def record_frame_time(self, frame_time):
+        self.frame_times.append(frame_time)
+        if len(self.frame_times) >= self.FRAME_STATS_EVERY:
+            LOG_INSTANCE.info("dashboard frame time %s", self.frame_stats())
+            self.frame_times = []
+
+    def frame_stats(self) -> dict:
+        """
+        frame time in milliseconds over the frames since the last report
+        """
+        if not self.frame_times:
+            return {}
+        frame_times = np.array(self.frame_times) * 1000
+        return {
+            "frames": len(frame_times),
+            "mean_ms": float(frame_times.mean()),
+            "p95_ms": float(np.percentile(frame_times, 95)),
+            "max_ms": float(frame_times.max()),
+        }
+
+    def run(self):
+        self.set_session_xlim()
+        self.fig.autofmt_xdate()
+        timer = self.fig.canvas.new_timer(interval=self.INTERVAL * 1000)
+        timer.add_callback(self.update)
+        timer.start()
+        plt.show()
+
+
+def plot_dashboard(tickers, ncols=None, sharex=True):
+    """
+    plots all tickers in this process, a lighter alternative to plot_tickers
+    """
+    Dashboard(tickers, ncols=ncols, sharex=sharex).run()
@@ -0,0 +1,167 @@
+"""
+headless chart rendering to image files
+
+plot_tickers needs a display and a process per window, this renders the same chart as Plotter
+(plot.draw_bars) for every ticker of a date range into png or svg files with the Agg backend,
+spread over a process pool, servers without a display can run it as a nightly report
+
+every worker keeps one figure and only gives its line new data per ticker, a chart is skipped
+when the bar store files it was drawn from haven't changed since, their (path, mtime, size)
+fingerprint is kept next to the image
+
+    render_charts(['tsla', 'aapl'], '20200401', '20200409')     # {ticker: 'rendered' | 'skipped' | 'empty'}
+"""
+import concurrent.futures
+import hashlib
+import json
+import multiprocessing
+import os
+import pathlib
+import time
+import excalibur
+import mini_midas
+
+
+LOG_INSTANCE = excalibur.logger.getlogger_debug()
+
+FORMATS = ("png", "svg")
+FIGSIZE = (10, 4)
+DPI = 100
+FINGERPRINT_SUFFIX = ".fingerprint"
+# tickers a worker takes at once, fewer round trips to the pool
+CHUNK_SIZE = 8
+
+# the worker's reused figure, set up by init_worker
+WORKER = None
+
+
+def get_output_path(start_date, end_date):
+    return f"{mini_midas.common.DATA_STORAGE_PATH}/charts/{start_date}-{end_date}"
+
+
+def source_files(ticker, start_date, end_date) -> list:
+    return [
+        mini_midas.bar_store.get_day_file_path(ticker, date_str)
+        for date_str in mini_midas.bar_store.list_dates(ticker) if start_date <= date_str <= end_date
+    ]
+
+
+def fingerprint(ticker, start_date, end_date, image_format, figsize, dpi) -> str:
+    """
+    changes when any day file of the range is added, rewritten or removed, or the chart settings change
+    """
+    parts = [ticker, start_date, end_date, image_format, list(figsize), dpi]
+    for path in source_files(ticker, start_date, end_date):
+        stat = os.stat(path)
+        parts.append([os.path.basename(path), stat.st_mtime_ns, stat.st_size])
+    return hashlib.sha1(json.dumps(parts).encode()).hexdigest()
+
+
+def read_fingerprint(image_path):
+    try:
+        with open(f"{image_path}{FINGERPRINT_SUFFIX}", 'r') as fil:
+            return fil.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def get_title(ticker, bars, start_date, end_date) -> str:
+    """
+    ticker, range and what happened in it, read off the bars we draw anyway
+    """
+    period = start_date if start_date == end_date else f"{start_date}-{end_date}"
+    first, last = float(bars.open[0]), float(bars.close[-1])
+    return (f"{ticker}  {period}  last {last:.2f} ({(last / first - 1) * 100:+.2f}%)"
+            f"  high {float(bars.high.max()):.2f} low {float(bars.low.min()):.2f}")
+
+
+class ChartRenderer:
+    """
+    one figure per worker process, every chart reuses it
+    """
+
+    def __init__(self, figsize=FIGSIZE, dpi=DPI):
+        # the figure is never shown, no pyplot window or event loop
+        import matplotlib.figure
+        import matplotlib.backends.backend_agg
+        self.figsize = tuple(figsize)
+        self.dpi = dpi
+        self.fig = matplotlib.figure.Figure(figsize=self.figsize, dpi=dpi)
+        matplotlib.backends.backend_agg.FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_subplot(1, 1, 1)
+        self.ax.tick_params(axis='x', labelrotation=30, labelsize='small')
+        self.fig.subplots_adjust(left=0.08, right=0.98, bottom=0.2, top=0.9)
+        self.line = None
+
+    def render(self, ticker, start_date, end_date, output, image_format, force=False) -> str:
+        image_path = f"{output}/{ticker}.{image_format}"
+        key = fingerprint(ticker, start_date, end_date, image_format, self.figsize, self.dpi)
+        if not force and os.path.exists(image_path) and read_fingerprint(image_path) == key:
+            return "skipped"
+
+        bars = mini_midas.bar_store.read_range(ticker, start_date, end_date)
+        if not len(bars):
+            return "empty"
+        self.line = mini_midas.plot.draw_bars(self.ax, bars, get_title(ticker, bars, start_date, end_date), self.line)
+        # the plot style's title size is meant for a window title, not this longer one
+        self.ax.title.set_fontsize('medium')
+
+        pathlib.Path(output).mkdir(parents=True, exist_ok=True)
+        temp_path = f"{image_path}.{os.getpid()}.tmp"
+        self.fig.savefig(temp_path, format=image_format)
+        os.replace(temp_path, image_path)
+        # written after the image, a crash in between renders it again next time
+        with open(f"{image_path}{FINGERPRINT_SUFFIX}", 'w') as fil:
+            fil.write(key)
+        return "rendered"
+
+
+def init_worker(root, figsize, dpi):
+    global WORKER
+    mini_midas.common.DATA_STORAGE_PATH = root
+    import matplotlib
+    matplotlib.use("Agg")
+    WORKER = ChartRenderer(figsize, dpi)
+
+
+def render_ticker(job) -> (str, str, float):
+    """
+    runs in a worker, (ticker, status, seconds)
+    """
+    ticker, start_date, end_date, output, image_format, force = job
+    started = time.perf_counter()
+    try:
+        status = WORKER.render(ticker, start_date, end_date, output, image_format, force)
+    except Exception as e:
+        LOG_INSTANCE.critical("Unable to render %s, error: %s", ticker, str(e))
+        status = "failed"
+    return ticker, status, time.perf_counter() - started
+
+
+def render_charts(tickers, start_date, end_date, output=None, image_format="png", max_workers=None,
+                  figsize=FIGSIZE, dpi=DPI, force=False) -> dict:
+    """
+    renders one chart per ticker of start_date to end_date, both "%Y%m%d" and inclusive, returns {ticker: status}
+    """
+    if image_format not in FORMATS:
+        raise Exception(f"Unsupported chart format {image_format}, use one of {FORMATS}")
+    tickers = list(tickers)
+    if not tickers:
+        return {}
+    output = output or get_output_path(start_date, end_date)
+    jobs = [(ticker, start_date, end_date, output, image_format, force) for ticker in tickers]
+    max_workers = min(max_workers or os.cpu_count(), len(tickers))
+
+    started = time.perf_counter()
+    # spawned workers pick the Agg backend before anything imports pyplot
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker, initargs=(mini_midas.common.DATA_STORAGE_PATH, figsize, dpi))
+    with executor:
+        results = list(executor.map(render_ticker, jobs, chunksize=CHUNK_SIZE))
+
+    statuses = {ticker: status for ticker, status, _ in results}
+    counts = {status: list(statuses.values()).count(status) for status in set(statuses.values())}
+    LOG_INSTANCE.info("Rendered %s charts into %s in %.1fs: %s", len(tickers), output,
+                      time.perf_counter() - started, counts)
+    return statuses
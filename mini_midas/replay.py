@@ -0,0 +1,316 @@
+"""
+replays stored ticker-days through the live pipeline
+
+the live code only runs while the market is open, replay swaps the wall clock for a simulated one
+(market_calendar.set_clock) and turns every stored minute bar back into the GLOBAL_QUOTE a retriever
+would have received, so cache_ticker_minute_data, indicators, the partitioned writer, hour rolls,
+compaction, end of day consolidation, the live feed and the plots all run exactly as on a trading day
+
+    speed 1       real time, a session takes 6.5 hours
+    speed 100     a session in about 4 minutes
+    speed None    as fast as the pipeline goes, the clock only moves when the next minute is due
+
+bars are read from the source data root and everything the pipeline writes goes to a separate output root,
+the data being replayed is never touched, live feeds get their own namespace so a replay can run next to the collectors
+
+    engine = ReplayEngine(['tsla', 'aapl'], '20200406', '20200409', speed=100)
+    engine.run()    # throughput stats
+"""
+import bisect
+import concurrent.futures
+import datetime
+import multiprocessing
+import os
+import time
+import numpy as np
+import excalibur
+import mini_midas
+
+
+LOG_INSTANCE = excalibur.logger.getlogger_debug()
+
+DEFAULT_OUTPUT = os.path.expanduser("~/data/stock_replay_data")
+# quotes of a minute arrive a few seconds into it, like a poll would
+QUOTE_SECOND = 5
+FEED_NAMESPACE = "replay"
+
+
+class ReplayClock:
+    """
+    simulated US/Eastern clock, the state is in shared memory so plot processes started with it follow along
+    """
+
+    def __init__(self, start, speed=None):
+        # simulated epoch seconds at started_at, real epoch seconds of that moment, speed (0 as fast as possible)
+        self.state = multiprocessing.RawArray('d', 3)
+        self.state[2] = speed or 0.0
+        self.jump_to(start)
+
+    def jump_to(self, dt):
+        """
+        sets the simulated time, e.g. to skip the night between two replayed days
+        """
+        self.state[1] = time.time()
+        self.state[0] = dt.timestamp()
+
+    def timestamp(self) -> float:
+        simulated, started_at, speed = self.state[0], self.state[1], self.state[2]
+        if speed:
+            return simulated + (time.time() - started_at) * speed
+        return simulated
+
+    def now(self) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(self.timestamp(), mini_midas.market_calendar.EASTERN)
+
+    def sleep(self, seconds):
+        if self.state[2]:
+            time.sleep(seconds / self.state[2])
+        else:
+            self.state[0] += seconds
+
+    def advance_to(self, dt):
+        wait_seconds = dt.timestamp() - self.timestamp()
+        if wait_seconds > 0:
+            self.sleep(wait_seconds)
+
+
+def minute_to_datetime(minute) -> datetime.datetime:
+    wall_clock = np.datetime64(int(minute), 'm').astype(datetime.datetime)
+    return wall_clock.replace(tzinfo=mini_midas.market_calendar.EASTERN)
+
+
+class QuoteStream:
+    """
+    the GLOBAL_QUOTE payloads of one ticker-day, day open, running high and low and cumulative volume like alphavantage,
+    without the previous session's close the change fields are against the day's open
+    """
+
+    def __init__(self, ticker, bars, previous_close=None):
+        self.ticker = ticker
+        self.minute = bars.minute
+        self.day_open = float(bars.open[0])
+        self.high = np.maximum.accumulate(bars.high)
+        self.low = np.minimum.accumulate(bars.low)
+        self.close = bars.close
+        self.volume = np.cumsum(bars.volume)
+        self.previous_close = float(bars.open[0]) if previous_close is None else previous_close
+
+    def quote(self, index) -> dict:
+        price = float(self.close[index])
+        return {
+            "Global Quote": {
+                "01. symbol": self.ticker.upper(),
+                "02. open": f"{self.day_open:.4f}",
+                "03. high": f"{self.high[index]:.4f}",
+                "04. low": f"{self.low[index]:.4f}",
+                "05. price": f"{price:.4f}",
+                "06. volume": str(int(self.volume[index])),
+                "07. latest trading day": str(np.datetime64(int(self.minute[index]), 'm').astype('datetime64[D]')),
+                "08. previous close": f"{self.previous_close:.4f}",
+                "09. change": f"{price - self.previous_close:.4f}",
+                "10. change percent": f"{(price / self.previous_close - 1) * 100:.4f}%",
+            }
+        }
+
+
+def plot_replay(tickers, clock, output):
+    """
+    runs in its own process, the dashboard reads the replay's live feeds and files on the replay clock
+    """
+    mini_midas.common.DATA_STORAGE_PATH = output
+    mini_midas.live_feed.NAMESPACE = FEED_NAMESPACE
+    mini_midas.market_calendar.set_clock(clock)
+    mini_midas.plot.plot_dashboard(tickers)
+
+
+class ReplayEngine:
+    """
+    replays ticker-days from start_date to end_date, both "%Y%m%d" and inclusive
+    """
+    # more than this doesn't fit in one dashboard window
+    PLOT_TICKERS = 16
+
+    def __init__(self, tickers, start_date, end_date, speed=None, max_workers=8, source=None, output=None,
+                 feed=False, plot=False):
+        self.source = source or mini_midas.common.DATA_STORAGE_PATH
+        self.output = output or DEFAULT_OUTPUT
+        if os.path.realpath(self.source) == os.path.realpath(self.output):
+            raise Exception(f"Replay would write into the data it replays, {self.output}, pick another output")
+        self.tickers = list(tickers) if tickers else self.find_tickers()
+        self.start_date = start_date
+        self.end_date = end_date
+        self.speed = speed
+        self.max_workers = max_workers
+        # plots read bars from the live feed
+        self.feed = feed or plot
+        self.plot = plot
+        self.clock = None
+        self.latencies = []
+        self.stats = {"days": 0, "quotes": 0, "late_minutes": 0, "simulated_seconds": 0.0, "end_of_day_seconds": 0.0}
+
+    def find_tickers(self) -> list:
+        bar_root = f"{self.source}/bars"
+        return sorted(os.listdir(bar_root)) if os.path.isdir(bar_root) else []
+
+    def get_source_path(self, ticker, date_str):
+        return f"{self.source}/bars/{ticker}/{ticker}.{date_str}{mini_midas.bar_store.FILE_SUFFIX}"
+
+    def previous_close(self, ticker, date_str):
+        """
+        last close before the end of the previous session in the source root, None if that day isn't stored
+        """
+        calendar = mini_midas.market_calendar.CALENDAR
+        index = bisect.bisect_left(calendar.days, datetime.datetime.strptime(date_str, "%Y%m%d").date())
+        if not index:
+            return None
+        previous_day = calendar.days[index - 1]
+        previous_date = previous_day.strftime("%Y%m%d")
+        path = self.get_source_path(ticker, previous_date)
+        if not os.path.exists(path):
+            return None
+        session_close = mini_midas.gaps.to_minute(calendar.sessions[previous_day][1])
+        bars = mini_midas.bar_store.read_file(path).between(
+            mini_midas.series.date_string_to_minute(previous_date), session_close)
+        return float(bars.close[-1]) if len(bars) else None
+
+    def load_day(self, date_str) -> dict:
+        """
+        {ticker: QuoteStream} of tickers with bars that day, read from the source root
+        """
+        streams = {}
+        for ticker in self.tickers:
+            path = self.get_source_path(ticker, date_str)
+            if not os.path.exists(path):
+                continue
+            bars = mini_midas.bar_store.read_file(path)
+            if len(bars):
+                streams[ticker] = QuoteStream(ticker, bars, self.previous_close(ticker, date_str))
+        return streams
+
+    def dates(self) -> list:
+        first = datetime.datetime.strptime(self.start_date, "%Y%m%d").date()
+        last = datetime.datetime.strptime(self.end_date, "%Y%m%d").date()
+        return [day.strftime("%Y%m%d") for day, _, _ in mini_midas.market_calendar.CALENDAR.sessions_between(first, last)]
+
+    def create_retriever(self, ticker, writer):
+        # never talks to the api, quotes are handed to it
+        retriever = mini_midas.stock_utilities.AlphaVantageTickerIntraPriceRetriever(
+            ticker, token="replay", writer=writer,
+            response_cache=mini_midas.response_cache.ResponseCache(ttls={}, use_disk=False))
+        retriever.meta_data = {"2. Symbol": ticker, "4. Interval": "1min", "6. Time Zone": "US/Eastern"}
+        if self.feed:
+            retriever.feed = mini_midas.live_feed.LiveFeedWriter(ticker)
+        return retriever
+
+    def send_quote(self, item):
+        retriever, stream, index = item
+        started = time.perf_counter()
+        retriever.cache_ticker_minute_data(stream.quote(index))
+        return time.perf_counter() - started
+
+    def replay_day(self, date_str, executor):
+        streams = self.load_day(date_str)
+        if not streams:
+            LOG_INSTANCE.warning("Nothing stored for %s, skipping", date_str)
+            return
+        writer = mini_midas.partitioned_writer.PartitionedWriter().start()
+        retrievers = {ticker: self.create_retriever(ticker, writer) for ticker in streams}
+        minutes = np.unique(np.concatenate([stream.minute for stream in streams.values()]))
+        positions = {ticker: 0 for ticker in streams}
+        LOG_INSTANCE.info("Replaying %s, %s tickers, %s minutes", date_str, len(streams), len(minutes))
+
+        self.clock.jump_to(minute_to_datetime(minutes[0]))
+        simulated_start = self.clock.timestamp()
+        for minute in minutes:
+            self.clock.advance_to(minute_to_datetime(minute) + datetime.timedelta(seconds=QUOTE_SECOND))
+            batch = []
+            for ticker, stream in streams.items():
+                position = positions[ticker]
+                if position < len(stream.minute) and stream.minute[position] == minute:
+                    batch.append((retrievers[ticker], stream, position))
+                    positions[ticker] = position + 1
+            self.latencies.extend(executor.map(self.send_quote, batch))
+            self.stats["quotes"] += len(batch)
+            if self.clock.timestamp() >= minute_to_datetime(minute + 1).timestamp():
+                # the pipeline couldn't keep up with this speed, quotes got stamped with a later minute
+                self.stats["late_minutes"] += 1
+
+        # after the close: what is still queued goes to the tick logs, they get folded, the day file is written
+        self.clock.advance_to(minute_to_datetime(minutes[-1]) + datetime.timedelta(minutes=1))
+        self.end_of_day(date_str, retrievers, writer, executor)
+        self.stats["simulated_seconds"] += self.clock.timestamp() - simulated_start
+        self.stats["days"] += 1
+
+    def end_of_day(self, date_str, retrievers, writer, executor):
+        started = time.perf_counter()
+        writer.close()
+        for _ in executor.map(lambda ticker: mini_midas.tick_log.compact_log(ticker, date_str), retrievers):
+            pass
+        close = mini_midas.market_calendar.CALENDAR.session(
+            datetime.datetime.strptime(date_str, "%Y%m%d").date())[1]
+        if self.clock.timestamp() < close.timestamp():
+            # stored bars may end before the close, no point waiting for it
+            self.clock.jump_to(close)
+        for _ in executor.map(lambda retriever: retriever.save_current_cached_data(), retrievers.values()):
+            pass
+        # the api has nothing to add to a replayed day, it is consolidated from what the pipeline wrote
+        mini_midas.consolidate.consolidate(list(retrievers), date_str, fetch=False, max_workers=self.max_workers)
+        for retriever in retrievers.values():
+            retriever.close_feed()
+        self.stats["end_of_day_seconds"] += time.perf_counter() - started
+
+    def start_plot(self):
+        tickers = self.tickers[:self.PLOT_TICKERS]
+        process = multiprocessing.Process(target=plot_replay, args=(tickers, self.clock, self.output), daemon=True)
+        process.start()
+        return process
+
+    def run(self) -> dict:
+        dates = self.dates()
+        if not dates:
+            raise Exception(f"No trading day between {self.start_date} and {self.end_date}")
+        first_open = mini_midas.market_calendar.CALENDAR.session(
+            datetime.datetime.strptime(dates[0], "%Y%m%d").date())[0]
+        self.clock = ReplayClock(first_open, self.speed)
+
+        original_path = mini_midas.common.DATA_STORAGE_PATH
+        original_namespace = mini_midas.live_feed.NAMESPACE
+        original_clock = mini_midas.market_calendar.set_clock(self.clock)
+        mini_midas.common.DATA_STORAGE_PATH = self.output
+        mini_midas.live_feed.NAMESPACE = FEED_NAMESPACE
+        plot_process = self.start_plot() if self.plot else None
+        started = time.perf_counter()
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for date_str in dates:
+                    self.replay_day(date_str, executor)
+            if plot_process is not None:
+                # the window stays up until it is closed
+                plot_process.join()
+            if self.feed:
+                for ticker in self.tickers:
+                    mini_midas.live_feed.unlink(ticker)
+        finally:
+            mini_midas.common.DATA_STORAGE_PATH = original_path
+            mini_midas.live_feed.NAMESPACE = original_namespace
+            mini_midas.market_calendar.set_clock(original_clock)
+
+        stats = self.summary(time.perf_counter() - started)
+        LOG_INSTANCE.info("Replay finished: %s", stats)
+        return stats
+
+    def summary(self, wall_seconds) -> dict:
+        latencies = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        return dict(
+            self.stats,
+            tickers=len(self.tickers),
+            wall_seconds=wall_seconds,
+            quotes_per_second=self.stats["quotes"] / wall_seconds if wall_seconds else 0.0,
+            speedup=self.stats["simulated_seconds"] / wall_seconds if wall_seconds else 0.0,
+            p50_ms=float(np.percentile(latencies, 50)),
+            p99_ms=float(np.percentile(latencies, 99)),
+        )
+
+
+def replay(tickers, start_date, end_date, **kwargs):
+    return ReplayEngine(tickers, start_date, end_date, **kwargs).run()
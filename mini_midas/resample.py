@@ -0,0 +1,150 @@
+"""
+vectorized OHLCV resampling with a per ticker-day aggregate cache
+
+minute bars from the bar store are grouped by epoch minute // interval with numpy reduceat,
+buckets are aligned to the clock (5m bars start at :00, :05, ...), 1d groups a whole calendar day
+
+aggregates are cached per ticker, day and interval as .npz files and recomputed only when the day's bar file
+changed, a past day whose consolidation was validated is marked immutable and not even checked anymore,
+any other day can still be rewritten by the official pull, consolidation, a backfill or a gap fill
+
+    bars = read_range('tsla', '20200301', '20200331', '15m')
+    bars['vwap']
+"""
+import os
+import pathlib
+import threading
+import numpy as np
+import excalibur
+import mini_midas
+
+
+LOG_INSTANCE = excalibur.logger.getlogger_debug()
+
+INTERVALS = {
+    '5m': 5,
+    '15m': 15,
+    '1h': 60,
+    '1d': mini_midas.series.MINUTES_PER_DAY,
+}
+AGGREGATE_COLUMNS = mini_midas.series.COLUMNS + ('vwap',)
+
+
+def empty_aggregates() -> dict:
+    columns = {name: np.empty(0, dtype=dtype) for name, dtype in mini_midas.series.COLUMN_DTYPES.items()}
+    columns['vwap'] = np.empty(0, dtype=np.float64)
+    return columns
+
+
+def resample(bars, interval_minutes) -> dict:
+    """
+    sorted minute bars -> {column: array} of interval bars, minute is the bucket start
+    """
+    if not len(bars):
+        return empty_aggregates()
+
+    minutes = np.asarray(bars.minute)
+    buckets = minutes // interval_minutes
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+    ends = np.concatenate((starts[1:], [len(minutes)])) - 1
+
+    volume = np.asarray(bars.volume)
+    bucket_volume = np.add.reduceat(volume, starts)
+    typical = (np.asarray(bars.high) + np.asarray(bars.low) + np.asarray(bars.close)) / 3.0
+    traded_value = np.add.reduceat(typical * volume, starts)
+    close = np.asarray(bars.close)[ends]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # a bucket without volume has no vwap, use its close
+        vwap = np.where(bucket_volume > 0, traded_value / bucket_volume, close)
+
+    return {
+        'minute': buckets[starts] * interval_minutes,
+        'open': np.asarray(bars.open)[starts],
+        'high': np.maximum.reduceat(np.asarray(bars.high), starts),
+        'low': np.minimum.reduceat(np.asarray(bars.low), starts),
+        'close': close,
+        'volume': bucket_volume,
+        'vwap': vwap,
+    }
+
+
+def get_cache_path(ticker, date_str, interval):
+    return f"{mini_midas.common.DATA_STORAGE_PATH}/aggregates/{ticker}/{ticker}.{date_str}.{interval}.npz"
+
+
+def source_fingerprint(ticker, date_str) -> np.ndarray:
+    """
+    (mtime, size) of the day's bar file, zeros if it doesn't exist
+    """
+    path = mini_midas.bar_store.get_day_file_path(ticker, date_str)
+    if not os.path.exists(path):
+        return np.zeros(2, dtype=np.int64)
+    stat = os.stat(path)
+    return np.array([stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+
+
+def is_day_final(ticker, date_str, fingerprint) -> bool:
+    """
+    a day before today that consolidation validated, and whose bar file is still the one consolidation wrote
+    """
+    today, _ = mini_midas.common.split_date_string()
+    if date_str >= today:
+        return False
+    path = mini_midas.bar_store.get_day_file_path(ticker, date_str)
+    return any(
+        entry["path"] == path and entry.get("consolidated") and [entry["mtime_ns"], entry["size"]] == fingerprint.tolist()
+        for entry in mini_midas.manifest.load(ticker).entries
+    )
+
+
+def load_cached(path, fingerprint):
+    """
+    returns cached aggregates if still valid, None otherwise
+    """
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as cached:
+        if not cached['immutable'] and not np.array_equal(cached['fingerprint'], fingerprint):
+            return None
+        return {name: cached[name] for name in AGGREGATE_COLUMNS}
+
+
+def save_cached(path, aggregates, fingerprint, immutable):
+    pathlib.Path(os.path.dirname(path)).mkdir(parents=True, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'wb') as fil:
+        np.savez(fil, fingerprint=fingerprint, immutable=np.array(immutable), **aggregates)
+    os.replace(temp_path, path)
+
+
+def get_aggregates(ticker, date_str, interval) -> dict:
+    """
+    interval bars of one ticker-day, computed once and cached
+    """
+    if interval not in INTERVALS:
+        raise Exception(f"Unknown interval {interval}, choose from {list(INTERVALS)}")
+
+    path = get_cache_path(ticker, date_str, interval)
+    fingerprint = source_fingerprint(ticker, date_str)
+    cached = load_cached(path, fingerprint)
+    if cached is not None:
+        return cached
+
+    aggregates = resample(mini_midas.bar_store.read_day(ticker, date_str), INTERVALS[interval])
+    if len(aggregates['minute']):
+        save_cached(path, aggregates, fingerprint, is_day_final(ticker, date_str, fingerprint))
+    return aggregates
+
+
+def read_range(ticker, start_date, end_date, interval) -> dict:
+    """
+    interval bars of a ticker from start_date to end_date, both "%Y%m%d" and inclusive
+    """
+    days = [
+        get_aggregates(ticker, date_str, interval)
+        for date_str in mini_midas.bar_store.list_dates(ticker)
+        if start_date <= date_str <= end_date
+    ]
+    if not days:
+        return empty_aggregates()
+    return {name: np.concatenate([day[name] for day in days]) for name in AGGREGATE_COLUMNS}
@@ -0,0 +1,227 @@
+"""
+api response cache shared by every retriever, scheduler, backfill and plotter in and across processes
+
+responses are keyed by (function, symbol, interval, outputsize, month), never by api key, and live
+for a per function ttl, a whole finished month lives a day, a response fetched after the session closed
+only a few minutes, late published bars of the day still have to reach the next pull
+
+two tiers:
+    memory: lru of parsed payloads, per process
+    disk: one gzip json file per key under DATA_STORAGE_PATH/response_cache, replaced atomically,
+          a miss takes an flock on the key so concurrent processes wait for one fetch instead of each calling the api
+
+throttle notes and error messages are never cached
+
+    payload = mini_midas.response_cache.fetch_json(session, base_url, token, "GLOBAL_QUOTE", symbol="tsla")
+"""
+import collections
+import gzip
+import json
+import os
+import pathlib
+import threading
+import time
+import excalibur
+import mini_midas
+
+
+LOG_INSTANCE = excalibur.logger.getlogger_debug()
+
+# seconds a response stays valid while the market is open, functions missing here are never cached
+TTLS = {
+    "GLOBAL_QUOTE": 55,
+    "TIME_SERIES_INTRADAY": 55,
+}
+# a whole past month of bars doesn't change, one day keeps a rerun of a backfill free
+MONTH_TTL = 24 * 60 * 60
+# after the close, reruns right after each other share a pull, the day isn't final for a while
+AFTER_CLOSE_TTL = 5 * 60
+ERROR_KEYS = ("Note", "Information", "Error Message")
+
+API_SECONDS = mini_midas.metrics.histogram(
+    "mini_midas_api_request_seconds", "latency of alphavantage calls", ("function",))
+API_REQUESTS = mini_midas.metrics.counter(
+    "mini_midas_api_requests_total", "alphavantage calls by outcome", ("function", "outcome"))
+CACHE_LOOKUPS = mini_midas.metrics.counter(
+    "mini_midas_response_cache_lookups_total", "response cache lookups by tier that answered", ("result",))
+
+
+def make_key(function, symbol, interval=None, outputsize=None, month=None) -> tuple:
+    if not outputsize and function.startswith("TIME_SERIES"):
+        # alphavantage's default
+        outputsize = "compact"
+    return (function, symbol.lower(), interval or "", outputsize or "", month or "")
+
+
+def is_cacheable(payload) -> bool:
+    return isinstance(payload, dict) and bool(payload) and not any(key in payload for key in ERROR_KEYS)
+
+
+def outcome_of(payload) -> str:
+    if not isinstance(payload, dict) or not payload:
+        return "empty"
+    if "Note" in payload or "Information" in payload:
+        return "throttled"
+    if "Error Message" in payload:
+        return "error"
+    return "ok"
+
+
+def timed_get(session, url, function, timeout=None):
+    """
+    one api call, timed and counted by outcome
+    """
+    try:
+        with API_SECONDS.time(function=function), mini_midas.metrics.stage("api_request", function=function):
+            payload = session.get(url, timeout=timeout).json()
+    except Exception:
+        API_REQUESTS.inc(function=function, outcome="exception")
+        raise
+    API_REQUESTS.inc(function=function, outcome=outcome_of(payload))
+    return payload
+
+
+class ResponseCache:
+    """
+    memory lru in front of the shared disk tier
+    """
+
+    def __init__(self, capacity=256, ttls=None, use_disk=True):
+        self.capacity = capacity
+        self.ttls = TTLS if ttls is None else ttls
+        self.use_disk = use_disk
+        self.memory = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = collections.Counter()
+
+    def ttl(self, key) -> float:
+        function, _, _, _, month = key
+        ttl = self.ttls.get(function, 0)
+        if not ttl:
+            return 0
+        if month and month < mini_midas.market_calendar.now_eastern().strftime("%Y-%m"):
+            return MONTH_TTL
+        if not mini_midas.common.is_market_open():
+            ttl = max(ttl, AFTER_CLOSE_TTL)
+        return ttl
+
+    def get_disk_path(self, key) -> str:
+        function, symbol, interval, outputsize, month = key
+        file_name = ".".join(part for part in (symbol, interval, outputsize, month) if part)
+        return f"{mini_midas.common.DATA_STORAGE_PATH}/response_cache/{function}/{file_name}.json.gzip"
+
+    def get_memory(self, key):
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self.memory[key]
+                return None
+            self.memory.move_to_end(key)
+            return entry[1]
+
+    def put_memory(self, key, expires_at, payload):
+        if not self.capacity:
+            return
+        with self.lock:
+            self.memory[key] = (expires_at, payload)
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.capacity:
+                self.memory.popitem(last=False)
+
+    def get_disk(self, key):
+        """
+        returns (expires_at, payload), None if missing, expired or unreadable
+        """
+        if not self.use_disk:
+            return None
+        path = self.get_disk_path(key)
+        try:
+            with gzip.open(path, 'rt') as fil:
+                entry = json.load(fil)
+        except (OSError, ValueError):
+            return None
+        if entry["expires_at"] <= time.time():
+            return None
+        return entry["expires_at"], entry["payload"]
+
+    def put_disk(self, key, expires_at, payload):
+        if not self.use_disk:
+            return
+        path = self.get_disk_path(key)
+        pathlib.Path(os.path.dirname(path)).mkdir(parents=True, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(temp_path, 'wt', compresslevel=1) as fil:
+            json.dump({"expires_at": expires_at, "payload": payload}, fil)
+        os.replace(temp_path, path)
+
+    def lookup(self, key):
+        payload = self.get_memory(key)
+        if payload is not None:
+            self.stats["memory_hits"] += 1
+            CACHE_LOOKUPS.inc(result="memory")
+            return payload
+        entry = self.get_disk(key)
+        if entry is not None:
+            self.stats["disk_hits"] += 1
+            CACHE_LOOKUPS.inc(result="disk")
+            self.put_memory(key, *entry)
+            return entry[1]
+        return None
+
+    def get(self, key, fetch):
+        """
+        cached payload of key, calls fetch() once on a miss and caches what it returns if it is a real answer
+        """
+        ttl = self.ttl(key)
+        if not ttl:
+            return fetch()
+
+        payload = self.lookup(key)
+        if payload is not None:
+            return payload
+
+        if not self.use_disk:
+            return self.fetch_and_store(key, ttl, fetch)
+        # whoever holds the lock is fetching this key, the others find its answer on disk once it's released
+        with mini_midas.manifest.locked(self.get_disk_path(key)):
+            payload = self.lookup(key)
+            if payload is not None:
+                return payload
+            return self.fetch_and_store(key, ttl, fetch)
+
+    def fetch_and_store(self, key, ttl, fetch):
+        self.stats["misses"] += 1
+        CACHE_LOOKUPS.inc(result="miss")
+        payload = fetch()
+        if is_cacheable(payload):
+            expires_at = time.time() + ttl
+            self.put_memory(key, expires_at, payload)
+            self.put_disk(key, expires_at, payload)
+        return payload
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+
+
+CACHE = ResponseCache()
+
+
+def fetch_json(session, base_url, token, function, symbol, interval=None, outputsize=None, month=None,
+               cache=None, timeout=None):
+    """
+    GET of an alphavantage query through the cache, returns the parsed json
+    """
+    function_string = f"{function}&symbol={symbol}"
+    for name, value in (("interval", interval), ("month", month), ("outputsize", outputsize)):
+        if value:
+            function_string += f"&{name}={value}"
+    function_string += f"&apikey={token}"
+
+    def fetch():
+        return timed_get(session, base_url + function_string, function, timeout)
+
+    cache = CACHE if cache is None else cache
+    return cache.get(make_key(function, symbol, interval, outputsize, month), fetch)
@@ -0,0 +1,273 @@
+"""
+single process fetch scheduler
+
+instead of one process per ticker each sleeping on its own, one scheduler owns the api rate limit
+and a pooled http session, and hands out the calls fairly across all tickers
+
+    scheduler = FetchScheduler(['tsla', 'aapl', 'msft'])
+    scheduler.run()
+"""
+import threading
+import time
+import concurrent.futures
+import requests
+import requests.adapters
+import excalibur
+import mini_midas
+
+
+LOG_INSTANCE = excalibur.logger.getlogger_debug()
+
+RATE_LIMIT_WAIT_SECONDS = mini_midas.metrics.histogram(
+    "mini_midas_rate_limit_wait_seconds", "time spent waiting for an api token")
+
+
+class TokenBucket:
+    """
+    thread safe token bucket, refills `rate` tokens every `per` seconds,
+    by default it matches the alphavantage limit of 5 calls per minute
+    """
+
+    def __init__(self, rate=mini_midas.common.API_CALLS_PER_MINUTE, per=60.0, capacity=None):
+        self.rate = float(rate)
+        self.per = float(per)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self):
+        now = time.monotonic()
+        elapsed = now - self.last_refill
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate / self.per)
+        self.last_refill = now
+
+    def try_acquire(self, tokens=1) -> float:
+        """
+        takes tokens if available and returns 0,
+        otherwise returns how many seconds to wait until enough tokens are refilled
+        """
+        with self.lock:
+            self.refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            return (tokens - self.tokens) * self.per / self.rate
+
+    def acquire(self, tokens=1) -> float:
+        """
+        blocks until tokens are available, returns seconds waited
+        """
+        waited = 0.0
+        while True:
+            wait_seconds = self.try_acquire(tokens)
+            if not wait_seconds:
+                return waited
+            time.sleep(wait_seconds)
+            waited += wait_seconds
+
+
+def make_session(pool_size):
+    """
+    one http session shared by all tickers, so connections to alphavantage are reused
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class TickerState:
+    """
+    book keeping of one ticker inside the scheduler
+    """
+    __slots__ = ('ticker', 'retriever', 'started', 'in_flight', 'last_attempt', 'last_success', 'failures')
+
+    def __init__(self, ticker):
+        self.ticker = ticker
+        self.retriever = None
+        self.started = False
+        self.in_flight = False
+        self.last_attempt = 0.0
+        self.last_success = None
+        self.failures = 0
+
+
+class FetchScheduler:
+    """
+    polls a list of tickers from a thread pool inside one process
+
+    every api call takes a token from one global bucket, the ticker waiting the longest goes next,
+    so with 15 tickers and 5 calls per minute every ticker is refreshed about every 3 minutes
+    instead of most of them getting throttled
+    """
+    # a bar is 1 minute, no point polling the same ticker faster than that
+    MIN_POLL_INTERVAL = 60.0
+    STALENESS_REPORT_INTERVAL = 300.0
+
+    def __init__(self, tickers, max_workers=4, rate_limiter=None, session=None, token=None):
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter if rate_limiter is not None else TokenBucket()
+        self.session = session if session is not None else make_session(max_workers)
+        self.token = token if token else mini_midas.common.read_api_token()
+        self.states = {tick: TickerState(tick) for tick in tickers}
+        # one writer thread takes every ticker's ticks off the fetch threads
+        self.writer = mini_midas.partitioned_writer.PartitionedWriter()
+        self.lock = threading.Lock()
+        self.last_staleness_report = time.monotonic()
+        self.consolidated_date = None
+        # the gauge reports whichever scheduler was built last in this process
+        mini_midas.metrics.gauge(
+            "mini_midas_ticker_staleness_seconds", "seconds since the last successful fetch of a ticker", ("ticker",),
+        ).callback = lambda: {(tick,): seconds for tick, seconds in self.staleness().items()}
+
+    def create_retriever(self, ticker):
+        return mini_midas.stock_utilities.AlphaVantageTickerIntraPriceRetriever(
+            ticker, session=self.session, token=self.token, writer=self.writer)
+
+    def fetch(self, state):
+        """
+        runs inside a worker thread, first call of a ticker bootstraps it with the intraday prices so far,
+        every call after that polls the latest quote
+        """
+        if state.retriever is None:
+            state.retriever = self.create_retriever(state.ticker)
+        if not state.started:
+            state.retriever.start()
+            state.started = True
+            return True
+        # holes left by skipped polls are filled with this call's token instead of a quote,
+        # without any hole no api call was made and the token still goes to the quote
+        if state.retriever.is_gap_check_due() and state.retriever.fill_gaps() is not None:
+            return True
+        quote = state.retriever.poll_once()
+        return bool(quote) and 'Global Quote' in quote
+
+    def on_fetch_done(self, state, future):
+        with self.lock:
+            state.in_flight = False
+            try:
+                succeeded = future.result()
+            except Exception as e:
+                # same as monit_ticker, a failed retriever gets rebuilt and bootstrapped again
+                LOG_INSTANCE.critical("%s fetch failed, error: %s", state.ticker, str(e))
+                mini_midas.stock_utilities.RESTARTS.inc(ticker=state.ticker)
+                if state.retriever is not None:
+                    state.retriever.close_tick_log()
+                state.retriever = None
+                state.started = False
+                succeeded = False
+
+            if succeeded:
+                state.last_success = time.time()
+                state.failures = 0
+            else:
+                state.failures += 1
+
+    def next_ticker(self):
+        """
+        returns the ready ticker that waited the longest and how long to wait if none is ready
+        """
+        now = time.monotonic()
+        with self.lock:
+            idle = [state for state in self.states.values() if not state.in_flight]
+            if not idle:
+                return None, 1.0
+            state = min(idle, key=lambda st: st.last_attempt)
+            wait_seconds = state.last_attempt + self.MIN_POLL_INTERVAL - now
+            if wait_seconds > 0:
+                return None, wait_seconds
+            state.in_flight = True
+            state.last_attempt = now
+            return state, 0.0
+
+    def staleness(self) -> dict:
+        """
+        returns seconds since the last successful fetch of every ticker, None if never fetched
+        """
+        now = time.time()
+        with self.lock:
+            return {
+                tick: (now - state.last_success) if state.last_success is not None else None
+                for tick, state in self.states.items()
+            }
+
+    def report_staleness(self, threshold=None):
+        """
+        logs tickers that fell behind, returns them with their staleness in seconds
+        """
+        if threshold is None:
+            # a ticker should be served at least once per full round over all tickers
+            round_seconds = len(self.states) * self.rate_limiter.per / self.rate_limiter.rate
+            threshold = max(self.MIN_POLL_INTERVAL, round_seconds) * 2
+
+        stale = {
+            tick: seconds for tick, seconds in self.staleness().items()
+            if seconds is None or seconds > threshold
+        }
+        for tick, seconds in sorted(stale.items()):
+            LOG_INSTANCE.warning("%s is stale, last successful fetch: %s seconds ago", tick, seconds)
+        return stale
+
+    def run_once(self, executor):
+        """
+        dispatches at most one call, returns seconds the caller can sleep before trying again
+        """
+        state, wait_seconds = self.next_ticker()
+        if state is None:
+            return wait_seconds
+
+        RATE_LIMIT_WAIT_SECONDS.observe(self.rate_limiter.acquire())
+        future = executor.submit(self.fetch, state)
+        future.add_done_callback(lambda fut: self.on_fetch_done(state, fut))
+        return 0.0
+
+    def new_session(self):
+        """
+        every ticker is bootstrapped again with its next call, the morning prices come from start()
+        """
+        with self.lock:
+            for state in self.states.values():
+                state.started = False
+
+    def consolidate_day(self):
+        """
+        once the session closed, every ticker's day goes into one historical file
+        """
+        last_close = mini_midas.market_calendar.last_close()
+        date_str = last_close.strftime("%Y%m%d")
+        if self.consolidated_date == date_str or last_close.date() != mini_midas.market_calendar.now_eastern().date():
+            return
+        # ticks still queued go to the logs first, the writer starts again with the next tick
+        self.writer.close()
+        try:
+            mini_midas.consolidate.consolidate(
+                list(self.states), date_str, rate_limiter=self.rate_limiter, session=self.session, token=self.token)
+        except Exception as e:
+            LOG_INSTANCE.critical("Unable to consolidate %s, error: %s", date_str, str(e))
+        self.consolidated_date = date_str
+
+    def run(self):
+        # ticks are only appended to the tick logs, this folds them into the hourly files
+        compactor = mini_midas.tick_log.LogCompactor(list(self.states))
+        compactor.start()
+        self.writer.start()
+        mini_midas.metrics.start_reporting("scheduler")
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                # if market is closed or is weekend, or is market holidays, we sleep until next session
+                if mini_midas.common.is_market_not_available():
+                    self.consolidate_day()
+                    mini_midas.common.sleep_until_market_open()
+                    self.new_session()
+                    continue
+
+                wait_seconds = self.run_once(executor)
+                if wait_seconds:
+                    time.sleep(min(wait_seconds, 1.0))
+
+                if time.monotonic() - self.last_staleness_report > self.STALENESS_REPORT_INTERVAL:
+                    self.report_staleness()
+                    self.last_staleness_report = time.monotonic()
@@ -0,0 +1,180 @@
+"""
+typed column representation of minute bars
+
+alphavantage gives us nested dicts with string prices, this module turns them into numpy columns:
+    minute: int64 minutes since epoch of the US/Eastern wall clock time alphavantage reports
+    open, high, low, close: float64
+    volume: int64
+"""
+import numpy as np
+
+
+TIME_SERIES_KEY = "Time Series (1min)"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+MINUTES_PER_DAY = 24 * 60
+
+COLUMNS = ('minute', 'open', 'high', 'low', 'close', 'volume')
+COLUMN_DTYPES = {
+    'minute': np.int64,
+    'open': np.float64,
+    'high': np.float64,
+    'low': np.float64,
+    'close': np.float64,
+    'volume': np.int64,
+}
+# keys alphavantage uses for each bar in "Time Series (1min)"
+PRICE_KEYS = {
+    'open': "1. open",
+    'high': "2. high",
+    'low': "3. low",
+    'close': "4. close",
+    'volume': "5. volume",
+}
+
+
+class Bars:
+    """
+    minute bars of one ticker held as parallel numpy columns
+    """
+    __slots__ = COLUMNS
+
+    def __init__(self, minute=None, open=None, high=None, low=None, close=None, volume=None):
+        columns = {'minute': minute, 'open': open, 'high': high, 'low': low, 'close': close, 'volume': volume}
+        for name in COLUMNS:
+            column = columns[name]
+            if column is None:
+                column = np.empty(0, dtype=COLUMN_DTYPES[name])
+            setattr(self, name, column)
+
+    def __len__(self):
+        return len(self.minute)
+
+    def columns(self) -> dict:
+        return {name: getattr(self, name) for name in COLUMNS}
+
+    @property
+    def time(self) -> np.ndarray:
+        """
+        minute column as datetime64[m], matplotlib plots it directly
+        """
+        return np.asarray(self.minute).astype('datetime64[m]')
+
+    @property
+    def mid(self) -> np.ndarray:
+        return (self.high + self.low) / 2.0
+
+    @property
+    def typical(self) -> np.ndarray:
+        return (self.high + self.low + self.close) / 3.0
+
+    def take(self, index):
+        """
+        returns new bars picked by a numpy index or mask
+        """
+        return Bars(**{name: np.asarray(getattr(self, name)[index]) for name in COLUMNS})
+
+    def between(self, start_minute, end_minute):
+        """
+        returns bars with start_minute <= minute < end_minute, bars must be sorted
+        """
+        lo, hi = np.searchsorted(self.minute, [start_minute, end_minute])
+        return self.take(slice(lo, hi))
+
+    def sorted_unique(self):
+        """
+        returns bars sorted by minute, when a minute shows up more than once the last one wins
+        """
+        if not len(self):
+            return self
+        # stable sort keeps the original order among equal minutes, so we can keep the last of each run
+        order = np.argsort(self.minute, kind='stable')
+        minutes = self.minute[order]
+        is_last = np.ones(len(minutes), dtype=bool)
+        is_last[:-1] = minutes[1:] != minutes[:-1]
+        return self.take(order[is_last])
+
+    def days(self):
+        """
+        yields (date_str, bars) for every calendar day covered, bars must be sorted
+        """
+        day_index = self.minute // MINUTES_PER_DAY
+        boundaries = np.flatnonzero(np.diff(day_index)) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [len(self)]))
+        for start, end in zip(starts, ends):
+            if start == end:
+                continue
+            date_str = minute_to_date_string(self.minute[start])
+            yield date_str, self.take(slice(start, end))
+
+    def to_time_series(self) -> dict:
+        """
+        back to the alphavantage "Time Series (1min)" dict shape, only used at json boundaries
+        """
+        stamps = minutes_to_timestamps(self.minute)
+        opens, highs, lows, closes = (
+            np.char.mod('%.4f', getattr(self, name)).tolist() for name in ('open', 'high', 'low', 'close'))
+        volumes = self.volume.astype(str).tolist()
+        return {
+            stamps[i]: {
+                "1. open": opens[i], "2. high": highs[i], "3. low": lows[i], "4. close": closes[i],
+                "5. volume": volumes[i],
+            }
+            for i in range(len(stamps))
+        }
+
+
+def concat(bars_list):
+    bars_list = [bars for bars in bars_list if len(bars)]
+    if not bars_list:
+        return Bars()
+    return Bars(**{name: np.concatenate([getattr(bars, name) for bars in bars_list]) for name in COLUMNS})
+
+
+def timestamps_to_minutes(stamps) -> np.ndarray:
+    """
+    "2020-04-09 16:00:00" -> int64 epoch minutes, seconds are floored into their minute
+    """
+    return np.array(stamps, dtype='datetime64[s]').astype('datetime64[m]').astype(np.int64)
+
+
+def minutes_to_timestamps(minutes) -> list:
+    stamps = np.asarray(minutes, dtype=np.int64).astype('datetime64[m]').astype('datetime64[s]')
+    return [stamp.replace('T', ' ') for stamp in np.datetime_as_string(stamps)]
+
+
+def minute_to_date_string(minute) -> str:
+    """
+    epoch minute -> "%Y%m%d", the date format used in storage file names
+    """
+    return str(np.datetime64(int(minute), 'm').astype('datetime64[D]')).replace('-', '')
+
+
+def date_string_to_minute(date_str) -> int:
+    """
+    "%Y%m%d" -> epoch minute at midnight of that day
+    """
+    return int(np.datetime64(f"{date_str[:4]}-{date_str[4:6]}-{date_str[6:8]}", 'm').astype(np.int64))
+
+
+def parse_time_series(json_obj: dict) -> Bars:
+    """
+    alphavantage intraday json -> sorted unique Bars
+
+    the whole block is converted in one pass, timestamps by numpy's datetime64 parser
+    and every price string of every bar through one float64 array, instead of strptime and float() per row
+    """
+    time_series = json_obj.get(TIME_SERIES_KEY) or {}
+    if not time_series:
+        return Bars()
+    price_keys = tuple(PRICE_KEYS.values())
+    flat_values = [row[key] for row in time_series.values() for key in price_keys]
+    values = np.array(flat_values, dtype=np.float64).reshape(-1, len(price_keys))
+    return Bars(
+        minute=timestamps_to_minutes(list(time_series.keys())),
+        open=values[:, 0].copy(),
+        high=values[:, 1].copy(),
+        low=values[:, 2].copy(),
+        close=values[:, 3].copy(),
+        volume=values[:, 4].astype(np.int64),
+    ).sorted_unique()
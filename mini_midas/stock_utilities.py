@@ -15,19 +15,22 @@ tickers_to_save = ['dal', 'aal', 'ual', 'tsla', 'amzn',
 """
 
 
-import os
 import pathlib
-import datetime
-import json
 import time
 import requests
-import multiprocessing
 import excalibur
 import mini_midas
 
 
 LOG_INSTANCE = excalibur.logger.getlogger_debug()
 
+QUOTE_ERRORS = mini_midas.metrics.counter(
+    "mini_midas_quote_errors_total", "quotes that failed to fetch or parse", ("stage",))
+RESTARTS = mini_midas.metrics.counter(
+    "mini_midas_restarts_total", "retrievers rebuilt after a failure", ("ticker",))
+GAP_MINUTES = mini_midas.metrics.counter(
+    "mini_midas_gap_minutes_filled_total", "missing session minutes filled from intraday calls", ("outputsize",))
+
 
 class AlphaVantageTickerIntraPriceRetriever:
     """
@@ -37,6 +40,10 @@ class AlphaVantageTickerIntraPriceRetriever:
     TOKEN_PATH = mini_midas.common.TOKEN_PATH
     BASE_URL = mini_midas.common.BASE_URL
     DATA_STORAGE_PATH = mini_midas.common.DATA_STORAGE_PATH
+    # extended hours day is 16 hours of minute bars, older bars get spilled into the bar store
+    CACHE_CAPACITY = 1024
+    # seconds between looks for holes in the day, each fill costs one intraday call
+    GAP_CHECK_SECONDS = 900
 
     def init_dirs(self):
         """
@@ -48,21 +55,36 @@ class AlphaVantageTickerIntraPriceRetriever:
         pathlib.Path(self.intraday_data_storage_path).mkdir(parents=True, exist_ok=True)
         pathlib.Path(self.historical_data_storage_path).mkdir(parents=True, exist_ok=True)
 
-    def __init__(self, ticker):
-        self.token = self.get_token()
+    def __init__(self, ticker, session=None, token=None, cache_capacity=None, response_cache=None, writer=None):
+        """
+        session, token and writer can be shared by a scheduler owning many retrievers,
+        so we don't open a new connection pool, re-read the token file or run a writer thread per ticker,
+        api responses go through the process wide response cache unless another one is given
+        """
+        self.token = token if token else self.get_token()
+        self.session = session if session is not None else requests.Session()
+        self.response_cache = response_cache if response_cache is not None else mini_midas.response_cache.CACHE
         self.init_dirs()
-        self.cache = []
         self.ticker = ticker
+        self.meta_data = {}
+        self.cache = mini_midas.bar_buffer.BarBuffer(
+            capacity=cache_capacity or self.CACHE_CAPACITY, spill=self.spill_cached_bars)
+        # ticks are only enqueued, the writer's thread appends them to the tick log
+        self.owns_writer = writer is None
+        self.writer = writer if writer is not None else mini_midas.partitioned_writer.PartitionedWriter()
+        self.indicators = mini_midas.indicators.IndicatorEngine(ticker, writer=self.writer)
+        # shared memory feed plotters read bars from, only collecting retrievers open one in start()
+        self.feed = None
+        self.last_gap_check = None
+        self.consolidated_date = None
+        # what retrieve_start_price came back with, a recovered day is not an official snapshot
+        self.start_price_source = mini_midas.merge.SOURCE_OFFICIAL
 
     def get_token(self):
         """
         get token from file at a fixed location stated by self.TOKEN_PATH
         """
-        if not os.path.exists(self.TOKEN_PATH):
-            raise FileNotFoundError(f"Token file at {self.TOKEN_PATH} not found")
-
-        with open(self.TOKEN_PATH, 'r') as fil:
-            self.token = fil.readline()
+        self.token = mini_midas.common.read_api_token(self.TOKEN_PATH)
 
         if self.token:
             LOG_INSTANCE.info("Loaded market api token %s", self.token)
@@ -96,21 +118,59 @@ class AlphaVantageTickerIntraPriceRetriever:
             }, ...
         }
 
+
+        compact only holds the latest 100 minutes, later in the session the whole day needs the full output
+        """
+        date_str, _ = mini_midas.common.split_date_string()
+        coverage = mini_midas.gaps.Coverage(self.ticker, date_str)
+        windows = mini_midas.gaps.find_gaps(self.ticker, date_str, mini_midas.series.Bars(), coverage=coverage)
+        outputsize = mini_midas.gaps.outputsize_for(windows)
+        json_obj = mini_midas.response_cache.fetch_json(
+            self.session, self.BASE_URL, self.token, "TIME_SERIES_INTRADAY", self.ticker, interval="1min",
+            outputsize=outputsize, cache=self.response_cache)
+        if windows and mini_midas.response_cache.is_cacheable(json_obj):
+            # minutes without trades in what we just pulled are not gaps, the next gap check would pull them again
+            day_start = mini_midas.series.date_string_to_minute(date_str)
+            bars = mini_midas.series.parse_time_series(json_obj).between(
+                day_start, day_start + mini_midas.series.MINUTES_PER_DAY)
+            coverage.add(mini_midas.gaps.covered_by_response(windows, bars, outputsize), len(bars))
+            coverage.save()
+        return json_obj
+
+    def recover_from_tick_log(self):
         """
-        function_string = f"TIME_SERIES_INTRADAY&symbol={self.ticker}&interval=1min&apikey={self.token}"
-        url = self.BASE_URL + function_string
-        req = requests.get(url)
-        return req.json()
+        rebuilds today's prices from the bar store and the tick log left by a previous run,
+        returns None if there is nothing to recover, holes in what we recover are left to fill_gaps
+        """
+        date_str, _ = mini_midas.common.split_date_string()
+        bars = mini_midas.tick_log.recover(self.ticker, date_str)
+        if not len(bars):
+            # the log may be gone while the day's bars are still in the store
+            bars = mini_midas.bar_store.read_day(self.ticker, date_str)
+        if not len(bars):
+            return None
+        LOG_INSTANCE.info("Recovered %s bars of %s from tick log and bar store", len(bars), self.ticker)
+        return {
+            "Meta Data": {"2. Symbol": self.ticker},
+            "Time Series (1min)": bars.to_time_series(),
+        }
 
     def retrieve_start_price(self):
         """
-        1. try to read from file
-        2. if file not exist, read from endpoint
+        1. try to recover from the tick log of a previous run
+        2. try to read from file
+        3. if file not exist, read from endpoint
         """
-        file_path = mini_midas.common.get_file_saved_path(self.ticker)
+        ticker_data = self.recover_from_tick_log()
+        if ticker_data:
+            self.start_price_source = mini_midas.merge.SOURCE_UNKNOWN
+            return ticker_data
 
-        if excalibur.file_utility.does_gzip_file_exist_and_not_empty(file_path):
-            ticker_data = excalibur.file_utility.read_gzip_file_as_json_obj(file_path)
+        self.start_price_source = mini_midas.merge.SOURCE_OFFICIAL
+        file_path = mini_midas.common.get_snapshot_file_path(self.ticker)
+
+        if mini_midas.storage_codec.does_file_exist_and_not_empty(file_path):
+            ticker_data = mini_midas.storage_codec.read_json(file_path)
             return ticker_data
 
         ticker_data = self.get_start_price()
@@ -122,8 +182,7 @@ class AlphaVantageTickerIntraPriceRetriever:
         """
         returns if this is market holiday
         """
-        # TODO: need to implement this
-        return False
+        return mini_midas.common.is_market_holiday()
 
     # def extract_info_out_of_ticker_data(self, data_json):
     #     ticker_name = data_json['2. Symbol']
@@ -140,9 +199,10 @@ class AlphaVantageTickerIntraPriceRetriever:
         data_ticker_name = meta_data['2. Symbol']
         return data_ticker_name
 
-    def save_start_price_to_file(self, data_json: dict) -> None:
+    def save_start_price_to_file(self, data_json: dict, source=None) -> None:
         """
-        this writes the data into file
+        this writes the data into file, official snapshots of an open session go to their own partition
+        so ticks folded into the hour files never overwrite them
 
         data has below field for formulating a storage location
         res['Meta Data']
@@ -154,9 +214,29 @@ class AlphaVantageTickerIntraPriceRetriever:
         if self.ticker != data_ticker_name:
             raise Exception(f"Error saving data, ticker_name to save: {self.ticker}, data_ticker_name in data:{data_ticker_name}")
 
+        source = mini_midas.merge.SOURCE_OFFICIAL if source is None else source
+        bars = mini_midas.series.parse_time_series(data_json)
+        if not mini_midas.common.is_market_closed():
+            if source == mini_midas.merge.SOURCE_OFFICIAL:
+                self.save_official_bars(bars, data_json.get("Meta Data"))
+            else:
+                # recovered from our own files, it only has to reach the bar store
+                mini_midas.bar_store.merge_bars(self.ticker, bars, source)
+            return
+
         data_path = mini_midas.common.get_file_saved_path(self.ticker)
         excalibur.file_utility.remove_gzip_file_if_empty(data_path)
-        excalibur.file_utility.write_to_gzip(data_path, [json.dumps(data_json)])
+        mini_midas.storage_codec.write_json(data_path, data_json)
+        mini_midas.manifest.record_file(self.ticker, data_path, bars, source=source)
+        mini_midas.bar_store.merge_bars(self.ticker, bars, source)
+
+    def save_official_bars(self, bars, meta_data=None):
+        """
+        merges official bars of today into the official intraday partition and the bar store
+        """
+        date_str, _ = mini_midas.common.split_date_string()
+        mini_midas.tick_log.fold_into_official_file(self.ticker, date_str, bars, meta_data or self.meta_data)
+        mini_midas.bar_store.merge_bars(self.ticker, bars, mini_midas.merge.SOURCE_OFFICIAL)
 
     def get_ticker_price(self):
         """
@@ -168,74 +248,86 @@ class AlphaVantageTickerIntraPriceRetriever:
         """
         # https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol=MSFT&apikey=demo
         try:
-            function_string = f"GLOBAL_QUOTE&symbol={self.ticker}&apikey={self.token}"
-            url = self.BASE_URL + function_string
-            r = requests.get(url)
-            return r.json()
+            return mini_midas.response_cache.fetch_json(
+                self.session, self.BASE_URL, self.token, "GLOBAL_QUOTE", self.ticker, cache=self.response_cache)
 
         except Exception as e:
-            LOG_INSTANCE.critical("Unable to retrieve price, error: %sstatus:%s, %s, raw:%s", str(e), r.status_code, r.text, r.raw)
+            QUOTE_ERRORS.inc(stage="fetch")
+            LOG_INSTANCE.critical("Unable to retrieve %s price, error: %s", self.ticker, str(e))
+
+    def cached_data_to_json(self) -> dict:
+        """
+        cached bars in alphavantage intraday format, this is only built when we write to file
+        """
+        return {
+            "Meta Data": self.meta_data,
+            "Time Series (1min)": self.cache.to_bars().to_time_series(),
+        }
+
+    def spill_cached_bars(self, bars):
+        """
+        receives the oldest bars when the cache is full, they go straight to the bar store
+        """
+        LOG_INSTANCE.info("%s cache full, spilling %s bars to bar store", self.ticker, len(bars))
+        mini_midas.bar_store.merge_bars(self.ticker, bars)
 
     def save_current_cached_data(self):
         if not self.cache:
             raise Exception("Cache doesn't have any data")
         data_path = mini_midas.common.get_file_saved_path(self.ticker)
-        excalibur.file_utility.write_to_gzip(data_path, [json.dumps(self.cache)])
+        bars = self.cache.to_bars()
+        mini_midas.storage_codec.write_json(data_path, self.cached_data_to_json())
+        # the cache holds official bars and ticks alike
+        mini_midas.manifest.record_file(self.ticker, data_path, bars, source=mini_midas.merge.SOURCE_UNKNOWN)
+        mini_midas.bar_store.merge_bars(self.ticker, bars, mini_midas.merge.SOURCE_UNKNOWN)
 
     def reset_cache(self):
-        self.cache = []
+        self.meta_data = {}
+        self.cache.clear()
 
     def clear_intraday_prices(self):
         """
         clears the cached price hourly since holding in memory doesn't serve any purpose and we are writing every hour data into file
         """
-        self.cache['Time Series (1min)'] = {}
+        self.cache.clear()
 
     def save_price_only(self):
         """
         this method is for those runner periodically saves interday prices to keep a record
         """
 
-        if mini_midas.common.is_market_closed and not mini_midas.common.is_market_open:
-            # sleeps 1 hr and hope the market is closed and we can get full historical price
-            time.sleep(3600)
-
         LOG_INSTANCE.info(f"Retrieving {self.ticker} price")
         self.reset_cache()
         # curls and save intraday data
         intraday_price_so_far = self.retrieve_start_price()
-        self.save_start_price_to_file(intraday_price_so_far)
+        self.save_start_price_to_file(intraday_price_so_far, self.start_price_source)
 
     def cache_intraday_ticker_data(self, intraday_price_so_far):
-        self.cache = intraday_price_so_far
+        self.meta_data = intraday_price_so_far.get("Meta Data", {})
+        self.cache.clear()
+        bars = mini_midas.series.parse_time_series(intraday_price_so_far)
+        self.cache.extend(bars)
+        self.indicators.seed(bars)
+        if self.feed is not None:
+            self.feed.publish_bars(bars)
 
     def get_latest_price_from_cache(self):
         """
-        display the latest price from cache, which is in below format
-
-        intraday format:
-        {
-            "Meta Data": {
-                "1. Information": "Intraday (1min) open, high, low, close prices and volume",
-                "2. Symbol": "tsla", "3. Last Refreshed": "2020-04-09 16:00:00",
-                "4. Interval": "1min", "5. Output Size": "Compact", "6. Time Zone": "US/Eastern"
-            },
-            "Time Series (1min)": {
-                "2020-04-09 16:00:00": {"1. open": "571.9250", "2. high": "573.0100", "3. low": "571.7300", "4. close": "573.0100", "5. volume": "117287"},
-                "2020-04-09 15:59:00": {"1. open": "572.0000", "2. high": "572.0000", "3. low": "571.4500", "4. close": "572.0000", "5. volume": "56954"},
-                "2020-04-09 15:58:00": {"1. open": "571.4500", "2. high": "572.0000", "3. low": ...
-                }
-            }, ...
-        }
+        returns the latest bar from cache in alphavantage bar format, the cache keeps its newest bar at the end
+        so this doesn't need to sort anything
 
+        {"1. open": "571.9250", "2. high": "573.0100", "3. low": "571.7300", "4. close": "573.0100",
+        "5. volume": "117287", "timestamp": "2020-04-09 16:00:00"}
         """
         if not self.cache:
             raise Exception("Empty Cache")
-        time_series = self.cache["Time Series (1min)"]
-        keys = sorted(time_series.keys())
-        latest_date = keys[-1]
-        latest_data = time_series[latest_date]
-        latest_data['timestamp'] = latest_date
+        latest_bar = self.cache.latest()
+        latest_data = {
+            "1. open": f"{latest_bar['open']:.4f}", "2. high": f"{latest_bar['high']:.4f}",
+            "3. low": f"{latest_bar['low']:.4f}", "4. close": f"{latest_bar['close']:.4f}",
+            "5. volume": str(latest_bar['volume']),
+        }
+        latest_data['timestamp'] = mini_midas.series.minutes_to_timestamps([latest_bar['minute']])[0]
         return latest_data
 
     def cache_ticker_minute_data(self, ticker_minute_data):
@@ -273,50 +365,143 @@ class AlphaVantageTickerIntraPriceRetriever:
         }
         """
         try:
-            global_quote = ticker_minute_data['Global Quote']
-            # check symbol is the same or not
-            # symbol = global_quote['01. symbol']
-            open_price = global_quote['02. open']
-            high_price = global_quote['03. high']
-            low_price = global_quote['04. low']
-            price = global_quote['05. price']
-            volume = global_quote['06. volume']
-
-            # 2020-04-09 16:00:00, we manufacture this receive time just for intraday display purpose
-            date_received = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            # just irresponsbily append to the end and hope the display would do a sort before display
-            self.cache['Time Series (1min)'][date_received] = {
-                "1. open": open_price, "2. high": high_price, "3. low": low_price, "4. close": price, "5. volume": volume,
-            }
-
+            with mini_midas.metrics.stage("quote_parse"):
+                global_quote = ticker_minute_data['Global Quote']
+                # check symbol is the same or not
+                # symbol = global_quote['01. symbol']
+                open_price = float(global_quote['02. open'])
+                high_price = float(global_quote['03. high'])
+                low_price = float(global_quote['04. low'])
+                price = float(global_quote['05. price'])
+                volume = int(global_quote['06. volume'])
+
+                # 2020-04-09 16:00:00, we manufacture this receive time just for intraday display purpose
+                date_received = mini_midas.market_calendar.now_eastern().strftime("%Y-%m-%d %H:%M:%S")
+                minute_received = mini_midas.series.timestamps_to_minutes([date_received])[0]
         except Exception as e:
+            QUOTE_ERRORS.inc(stage="parse")
             LOG_INSTANCE.critical(f"Invalid Quote Data: {ticker_minute_data}, Error: {str(e)}")
+            return
+
+        with mini_midas.metrics.stage("quote_cache"):
+            # a second quote within the same minute replaces the bar of that minute
+            self.cache.append(minute_received, open_price, high_price, low_price, price, volume)
+            self.indicators.on_bar(minute_received, open_price, high_price, low_price, price, volume)
+            if self.feed is not None:
+                self.feed.publish(minute_received, open_price, high_price, low_price, price, volume)
+        with mini_midas.metrics.stage("writer_enqueue"):
+            self.append_to_tick_log(minute_received, open_price, high_price, low_price, price, volume)
+
+    def append_to_tick_log(self, minute, open_price, high_price, low_price, close_price, volume):
+        """
+        hands the tick to the writer, it goes to the log of the day the tick belongs to
+        """
+        self.writer.start()
+        self.writer.submit_bar(self.ticker, minute, open_price, high_price, low_price, close_price, volume)
 
-    def sleep_if_market_not_available(self):
-        while mini_midas.common.is_market_not_available():
-            LOG_INSTANCE.debug('Market Closed,sleeping....Zzzz...')
-            time.sleep(65)
-            continue
+    def close_tick_log(self):
+        """
+        writes out what is still queued, a shared writer is closed by its owner
+        """
+        if self.owns_writer:
+            self.writer.close()
 
-        LOG_INSTANCE.info("Market is Open")
+    def close_feed(self):
+        if self.feed is not None:
+            self.feed.close()
+            self.feed = None
 
-    def run(self):
+    def get_day_bars(self, date_str) -> mini_midas.series.Bars:
         """
-        this main method will do below steps, but remember, this intraday data collected may be
-        different from it whole day minute data, we need to have a separate process
-        that specialized at collect this daily data and the end of market every day
+        bars of the day we have, bars spilled out of the cache are in the bar store
+        """
+        bars = self.cache.to_bars()
+        if self.cache.spilled:
+            bars = mini_midas.series.concat([mini_midas.bar_store.read_day(self.ticker, date_str), bars]).sorted_unique()
+        day_start = mini_midas.series.date_string_to_minute(date_str)
+        return bars.between(day_start, day_start + mini_midas.series.MINUTES_PER_DAY)
 
-        # 1. curl endpoint to download all minute price so far
-        # 2. save them into a file, if today market is already closed, we should save it at another location
-        # 3. curl the endpoint every minute to retrieve price until market ends
-        # 4. every 10 minutes, save the price into a flat file, by hour
-        # 5. when market ends, save all these files into one file at another location
+    def is_gap_check_due(self) -> bool:
+        return self.last_gap_check is None or time.monotonic() - self.last_gap_check >= self.GAP_CHECK_SECONDS
+
+    def fill_gaps(self, now=None) -> int:
+        """
+        fetches only the windows of today's session we have no bars for, returns number of bars filled,
+        None if nothing was missing and no api call was made,
+        what the call covered is recorded so minutes without trades are not asked for again
+        """
+        self.last_gap_check = time.monotonic()
+        date_str = mini_midas.market_calendar.now_eastern(now).strftime("%Y%m%d")
+        coverage = mini_midas.gaps.Coverage(self.ticker, date_str)
+        windows = mini_midas.gaps.find_gaps(self.ticker, date_str, self.get_day_bars(date_str), now, coverage)
+        if not windows:
+            return None
+
+        outputsize = mini_midas.gaps.outputsize_for(windows, now)
+        LOG_INSTANCE.info("%s is missing %s minutes in %s windows, fetching %s", self.ticker,
+                          mini_midas.gaps.window_minutes(windows), len(windows), outputsize)
+        json_obj = mini_midas.response_cache.fetch_json(
+            self.session, self.BASE_URL, self.token, "TIME_SERIES_INTRADAY", self.ticker, interval="1min",
+            outputsize=outputsize, cache=self.response_cache)
+        if not mini_midas.response_cache.is_cacheable(json_obj):
+            LOG_INSTANCE.warning("Unable to fill gaps of %s: %s", self.ticker, json_obj)
+            return 0
+
+        day_start = mini_midas.series.date_string_to_minute(date_str)
+        bars = mini_midas.series.parse_time_series(json_obj).sorted_unique().between(
+            day_start, day_start + mini_midas.series.MINUTES_PER_DAY)
+        filled = bars.take(mini_midas.gaps.in_windows(bars.minute, windows))
+        self.merge_gap_bars(filled)
+        coverage.add(mini_midas.gaps.covered_by_response(windows, bars, outputsize), len(filled))
+        coverage.save()
+        GAP_MINUTES.inc(len(filled), outputsize=outputsize)
+        return len(filled)
+
+    def merge_gap_bars(self, bars):
+        """
+        gap bars are older than the newest cached bar, so the cache is rebuilt,
+        they are official bars, so they go to the official partition instead of the tick log
         """
+        if not len(bars):
+            return
+        merged = mini_midas.series.concat([self.cache.to_bars(), bars]).sorted_unique()
+        self.cache.clear()
+        self.cache.extend(merged)
+        self.indicators.seed(merged)
+        self.save_official_bars(bars)
+        if self.feed is not None:
+            self.feed.publish_bars(bars)
+
+    def consolidate_day(self):
+        """
+        step 5 of run(), once today's session closed its files become one historical file
+        """
+        last_close = mini_midas.market_calendar.last_close()
+        date_str = last_close.strftime("%Y%m%d")
+        if self.consolidated_date == date_str or last_close.date() != mini_midas.market_calendar.now_eastern().date():
+            return
+        self.close_tick_log()
+        try:
+            mini_midas.consolidate.consolidate(
+                [self.ticker], date_str, session=self.session, token=self.token, max_workers=1)
+        except Exception as e:
+            LOG_INSTANCE.critical("Unable to consolidate %s %s, error: %s", self.ticker, date_str, str(e))
+        self.consolidated_date = date_str
 
-        self.sleep_if_market_not_available()
+    def sleep_if_market_not_available(self):
+        # wakes up exactly when the next session opens instead of polling the clock all night
+        mini_midas.common.sleep_until_market_open()
+        LOG_INSTANCE.info("Market is Open")
 
+    def start(self):
+        """
+        step 1 and 2 of run(), curls and saves all minute prices so far and primes the cache
+        """
         LOG_INSTANCE.info(f"Retrieving {self.ticker} price")
         self.reset_cache()
+        self.writer.start()
+        if self.feed is None:
+            self.feed = mini_midas.live_feed.LiveFeedWriter(self.ticker)
 
         # curls and save intraday data
         intraday_price_so_far = self.retrieve_start_price()
@@ -324,47 +509,86 @@ class AlphaVantageTickerIntraPriceRetriever:
         latest_price = self.get_latest_price_from_cache()
         LOG_INSTANCE.info("Retrieved Latest Intraday data for %s: %s", self.ticker, latest_price)
 
-        self.save_start_price_to_file(intraday_price_so_far)
-        # we will stop here for now for saving data
-        current_hour = excalibur.time_conversion.get_current_hour()
+        # no gap check here, this call already spent its token, the next due check pays its own
+        self.save_start_price_to_file(intraday_price_so_far, self.start_price_source)
 
-        # import ipdb
-        # ipdb.set_trace()
+    def poll_once(self):
+        """
+        step 3 of run(), retrieves the latest quote once, caches it and appends it to the tick log,
+        returns the raw quote so caller can tell if the call went through
 
-        # TODO: intraday disconnected, then we will have one hour carries all daily data, we need to address this issue
+        step 4 is done by a LogCompactor folding the tick log into the hourly files in the background
+        """
+        ticker_minute_data = self.get_ticker_price()
+        LOG_INSTANCE.debug("%s intraday: %s", self.ticker, ticker_minute_data)
+        self.cache_ticker_minute_data(ticker_minute_data)
+        return ticker_minute_data
 
-        while True:
-            # if market is closed or is weekend, or is market holidays, we will just keep sleeping
-            if mini_midas.common.is_market_not_available():
-                LOG_INSTANCE.debug('Market Closed,sleeping....Zzzz...')
-                time.sleep(65)
-                continue
+    def run(self):
+        """
+        this main method will do below steps, but remember, this intraday data collected may be
+        different from it whole day minute data, we need to have a separate process
+        that specialized at collect this daily data and the end of market every day
 
-            ticker_minute_data = self.get_ticker_price()
-            LOG_INSTANCE.info("%s intraday: %s", self.ticker, ticker_minute_data)
-            self.cache_ticker_minute_data(ticker_minute_data)
+        # 1. curl endpoint to download all minute price so far
+        # 2. save them into a file, if today market is already closed, we should save it at another location
+        # 3. curl the endpoint every minute to retrieve price until market ends
+        # 4. every 10 minutes, save the price into a flat file, by hour
+        # 5. when market ends, save all these files into one file at another location, see mini_midas.consolidate
+        """
 
-            # save current cached prices every hour
-            new_hour = excalibur.time_conversion.get_current_hour()
-            if current_hour != new_hour:
-                self.save_current_cached_data()
-                self.clear_intraday_prices()
-            # sleep 1 minute before retry
-            time.sleep(65)
+        self.sleep_if_market_not_available()
+        self.start()
 
+        compactor = mini_midas.tick_log.LogCompactor([self.ticker])
+        compactor.start()
+        reporting = mini_midas.metrics.start_reporting(f"retriever.{self.ticker}")
 
-def secure_ticker_prices(ticker_list):
-    # we don't do it in weekend
-    if mini_midas.common.is_weekend():
+        try:
+            while True:
+                # if market is closed or is weekend, or is market holidays, we sleep until next session
+                if mini_midas.common.is_market_not_available():
+                    self.consolidate_day()
+                    self.sleep_if_market_not_available()
+                    # a new session, bootstrapped with its prices so far like the first one
+                    self.start()
+                    continue
+
+                self.poll_once()
+                if self.is_gap_check_due():
+                    self.fill_gaps()
+                # sleep 1 minute before retry
+                mini_midas.market_calendar.sleep(65)
+        finally:
+            # monit_ticker builds a new retriever after a failure, don't leave this one's writer and compactor behind
+            self.close_tick_log()
+            self.close_feed()
+            compactor.stop()
+            reporting.stop()
+
+
+def secure_ticker_prices(ticker_list, rate_limiter=None):
+    """
+    saves today's full day prices of every ticker, for date ranges use mini_midas.backfill
+    """
+    # we don't do it in weekend or market holidays
+    if mini_midas.common.is_weekend() or mini_midas.common.is_market_holiday():
         return
 
-    counter = 0
+    if mini_midas.common.is_market_open():
+        # wait until the session closes so we get the full day of prices
+        seconds = mini_midas.market_calendar.seconds_until_close()
+        LOG_INSTANCE.info("Market is open, sleeping %.0f seconds until close", seconds)
+        mini_midas.market_calendar.sleep(seconds)
+
+    # token and connections are shared by every ticker, calls are paced by the bucket instead of sleeping 61s every 5
+    rate_limiter = rate_limiter if rate_limiter is not None else mini_midas.scheduler.TokenBucket()
+    session = mini_midas.scheduler.make_session(1)
+    token = mini_midas.common.read_api_token()
     for tick in ticker_list:
-        alpha = AlphaVantageTickerIntraPriceRetriever(tick)
+        rate_limiter.acquire()
+        alpha = AlphaVantageTickerIntraPriceRetriever(tick, session=session, token=token)
         alpha.save_price_only()
-        counter += 1
-        if counter % 5 == 0:
-            time.sleep(61)
 
 
 def monit_ticker(tic):
@@ -373,26 +597,19 @@ def monit_ticker(tic):
             alpha = mini_midas.stock_utilities.AlphaVantageTickerIntraPriceRetriever(tic)
             alpha.run()
         except Exception as e:
+            RESTARTS.inc(ticker=tic)
             LOG_INSTANCE.critical("%s monitoring process was terminated, error: %s", tic, str(e))
 
         time.sleep(1)
 
 
 def start_monitoring_tickers(tickers):
-    # multiprocessing
-    print("Number of cpu : ", multiprocessing.cpu_count())
-
-    # Process will create a process waiting to run
-    procs = []
-    for tick in tickers:
-        p = multiprocessing.Process(target=monit_ticker, args=(tick,))
-        p.start()
-        time.sleep(1)
-        procs.append(p)
-
-    # wait for process to end
-    for p in procs:
-        p.join()
+    """
+    polls all tickers from this one process, the scheduler shares the api rate limit
+    and the http connection pool across tickers
+    """
+    scheduler = mini_midas.scheduler.FetchScheduler(tickers)
+    scheduler.run()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,288 @@
+"""
+compression and encoding of stored market data files
+
+a codec is a compression (gzip, zlib, lzma, bz2, zstd and lz4 when installed) at a level
+plus an encoding of the bars:
+    av_json: the alphavantage dict as we receive it, "1. open" keys and string prices on every bar
+    row_json: meta data plus one [minute, open, high, low, close, volume] list per bar
+    delta: binary columns, minutes and prices in 1/10000 ticks delta encoded as int64
+
+gzip + av_json files are written as plain gzip, exactly what excalibur.file_utility wrote before,
+every other codec writes a small header so readers sniff how a file was written,
+old files and files of any codec can be read side by side
+
+each storage tier picks its codec, hourly intraday files are written often and want a fast codec,
+historical day files are written once and read by every plot and backtest
+
+the defaults stay plain gzip of the alphavantage json, the files keep their .json.gzip names and
+gzip tools or an older checkout read them, the binary codecs are opt-in for trees only read through
+this module, the codec benchmark (python -m mini_midas.benchmark --codecs) shows what they save
+
+    MINI_MIDAS_HOT_CODEC=gzip:1:av_json MINI_MIDAS_COLD_CODEC=gzip:9:av_json  (defaults)
+    MINI_MIDAS_HOT_CODEC=zlib:1:delta MINI_MIDAS_COLD_CODEC=lzma:6:delta  (smallest and fastest, not gzip)
+
+    write_json(path, json_obj)      # tier from the path
+    read_json(path)                 # alphavantage dict, whatever the file's codec
+    read_bars(path)                 # Bars, skips the dict for row_json and delta files
+"""
+import bz2
+import gzip
+import json
+import lzma
+import os
+import pathlib
+import struct
+import threading
+import zlib
+import numpy as np
+import mini_midas
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+
+MAGIC = b"MMCODEC1"
+GZIP_MAGIC = b"\x1f\x8b"
+# magic, compression id, encoding id, level
+HEADER_FORMAT = "<8sBBb"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+# prices from alphavantage have 4 decimals
+PRICE_SCALE = 10000
+
+TIER_HOT = "hot"
+TIER_COLD = "cold"
+
+BYTES_WRITTEN = mini_midas.metrics.counter(
+    "mini_midas_storage_bytes_written_total", "bytes of data files written", ("tier",))
+
+
+def zstd_compress(data, level):
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def zstd_decompress(data):
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+# name: (id, compress(data, level), decompress(data), default level), ids are written into files, never reuse one
+COMPRESSIONS = {
+    "none": (0, lambda data, level: data, lambda data: data, 0),
+    "gzip": (1, lambda data, level: gzip.compress(data, compresslevel=level, mtime=0), gzip.decompress, 9),
+    "zlib": (2, lambda data, level: zlib.compress(data, level), zlib.decompress, 6),
+    "lzma": (3, lambda data, level: lzma.compress(data, preset=level), lzma.decompress, 6),
+    "bz2": (4, lambda data, level: bz2.compress(data, compresslevel=level), bz2.decompress, 9),
+}
+if zstandard is not None:
+    COMPRESSIONS["zstd"] = (5, zstd_compress, zstd_decompress, 3)
+if lz4 is not None:
+    COMPRESSIONS["lz4"] = (6, lambda data, level: lz4.frame.compress(data, compression_level=level),
+                           lz4.frame.decompress, 0)
+COMPRESSION_NAMES = {spec[0]: name for name, spec in COMPRESSIONS.items()}
+
+
+def encode_av_json(json_obj) -> bytes:
+    return json.dumps(json_obj).encode()
+
+
+def decode_av_json(data) -> dict:
+    return json.loads(data)
+
+
+def encode_row_json(json_obj) -> bytes:
+    bars = mini_midas.series.parse_time_series(json_obj)
+    rows = np.column_stack([bars.minute.astype(np.float64), bars.open, bars.high, bars.low, bars.close,
+                            bars.volume.astype(np.float64)]).tolist()
+    return json.dumps({"meta": json_obj.get("Meta Data", {}), "rows": rows}, separators=(',', ':')).encode()
+
+
+def decode_row_json_bars(data) -> (dict, mini_midas.series.Bars):
+    payload = json.loads(data)
+    rows = np.array(payload["rows"], dtype=np.float64).reshape(-1, len(mini_midas.series.COLUMNS))
+    return payload["meta"], mini_midas.series.Bars(
+        minute=rows[:, 0].astype(np.int64), open=rows[:, 1].copy(), high=rows[:, 2].copy(),
+        low=rows[:, 3].copy(), close=rows[:, 4].copy(), volume=rows[:, 5].astype(np.int64))
+
+
+def encode_delta(json_obj) -> bytes:
+    """
+    meta json length, meta json, bar count, price flag, then each column as raw int64/float64,
+    minutes and scaled prices go in as deltas which are small and repetitive, easy for any compressor
+    """
+    bars = mini_midas.series.parse_time_series(json_obj)
+    meta = json.dumps(json_obj.get("Meta Data", {})).encode()
+    prices = np.stack([bars.open, bars.high, bars.low, bars.close])
+    ticks = np.round(prices * PRICE_SCALE)
+    # a price with more than 4 decimals keeps its exact float
+    scaled = bool(np.all(np.abs(ticks - prices * PRICE_SCALE) < 1e-6))
+    chunks = [struct.pack("<I", len(meta)), meta, struct.pack("<QB", len(bars), scaled),
+              np.diff(bars.minute, prepend=0).astype('<i8').tobytes()]
+    if scaled:
+        chunks.append(np.diff(ticks.astype(np.int64), axis=1, prepend=0).astype('<i8').tobytes())
+    else:
+        chunks.append(prices.astype('<f8').tobytes())
+    chunks.append(bars.volume.astype('<i8').tobytes())
+    return b"".join(chunks)
+
+
+def decode_delta_bars(data) -> (dict, mini_midas.series.Bars):
+    meta_length, = struct.unpack_from("<I", data, 0)
+    offset = 4
+    meta = json.loads(data[offset:offset + meta_length])
+    offset += meta_length
+    count, scaled = struct.unpack_from("<QB", data, offset)
+    offset += struct.calcsize("<QB")
+    minute = np.cumsum(np.frombuffer(data, dtype='<i8', count=count, offset=offset)).astype(np.int64)
+    offset += count * 8
+    if scaled:
+        ticks = np.frombuffer(data, dtype='<i8', count=4 * count, offset=offset).reshape(4, count)
+        prices = np.cumsum(ticks, axis=1) / PRICE_SCALE
+    else:
+        prices = np.frombuffer(data, dtype='<f8', count=4 * count, offset=offset).reshape(4, count)
+    offset += 4 * count * 8
+    volume = np.frombuffer(data, dtype='<i8', count=count, offset=offset).astype(np.int64)
+    return meta, mini_midas.series.Bars(
+        minute=minute, open=prices[0].copy(), high=prices[1].copy(), low=prices[2].copy(),
+        close=prices[3].copy(), volume=volume)
+
+
+def bars_to_av_json(meta, bars) -> dict:
+    return {"Meta Data": meta, mini_midas.series.TIME_SERIES_KEY: bars.to_time_series()}
+
+
+# name: (id, encode(json_obj), decode_bars(data) -> (meta, Bars) or None for av_json)
+ENCODINGS = {
+    "av_json": (0, encode_av_json, None),
+    "row_json": (1, encode_row_json, decode_row_json_bars),
+    "delta": (2, encode_delta, decode_delta_bars),
+}
+ENCODING_NAMES = {spec[0]: name for name, spec in ENCODINGS.items()}
+
+
+class Codec:
+    """
+    one compression at one level with one encoding
+    """
+
+    def __init__(self, compression="gzip", level=None, encoding="av_json"):
+        if compression not in COMPRESSIONS:
+            raise Exception(f"Unknown or not installed compression {compression}, choose from {list(COMPRESSIONS)}")
+        if encoding not in ENCODINGS:
+            raise Exception(f"Unknown encoding {encoding}, choose from {list(ENCODINGS)}")
+        self.compression = compression
+        self.level = COMPRESSIONS[compression][3] if level is None else int(level)
+        self.encoding = encoding
+
+    def __repr__(self):
+        return f"{self.compression}:{self.level}:{self.encoding}"
+
+    @classmethod
+    def parse(cls, spec):
+        """
+        "compression:level:encoding", level and encoding can be left out
+        """
+        parts = spec.split(":")
+        compression = parts[0]
+        level = parts[1] if len(parts) > 1 and parts[1] else None
+        encoding = parts[2] if len(parts) > 2 else "av_json"
+        return cls(compression, level, encoding)
+
+    @property
+    def is_legacy(self) -> bool:
+        return self.compression == "gzip" and self.encoding == "av_json"
+
+    def dumps(self, json_obj) -> bytes:
+        payload = ENCODINGS[self.encoding][1](json_obj)
+        compressed = COMPRESSIONS[self.compression][1](payload, self.level)
+        if self.is_legacy:
+            return compressed
+        header = struct.pack(
+            HEADER_FORMAT, MAGIC, COMPRESSIONS[self.compression][0], ENCODINGS[self.encoding][0], self.level)
+        return header + compressed
+
+
+def sniff(data) -> (str, str, bytes):
+    """
+    returns compression, encoding and the compressed payload of a file's content
+    """
+    if data[:len(MAGIC)] == MAGIC:
+        _, compression_id, encoding_id, _ = struct.unpack_from(HEADER_FORMAT, data, 0)
+        if compression_id not in COMPRESSION_NAMES:
+            raise Exception(f"File compressed with compression id {compression_id} which is not installed")
+        return COMPRESSION_NAMES[compression_id], ENCODING_NAMES[encoding_id], data[HEADER_SIZE:]
+    if data[:len(GZIP_MAGIC)] == GZIP_MAGIC:
+        return "gzip", "av_json", data
+    raise Exception("Unknown storage file format")
+
+
+def decode(data) -> (str, bytes):
+    compression, encoding, payload = sniff(data)
+    return encoding, COMPRESSIONS[compression][2](payload)
+
+
+def loads(data) -> dict:
+    encoding, payload = decode(data)
+    decode_bars = ENCODINGS[encoding][2]
+    if decode_bars is None:
+        return decode_av_json(payload)
+    return bars_to_av_json(*decode_bars(payload))
+
+
+def loads_bars(data) -> mini_midas.series.Bars:
+    encoding, payload = decode(data)
+    decode_bars = ENCODINGS[encoding][2]
+    if decode_bars is None:
+        return mini_midas.series.parse_time_series(decode_av_json(payload))
+    return decode_bars(payload)[1]
+
+
+TIER_CODECS = {
+    TIER_HOT: Codec.parse(os.environ.get("MINI_MIDAS_HOT_CODEC", "gzip:1:av_json")),
+    TIER_COLD: Codec.parse(os.environ.get("MINI_MIDAS_COLD_CODEC", "gzip:9:av_json")),
+}
+
+
+def tier_of_path(path) -> str:
+    if mini_midas.manifest.kind_of_path(path) == mini_midas.manifest.KIND_HISTORICAL:
+        return TIER_COLD
+    return TIER_HOT
+
+
+def write_json(path, json_obj, tier=None):
+    """
+    writes with the codec of the tier, atomically so readers never see half a file
+    """
+    tier = tier or tier_of_path(path)
+    codec = TIER_CODECS[tier]
+    with mini_midas.metrics.stage("storage_write", tier=tier):
+        data = codec.dumps(json_obj)
+        pathlib.Path(os.path.dirname(path)).mkdir(parents=True, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as fil:
+            fil.write(data)
+        os.replace(temp_path, path)
+    BYTES_WRITTEN.inc(len(data), tier=tier)
+
+
+def read_file(path) -> bytes:
+    with open(path, 'rb') as fil:
+        return fil.read()
+
+
+def read_json(path) -> dict:
+    return loads(read_file(path))
+
+
+def read_bars(path) -> mini_midas.series.Bars:
+    return loads_bars(read_file(path)).sorted_unique()
+
+
+def does_file_exist_and_not_empty(path) -> bool:
+    # an empty gzip stream is 20 bytes, same threshold excalibur uses
+    return os.path.exists(path) and os.path.getsize(path) > 20
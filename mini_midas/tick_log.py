@@ -0,0 +1,260 @@
+"""
+append only write ahead log of ticks
+
+every quote the retriever caches is appended to the ticker's log of the day as one fixed size record,
+so a tick costs RECORD_SIZE bytes on disk instead of rewriting the whole day,
+fsync is batched over a number of records or seconds, whichever comes first
+
+a background LogCompactor folds new records into the hourly intraday files and the bar store,
+it remembers how far it got in a small offset file next to the log
+
+    tick_log = TickLog('tsla', '20200409')
+    tick_log.append(minute, open_price, high_price, low_price, close_price, volume)
+"""
+import contextlib
+import os
+import pathlib
+import struct
+import threading
+import time
+import numpy as np
+import excalibur
+import mini_midas
+
+
+LOG_INSTANCE = excalibur.logger.getlogger_debug()
+
+# minute, open, high, low, close, volume
+RECORD_FORMAT = "<qddddq"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+RECORD_DTYPE = np.dtype([
+    ('minute', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'), ('volume', '<i8'),
+])
+LOG_SUFFIX = ".log"
+OFFSET_SUFFIX = ".offset"
+# the compactor thread and the writer's partition rolls both compact, one at a time
+COMPACT_LOCK = threading.Lock()
+
+
+class TickLog:
+    """
+    per ticker per day append only log
+    """
+
+    def __init__(self, ticker, date_str, fsync_every=16, fsync_interval=5.0):
+        self.ticker = ticker
+        self.date_str = date_str
+        self.path = mini_midas.common.get_tick_log_path(ticker, date_str)
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+        pathlib.Path(os.path.dirname(self.path)).mkdir(parents=True, exist_ok=True)
+        # O_APPEND makes every record write land whole at the end, readers never see records interleaved
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.drop_torn_record()
+
+    def drop_torn_record(self):
+        """
+        a crash in the middle of a write can leave a partial record at the end, cut it off
+        """
+        size = os.fstat(self.fd).st_size
+        if size % RECORD_SIZE:
+            LOG_INSTANCE.warning("%s has a torn record at the end, truncating", self.path)
+            os.truncate(self.path, size - size % RECORD_SIZE)
+
+    def append(self, minute, open_price, high_price, low_price, close_price, volume):
+        os.write(self.fd, struct.pack(
+            RECORD_FORMAT, int(minute), open_price, high_price, low_price, close_price, int(volume)))
+        self.unsynced += 1
+        if self.unsynced >= self.fsync_every or time.monotonic() - self.last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        if self.unsynced:
+            os.fsync(self.fd)
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        if self.fd is None:
+            return
+        self.sync()
+        os.close(self.fd)
+        self.fd = None
+
+
+def read_records(path, offset=0) -> (mini_midas.series.Bars, int):
+    """
+    reads whole records after offset, returns bars in log order and the offset after the last whole record
+    """
+    if not os.path.exists(path):
+        return mini_midas.series.Bars(), offset
+    with open(path, 'rb') as fil:
+        fil.seek(offset)
+        data = fil.read()
+    whole_size = len(data) - len(data) % RECORD_SIZE
+    records = np.frombuffer(data[:whole_size], dtype=RECORD_DTYPE)
+    bars = mini_midas.series.Bars(**{name: records[name].copy() for name in mini_midas.series.COLUMNS})
+    return bars, offset + whole_size
+
+
+def recover(ticker, date_str) -> mini_midas.series.Bars:
+    """
+    returns the day of a ticker rebuilt from what was compacted into the bar store plus the whole log,
+    empty if there was no log for that day
+    """
+    logged, _ = read_records(mini_midas.common.get_tick_log_path(ticker, date_str))
+    if not len(logged):
+        return logged
+    stored, stored_sources = mini_midas.bar_store.read_day_with_sources(ticker, date_str)
+    bars, _, _ = mini_midas.merge.merge_runs(
+        [(stored, stored_sources), (logged.sorted_unique(), mini_midas.merge.SOURCE_SYNTHESIZED)])
+    return bars
+
+
+def read_offset(path) -> int:
+    offset_path = f"{path}{OFFSET_SUFFIX}"
+    if not os.path.exists(offset_path):
+        return 0
+    with open(offset_path, 'r') as fil:
+        return int(fil.read().strip() or 0)
+
+
+def write_offset(path, offset):
+    offset_path = f"{path}{OFFSET_SUFFIX}"
+    temp_path = f"{offset_path}.tmp"
+    with open(temp_path, 'w') as fil:
+        fil.write(str(offset))
+    os.replace(temp_path, offset_path)
+
+
+def fold_into_hour_file(ticker, date_str, hour, bars):
+    """
+    merges bars into the hourly intraday file, the logged bar wins on the same minute,
+    hour files only hold ticks, official bars have their own partition
+    """
+    file_path = mini_midas.common.get_intraday_file_path(ticker, date_str, hour)
+    pathlib.Path(os.path.dirname(file_path)).mkdir(parents=True, exist_ok=True)
+    json_obj = {"Meta Data": {"2. Symbol": ticker}, "Time Series (1min)": {}}
+    if mini_midas.storage_codec.does_file_exist_and_not_empty(file_path):
+        json_obj = mini_midas.storage_codec.read_json(file_path)
+    stored = mini_midas.series.parse_time_series(json_obj)
+    merged, _, _ = mini_midas.merge.merge_runs(
+        [(stored, mini_midas.merge.SOURCE_SYNTHESIZED), (bars, mini_midas.merge.SOURCE_SYNTHESIZED)])
+    json_obj["Time Series (1min)"] = merged.to_time_series()
+    mini_midas.storage_codec.write_json(file_path, json_obj, mini_midas.storage_codec.TIER_HOT)
+    mini_midas.manifest.record_file(ticker, file_path, merged, mini_midas.manifest.KIND_INTRADAY)
+
+
+def fold_into_official_file(ticker, date_str, bars, meta_data=None) -> mini_midas.series.Bars:
+    """
+    merges official bars into the day's official intraday partition, returns everything it holds now
+    """
+    file_path = mini_midas.common.get_official_file_path(ticker, date_str)
+    stored = mini_midas.series.Bars()
+    if mini_midas.storage_codec.does_file_exist_and_not_empty(file_path):
+        stored = mini_midas.storage_codec.read_bars(file_path)
+    merged, _, _ = mini_midas.merge.merge_runs(
+        [(stored, mini_midas.merge.SOURCE_OFFICIAL), (bars.sorted_unique(), mini_midas.merge.SOURCE_OFFICIAL)])
+    json_obj = {"Meta Data": meta_data or {"2. Symbol": ticker}, "Time Series (1min)": merged.to_time_series()}
+    mini_midas.storage_codec.write_json(file_path, json_obj, mini_midas.storage_codec.TIER_HOT)
+    mini_midas.manifest.record_file(ticker, file_path, merged, mini_midas.manifest.KIND_INTRADAY)
+    return merged
+
+
+@contextlib.contextmanager
+def locked(ticker):
+    """
+    one flock per ticker for all its logs, a lock file per ticker-day would pile up in the log directory
+    """
+    with mini_midas.manifest.locked(f"{mini_midas.common.get_tick_log_storage_path()}/{ticker}"):
+        yield
+
+
+def compact_log(ticker, date_str) -> int:
+    """
+    folds records appended since the last compaction into the hourly files and the bar store,
+    returns number of records folded
+    """
+    path = mini_midas.common.get_tick_log_path(ticker, date_str)
+    # end of day consolidation compacts from its worker processes, the flock keeps them apart from the collector's
+    with COMPACT_LOCK, locked(ticker):
+        offset = read_offset(path)
+        bars, new_offset = read_records(path, offset)
+        if not len(bars):
+            return 0
+
+        bars = bars.sorted_unique()
+        hours = (bars.minute // 60) % 24
+        for hour in np.unique(hours):
+            fold_into_hour_file(ticker, date_str, hour, bars.take(hours == hour))
+        mini_midas.bar_store.merge_bars(ticker, bars, mini_midas.merge.SOURCE_SYNTHESIZED)
+        # offset is only moved after the data is folded, a crash in between just folds the same records again
+        write_offset(path, new_offset)
+        return len(bars)
+
+
+def list_logs(tickers=None) -> list:
+    """
+    returns [(ticker, date_str)] of every log on disk, optionally only for the given tickers
+    """
+    log_storage_path = mini_midas.common.get_tick_log_storage_path()
+    if not os.path.isdir(log_storage_path):
+        return []
+    logs = []
+    for file_name in sorted(os.listdir(log_storage_path)):
+        if not file_name.endswith(LOG_SUFFIX):
+            continue
+        ticker, date_str = file_name[:-len(LOG_SUFFIX)].rsplit(".", 1)
+        if tickers is None or ticker in tickers:
+            logs.append((ticker, date_str))
+    return logs
+
+
+class LogCompactor(threading.Thread):
+    """
+    background thread compacting tick logs every `interval` seconds,
+    logs of past days are removed once they are fully compacted
+    """
+
+    def __init__(self, tickers=None, interval=60.0):
+        super().__init__(daemon=True)
+        self.tickers = set(tickers) if tickers is not None else None
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def compact(self):
+        today, _ = mini_midas.common.split_date_string()
+        for ticker, date_str in list_logs(self.tickers):
+            try:
+                with mini_midas.metrics.stage("tick_log_compact"):
+                    compact_log(ticker, date_str)
+                if date_str < today:
+                    self.remove_compacted_log(ticker, date_str)
+            except Exception as e:
+                LOG_INSTANCE.critical("Unable to compact %s %s tick log, error: %s", ticker, date_str, str(e))
+
+    @staticmethod
+    def remove_compacted_log(ticker, date_str) -> bool:
+        """
+        under compact_log's locks, so no compaction reads the log or its offset while they go
+        """
+        path = mini_midas.common.get_tick_log_path(ticker, date_str)
+        with COMPACT_LOCK, locked(ticker):
+            if not os.path.exists(path) or read_offset(path) != os.path.getsize(path):
+                return False
+            os.remove(path)
+            if os.path.exists(f"{path}{OFFSET_SUFFIX}"):
+                os.remove(f"{path}{OFFSET_SUFFIX}")
+            return True
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.compact()
+        # one last pass so nothing logged before stop is left behind
+        self.compact()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
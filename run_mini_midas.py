@@ -1,35 +1,148 @@
 #!/usr/bin/env python3
 """
 starter for mini_midas
+
+every action imports only the submodules it needs, get_intraday_data never loads matplotlib
+
+    ./run_mini_midas.py get_intraday_data tsla,msft
+    ./run_mini_midas.py backfill tsla,aapl 20200101 20200630
+    ./run_mini_midas.py consolidate tsla,aapl 20200409
+    ./run_mini_midas.py analytics dal,aal,ual 20200401 20200430 --window 120
+    ./run_mini_midas.py render tsla,aapl 20200406 20200409 --format svg
+    ./run_mini_midas.py replay tsla,aapl 20200406 20200409 --speed 100 --plot
+    ./run_mini_midas.py plot
 """
 
+import argparse
 import sys
 import mini_midas
 
 
-ACTION_TYPE = sys.argv[1]  # either "data" or "plot", data will keep obtaining data, while plot will draw the plot
-if len(sys.argv) > 2:
-    TICKER_LIST = sys.argv[2].split(",")  # ticker_list: "tsla,msft", separate the ticker by comma
-else:
-    TICKER_LIST = [
-        'dal', 'aal', 'ual', 'tsla', 'amzn', 'aapl', 'msft',
-        'nvda', 'intc', 'googl', 'cost', 'iau', 'gld', 'gm', 'amd']
-
-
-if ACTION_TYPE.lower() == "get_historical_data":
-    mini_midas.stock_utilities.secure_ticker_prices(TICKER_LIST)
-elif ACTION_TYPE.lower() == "plot":
-    mini_midas.plot.plot_tickers(TICKER_LIST)
-    # for tic in TICKER_LIST:
-    #     mini_midas.plot.Plotter(tic).run()
-    #     # TODO: try to plot all tickers
-    #     break
-
-elif ACTION_TYPE.lower() == "get_intraday_data":
-    mini_midas.stock_utilities.start_monitoring_tickers(TICKER_LIST)
-    # for tic in TICKER_LIST:
-    #     alpha = mini_midas.stock_utilities.AlphaVantageTickerIntraPriceRetriever(tic)
-    #     alpha.run()
-    #     break
-else:
-    print(f"ACTION_TYPE not correct {ACTION_TYPE}, not doing anything")
+DEFAULT_TICKERS = [
+    'dal', 'aal', 'ual', 'tsla', 'amzn', 'aapl', 'msft',
+    'nvda', 'intc', 'googl', 'cost', 'iau', 'gld', 'gm', 'amd']
+
+
+def get_historical_data(args):
+    mini_midas.stock_utilities.secure_ticker_prices(args.tickers)
+
+
+def backfill(args):
+    mini_midas.backfill.backfill(args.tickers, args.start_date, args.end_date)
+
+
+def consolidate(args):
+    # one historical file per ticker-day, the hourly fragments are removed
+    results = mini_midas.consolidate.consolidate(args.tickers, args.date, max_workers=args.workers)
+    for ticker, result in sorted(results.items()):
+        print(ticker, result)
+
+
+def analytics(args):
+    # the default ticker list is compared within its groups of related names
+    groups = mini_midas.analytics.GROUPS if args.tickers is DEFAULT_TICKERS else {"tickers": args.tickers}
+    summary = mini_midas.analytics.analyze_groups(args.start_date, args.end_date, groups, window=args.window)
+    for group, pairs in summary.items():
+        for pair, stats in pairs.items():
+            print(f"{group:<10}{pair:<12}correlation {stats['correlation']:>7.3f}  zscore {stats['zscore']:>7.3f}")
+
+
+def render(args):
+    # chart images without a display, charts whose bars didn't change are skipped
+    statuses = mini_midas.render.render_charts(
+        args.tickers, args.start_date, args.end_date, output=args.output, image_format=args.format,
+        max_workers=args.workers, force=args.force)
+    for ticker, status in sorted(statuses.items()):
+        print(ticker, status)
+
+
+def plot(args):
+    mini_midas.plot.plot_tickers(args.tickers)
+
+
+def dashboard(args):
+    # all tickers in one window
+    mini_midas.plot.plot_dashboard(args.tickers)
+
+
+def get_intraday_data(args):
+    mini_midas.stock_utilities.start_monitoring_tickers(args.tickers)
+
+
+def migrate_bar_store(args):
+    # converts every saved gzip json file into the columnar bar store
+    mini_midas.bar_store.migrate_tree()
+
+
+def replay(args):
+    # stored days through the live pipeline on a simulated clock, writes under --output
+    stats = mini_midas.replay.replay(
+        args.tickers, args.start_date, args.end_date, speed=args.speed, max_workers=args.workers,
+        output=args.output, plot=args.plot)
+    print(stats)
+
+
+def replay_speed(value):
+    # "max" runs as fast as the pipeline goes
+    return None if value == "max" else float(value)
+
+
+def ticker_list(value) -> list:
+    # ticker_list: "tsla,msft", separate the ticker by comma
+    return value.split(",")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="mini_midas data collection and plotting")
+    actions = parser.add_subparsers(dest="action", metavar="action")
+    actions.required = True
+
+    def add_action(name, func, help_text):
+        action = actions.add_parser(name, help=help_text)
+        action.add_argument("tickers", nargs="?", type=ticker_list, default=DEFAULT_TICKERS)
+        action.set_defaults(func=func)
+        return action
+
+    add_action("get_historical_data", get_historical_data, "save today's full session once the market closed")
+    add_action("get_intraday_data", get_intraday_data, "keep polling minute prices while the market is open")
+    add_action("plot", plot, "one live plot window per ticker")
+    add_action("dashboard", dashboard, "every ticker in one live window")
+    add_action("migrate_bar_store", migrate_bar_store, "convert saved gzip json files into the bar store")
+    backfill_action = add_action("backfill", backfill, "pull past months of minute bars")
+    backfill_action.add_argument("start_date", help="%%Y%%m%%d")
+    backfill_action.add_argument("end_date", help="%%Y%%m%%d")
+    consolidate_action = add_action("consolidate", consolidate, "merge a closed day's files into one file per ticker")
+    consolidate_action.add_argument("date", nargs="?", default=None, help="%%Y%%m%%d, the last closed session by default")
+    consolidate_action.add_argument("--workers", type=int, default=None)
+    analytics_action = add_action("analytics", analytics, "rolling correlations and spread z-scores of related tickers")
+    analytics_action.add_argument("start_date", help="%%Y%%m%%d")
+    analytics_action.add_argument("end_date", help="%%Y%%m%%d")
+    analytics_action.add_argument("--window", type=int, default=60, help="minutes")
+    render_action = add_action("render", render, "chart image files of a date range, no display needed")
+    render_action.add_argument("start_date", help="%%Y%%m%%d")
+    render_action.add_argument("end_date", help="%%Y%%m%%d")
+    render_action.add_argument("--format", choices=("png", "svg"), default="png")
+    render_action.add_argument("--workers", type=int, default=None)
+    render_action.add_argument("--output", default=None, help="directory, defaults to ~/data/stock_historical_data/charts")
+    render_action.add_argument("--force", action="store_true", help="render charts even when their bars didn't change")
+    replay_action = add_action("replay", replay, "replay stored days through the pipeline")
+    replay_action.add_argument("start_date", help="%%Y%%m%%d")
+    replay_action.add_argument("end_date", help="%%Y%%m%%d")
+    replay_action.add_argument("--speed", type=replay_speed, default=None, help="1, 100, ... or max (default)")
+    replay_action.add_argument("--workers", type=int, default=8)
+    replay_action.add_argument("--output", default=None, help="data root written to, defaults to ~/data/stock_replay_data")
+    replay_action.add_argument("--plot", action="store_true", help="dashboard of the replayed tickers")
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        # actions used to be matched case insensitively
+        argv = [argv[0].lower()] + argv[1:]
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
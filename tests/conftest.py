@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+import mini_midas
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    """
+    every file a test writes goes under its own tmp_path instead of ~/data
+    """
+    monkeypatch.setattr(mini_midas.common, "DATA_STORAGE_PATH", str(tmp_path))
+    return tmp_path
+
+
+def make_bars(minutes, close=None, volume=100) -> mini_midas.series.Bars:
+    """
+    bars with open = high = low = close, close defaults to the minute so a bar tells where it came from
+    """
+    minutes = np.asarray(minutes, dtype=np.int64)
+    close = minutes.astype(np.float64) if close is None else np.broadcast_to(
+        np.asarray(close, dtype=np.float64), minutes.shape).copy()
+    return mini_midas.series.Bars(
+        minute=minutes, open=close.copy(), high=close.copy(), low=close.copy(), close=close,
+        volume=np.full(len(minutes), volume, dtype=np.int64))
+
+
+@pytest.fixture
+def bars_of():
+    return make_bars
@@ -0,0 +1,149 @@
+import numpy as np
+import pytest
+import mini_midas
+
+
+analytics = mini_midas.analytics
+# a thursday and a friday, both full sessions
+FIRST_DATE = "20261015"
+LAST_DATE = "20261016"
+
+
+def test_window_sums():
+    x = np.arange(1.0, 7.0)
+    assert analytics.window_sums(x, 3).tolist() == [1.0, 3.0, 6.0, 9.0, 12.0, 15.0]
+    assert analytics.window_sums(x, 100).tolist() == np.cumsum(x).tolist()
+    assert len(analytics.window_sums(np.empty(0), 3)) == 0
+
+    # columns are summed on their own
+    matrix = np.random.default_rng(2).random((50, 3))
+    sums = analytics.window_sums(matrix, 7)
+    for row in range(len(matrix)):
+        assert np.allclose(sums[row], matrix[max(row - 6, 0):row + 1].sum(axis=0))
+
+
+def test_forward_fill():
+    values = np.array([[np.nan, 1.0], [2.0, np.nan], [np.nan, np.nan], [3.0, 4.0]])
+    observed = ~np.isnan(values)
+    filled = analytics.forward_fill(values, observed)
+    assert np.array_equal(filled, np.array([[np.nan, 1.0], [2.0, 1.0], [2.0, 1.0], [3.0, 4.0]]), equal_nan=True)
+
+
+def test_rolling_mean_std():
+    rng = np.random.default_rng(4)
+    x = rng.normal(100.0, 1.0, (80, 2))
+    mask = rng.random(x.shape) > 0.2
+    mean, std = analytics.rolling_mean_std(x, mask, 10)
+    for row in range(len(x)):
+        for column in range(x.shape[1]):
+            valid = x[max(row - 9, 0):row + 1, column][mask[max(row - 9, 0):row + 1, column]]
+            if len(valid) < 2:
+                assert np.isnan(mean[row, column]) and np.isnan(std[row, column])
+                continue
+            assert mean[row, column] == pytest.approx(valid.mean())
+            assert std[row, column] == pytest.approx(valid.std(ddof=1))
+
+
+def test_rolling_correlation_matches_corrcoef():
+    rng = np.random.default_rng(6)
+    common = rng.normal(size=(200, 1))
+    returns = common + rng.normal(size=(200, 3)) * np.array([0.5, 1.0, 2.0])
+    mask = np.ones(returns.shape, dtype=bool)
+    window, every = 50, 30
+
+    ends, correlations = analytics.rolling_correlation(returns, mask, window, every)
+    # windows counted back from the last row, none shorter than the window
+    assert ends.tolist() == list(range(199, 48, -30))[::-1]
+    for end, correlation in zip(ends, correlations):
+        expected = np.corrcoef(returns[end - window + 1:end + 1].T)
+        assert np.allclose(correlation, expected)
+
+
+def test_rolling_correlation_uses_rows_valid_in_both():
+    rng = np.random.default_rng(8)
+    returns = rng.normal(size=(120, 3))
+    mask = rng.random(returns.shape) > 0.3
+    ends, correlations = analytics.rolling_correlation(returns, mask, 40, every=20)
+    for end, correlation in zip(ends, correlations):
+        window = slice(end - 39, end + 1)
+        for i in range(3):
+            for j in range(3):
+                both = mask[window, i] & mask[window, j]
+                expected = np.corrcoef(returns[window, i][both], returns[window, j][both])[0, 1]
+                assert correlation[i, j] == pytest.approx(expected)
+
+
+def test_rolling_correlation_short_input():
+    ends, correlations = analytics.rolling_correlation(np.empty((0, 2)), np.empty((0, 2), dtype=bool), 10)
+    assert len(ends) == 0 and correlations.shape == (0, 2, 2)
+
+    # fewer rows than the window, one window over all of them
+    returns = np.random.default_rng(1).normal(size=(5, 2))
+    ends, correlations = analytics.rolling_correlation(returns, np.ones((5, 2), dtype=bool), 10)
+    assert ends.tolist() == [4]
+    assert np.allclose(correlations[0], np.corrcoef(returns.T))
+
+    # a column with a single valid row has no correlation
+    mask = np.ones((5, 2), dtype=bool)
+    mask[1:, 1] = False
+    _, correlations = analytics.rolling_correlation(returns, mask, 10)
+    assert np.isnan(correlations[0, 0, 1])
+    assert correlations[0, 0, 0] == pytest.approx(1.0)
+
+
+def test_session_grid():
+    grid = analytics.session_grid(FIRST_DATE, LAST_DATE)
+    assert len(grid) == 2 * 390
+    first_open, _ = mini_midas.gaps.session_minutes(FIRST_DATE)
+    last_open, last_close = mini_midas.gaps.session_minutes(LAST_DATE)
+    assert grid[0] == first_open
+    assert grid[390] == last_open
+    assert grid[-1] == last_close - 1
+    # a weekend has no sessions
+    assert len(analytics.session_grid("20261017", "20261018")) == 0
+
+
+def test_align_and_returns(storage, bars_of):
+    first_open, _ = mini_midas.gaps.session_minutes(FIRST_DATE)
+    last_open, _ = mini_midas.gaps.session_minutes(LAST_DATE)
+    bars = bars_of([first_open - 30, first_open, first_open + 2, last_open], close=[5.0, 10.0, 20.0, 40.0])
+    mini_midas.bar_store.merge_bars("dal", bars, mini_midas.merge.SOURCE_OFFICIAL)
+    mini_midas.bar_store.merge_bars("aal", bars_of([first_open + 1], close=7.0), mini_midas.merge.SOURCE_OFFICIAL)
+
+    matrix = analytics.align(["dal", "aal", "ual"], FIRST_DATE, LAST_DATE)
+    assert matrix.shape == (780, 3)
+    dal = matrix.column("dal")
+    # the pre market bar is off the grid, minutes without a bar carry the last close
+    assert dal[:4].tolist() == [10.0, 10.0, 20.0, 20.0]
+    assert dal[389] == 20.0 and dal[390] == 40.0
+    assert matrix.observed[:, 0].sum() == 3
+    assert np.isnan(matrix.column("aal")[0]) and matrix.column("aal")[1] == 7.0
+    assert not matrix.valid[:, 2].any()
+    assert matrix.day_starts().nonzero()[0].tolist() == [0, 390]
+
+    returns, mask = matrix.returns()
+    assert returns[2, 0] == pytest.approx(np.log(2.0))
+    assert mask[1, 0] and mask[2, 0]
+    # the first minute of the friday reaches back into thursday
+    assert not mask[390, 0] and returns[390, 0] == 0.0
+    returns, mask = matrix.returns(overnight=True)
+    assert mask[390, 0] and returns[390, 0] == pytest.approx(np.log(2.0))
+    # nothing before aal's first bar
+    assert not mask[:2, 1].any()
+
+
+def test_pair_spreads(storage, bars_of):
+    first_open, _ = mini_midas.gaps.session_minutes(FIRST_DATE)
+    minutes = first_open + np.arange(60)
+    prices = np.exp(np.random.default_rng(3).normal(0.0, 0.01, 60).cumsum()) * 10.0
+    mini_midas.bar_store.merge_bars("dal", bars_of(minutes, close=prices * 2.0), mini_midas.merge.SOURCE_OFFICIAL)
+    mini_midas.bar_store.merge_bars("aal", bars_of(minutes, close=prices), mini_midas.merge.SOURCE_OFFICIAL)
+
+    matrix = analytics.align(["dal", "aal"], FIRST_DATE, FIRST_DATE)
+    spreads = analytics.pair_spreads(matrix, [("dal", "aal")], window=20)
+    # a constant spread of log 2 all through the hour
+    assert np.allclose(spreads["spread"][:60, 0], np.log(2.0))
+
+    hedged = analytics.pair_spreads(matrix, [("dal", "aal")], window=20, hedge=True)
+    assert np.isnan(hedged["beta"][0, 0])
+    assert np.allclose(hedged["beta"][20:60, 0], 1.0)
@@ -0,0 +1,95 @@
+import datetime
+import types
+import numpy as np
+import pytest
+import mini_midas
+
+
+backfill = mini_midas.backfill
+
+
+@pytest.fixture
+def engine(storage, monkeypatch):
+    """
+    a sunday in october, september is finished, october is still being traded
+    """
+    now = datetime.datetime(2026, 10, 18, 12, 0, tzinfo=mini_midas.market_calendar.EASTERN)
+    monkeypatch.setattr(mini_midas.market_calendar, "CLOCK", types.SimpleNamespace(now=lambda: now))
+    monkeypatch.setattr(backfill.time, "sleep", lambda seconds: None)
+    return backfill.BackfillEngine(["tsla"], "20260901", "20260915", token="test", max_workers=1)
+
+
+def session_bars(bars_of, date_str):
+    session_open, session_close = mini_midas.gaps.session_minutes(date_str)
+    return bars_of(np.arange(session_open, session_close))
+
+
+def month_payload(bars_of, dates):
+    bars = mini_midas.series.concat([session_bars(bars_of, date_str) for date_str in dates])
+    return {mini_midas.series.TIME_SERIES_KEY: bars.to_time_series()}
+
+
+def test_months_between():
+    assert backfill.months_between("20251115", "20260210") == ["2025-11", "2025-12", "2026-01", "2026-02"]
+    assert backfill.months_between("20260105", "20260105") == ["2026-01"]
+
+
+def test_trading_days(engine):
+    days = [day.strftime("%Y%m%d") for day, _, _ in engine.trading_days("2026-09")]
+    # labor day is a holiday
+    assert days[:3] == ["20260901", "20260902", "20260903"]
+    assert "20260907" not in days
+    assert days[-1] == "20260915"
+    assert len(engine.trading_days("2026-09", whole_month=True)) == 21
+
+
+def test_stored_range_is_skipped_but_only_a_whole_month_is_checkpointed(engine, bars_of):
+    in_range = [day.strftime("%Y%m%d") for day, _, _ in engine.trading_days("2026-09")]
+    for date_str in in_range:
+        mini_midas.bar_store.merge_bars("tsla", session_bars(bars_of, date_str))
+    assert not engine.needs_fetch("tsla", "2026-09")
+    assert not engine.manifest.is_done("tsla", "2026-09")
+
+    for day, _, _ in engine.trading_days("2026-09", whole_month=True):
+        mini_midas.bar_store.merge_bars("tsla", session_bars(bars_of, day.strftime("%Y%m%d")))
+    assert not engine.needs_fetch("tsla", "2026-09")
+    assert engine.manifest.is_done("tsla", "2026-09")
+    # a new run reads the checkpoint
+    assert backfill.BackfillManifest().is_done("tsla", "2026-09")
+
+
+def test_partial_day_is_fetched(engine, bars_of):
+    for day, _, _ in engine.trading_days("2026-09"):
+        bars = session_bars(bars_of, day.strftime("%Y%m%d"))
+        mini_midas.bar_store.merge_bars("tsla", bars.take(slice(0, len(bars) // 2)))
+    assert engine.needs_fetch("tsla", "2026-09")
+    assert engine.jobs() == [("tsla", "2026-09")]
+
+
+def test_the_whole_pulled_month_is_stored(engine, bars_of, monkeypatch):
+    dates = ["20260901", "20260930"]
+    monkeypatch.setattr(engine, "fetch_month", lambda ticker, month: month_payload(bars_of, dates))
+    assert engine.backfill_month(("tsla", "2026-09"))
+
+    # the 30th is outside the range, the call paid for it
+    assert mini_midas.bar_store.list_dates("tsla") == dates
+    assert engine.manifest.is_done("tsla", "2026-09")
+    assert engine.stats["bars"] == 2 * 390
+
+
+def test_current_month_is_never_checkpointed(engine, bars_of, monkeypatch):
+    monkeypatch.setattr(engine, "fetch_month", lambda ticker, month: month_payload(bars_of, ["20261016"]))
+    assert engine.backfill_month(("tsla", "2026-10"))
+    assert not engine.manifest.is_done("tsla", "2026-10")
+
+
+def test_throttles_are_retried_and_rejections_are_not(engine, bars_of, monkeypatch):
+    answers = [{"Note": "slow down"}, {"Information": "slow down"}, month_payload(bars_of, ["20260901"])]
+    monkeypatch.setattr(engine, "fetch_month", lambda ticker, month: answers.pop(0))
+    assert engine.backfill_month(("tsla", "2026-09"))
+    assert engine.stats["throttled"] == 2
+
+    monkeypatch.setattr(engine, "fetch_month", lambda ticker, month: {"Error Message": "invalid symbol"})
+    assert not engine.backfill_month(("bogus", "2026-09"))
+    assert engine.stats["failed"] == 1
+    assert not engine.manifest.is_done("bogus", "2026-09")
@@ -0,0 +1,130 @@
+import os
+import struct
+import threading
+import numpy as np
+import pytest
+import mini_midas
+
+
+bar_store = mini_midas.bar_store
+DATE_STR = "20261015"
+# 09:30 of DATE_STR
+OPEN_MINUTE = mini_midas.series.date_string_to_minute(DATE_STR) + 9 * 60 + 30
+
+
+def day_bars(bars_of, date_str, offsets, close=None):
+    start = mini_midas.series.date_string_to_minute(date_str) + 9 * 60 + 30
+    return bars_of(start + np.asarray(offsets, dtype=np.int64), close)
+
+
+def test_file_round_trip(storage, bars_of):
+    bars = bars_of(OPEN_MINUTE + np.arange(5), close=np.linspace(1.0, 2.0, 5), volume=7)
+    bars.high[:] += 0.5
+    bars.low[:] -= 0.5
+    path = bar_store.get_day_file_path("tsla", DATE_STR)
+    bar_store.write_file(path, bars)
+
+    assert bar_store.read_header(path) == 5
+    read = bar_store.read_file(path)
+    for name in mini_midas.series.COLUMNS:
+        column = getattr(read, name)
+        assert column.dtype == mini_midas.series.COLUMN_DTYPES[name]
+        assert column.tolist() == getattr(bars, name).tolist()
+    # mapped read only, nothing can write through a reader
+    assert not read.close.flags.writeable
+
+    bar_store.write_file(path, mini_midas.series.Bars())
+    assert len(bar_store.read_file(path)) == 0
+
+
+def test_not_a_bar_file(storage):
+    path = storage / "tsla.bars"
+    path.write_bytes(b"NOTBARS!" + bytes(56))
+    with pytest.raises(Exception, match="not a bar store file"):
+        bar_store.read_header(str(path))
+
+
+def test_read_range_spans_days(storage, bars_of):
+    for date_str in ("20261014", "20261015", "20261016"):
+        bar_store.merge_bars("tsla", day_bars(bars_of, date_str, [0, 1]))
+
+    assert bar_store.list_dates("tsla") == ["20261014", "20261015", "20261016"]
+    assert bar_store.list_dates("aapl") == []
+    bars = bar_store.read_range("tsla", "20261015", "20261016")
+    assert len(bars) == 4
+    assert bars.minute.tolist() == sorted(bars.minute.tolist())
+    assert len(bar_store.read_range("tsla", "20261017", "20261020")) == 0
+
+
+def test_merge_splits_bars_into_their_days(storage, bars_of):
+    bars = mini_midas.series.concat([day_bars(bars_of, "20261016", [1, 0]), day_bars(bars_of, "20261015", [0])])
+    bar_store.merge_bars("tsla", bars)
+    assert len(bar_store.read_day("tsla", "20261015")) == 1
+    assert bar_store.read_day("tsla", "20261016").minute.tolist() == day_bars(bars_of, "20261016", [0, 1]).minute.tolist()
+    # the manifest knows both files
+    assert len(mini_midas.manifest.files_for_dates("tsla", "20261015", "20261016")) == 2
+
+
+def test_migrate_tree(storage, bars_of):
+    hour_bars = day_bars(bars_of, DATE_STR, [0, 1], close=1.0)
+    historical_bars = day_bars(bars_of, DATE_STR, [1, 2], close=2.0)
+    for path, bars in ((mini_midas.common.get_intraday_file_path("tsla", DATE_STR, 9), hour_bars),
+                       (mini_midas.common.get_historical_file_path("tsla", DATE_STR), historical_bars)):
+        mini_midas.storage_codec.write_json(path, {mini_midas.series.TIME_SERIES_KEY: bars.to_time_series()})
+
+    assert bar_store.migrate_tree() == 2
+    bars = bar_store.read_day("tsla", DATE_STR)
+    assert bars.minute.tolist() == day_bars(bars_of, DATE_STR, [0, 1, 2]).minute.tolist()
+    # the full day pull wins the minute both have
+    assert bars.close.tolist() == [1.0, 2.0, 2.0]
+
+
+def test_concurrent_merges_keep_every_bar(storage, bars_of):
+    """
+    the writer thread and the scheduler workers merge into the same day file at once
+    """
+    thread_count, rounds = 8, 20
+
+    def merge(thread_index):
+        for round_index in range(rounds):
+            minute = OPEN_MINUTE + round_index * thread_count + thread_index
+            bar_store.merge_bars("tsla", bars_of([minute]), mini_midas.merge.SOURCE_SYNTHESIZED)
+
+    threads = [threading.Thread(target=merge, args=(index,)) for index in range(thread_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    bars = bar_store.read_day("tsla", DATE_STR)
+    assert bars.minute.tolist() == (OPEN_MINUTE + np.arange(thread_count * rounds)).tolist()
+    assert not [name for name in storage.rglob("*.tmp")]
+
+
+def test_sources_are_stored_per_bar(storage, bars_of):
+    bar_store.merge_bars("tsla", bars_of(OPEN_MINUTE + np.arange(3), close=10.0), mini_midas.merge.SOURCE_OFFICIAL)
+    bar_store.merge_bars("tsla", bars_of(OPEN_MINUTE + np.arange(1, 5), close=20.0), mini_midas.merge.SOURCE_SYNTHESIZED)
+
+    bars, sources = bar_store.read_day_with_sources("tsla", DATE_STR)
+    assert bars.close.tolist() == [10.0, 10.0, 10.0, 20.0, 20.0]
+    assert sources.tolist() == [mini_midas.merge.SOURCE_OFFICIAL] * 3 + [mini_midas.merge.SOURCE_SYNTHESIZED] * 2
+    # reading the bars alone ignores the column after volume
+    assert bar_store.read_day("tsla", DATE_STR).volume.tolist() == [100] * 5
+    assert len(bar_store.read_day_with_sources("tsla", "20261014")[1]) == 0
+
+
+def test_version_1_files_read_as_unknown(storage, bars_of):
+    bars = bars_of(OPEN_MINUTE + np.arange(3))
+    path = bar_store.get_day_file_path("tsla", DATE_STR)
+    os.makedirs(os.path.dirname(path))
+    with open(path, 'wb') as fil:
+        fil.write(struct.pack(bar_store.HEADER_FORMAT, bar_store.MAGIC_V1, len(bars)).ljust(bar_store.HEADER_SIZE, b"\0"))
+        for name in mini_midas.series.COLUMNS:
+            fil.write(getattr(bars, name).astype(mini_midas.series.COLUMN_DTYPES[name]).tobytes())
+
+    assert bar_store.read_file(path).minute.tolist() == bars.minute.tolist()
+    assert bar_store.read_sources(path).tolist() == [mini_midas.merge.SOURCE_UNKNOWN] * 3
+    # merging into it upgrades the file
+    bar_store.merge_bars("tsla", bars_of([OPEN_MINUTE + 3]), mini_midas.merge.SOURCE_SYNTHESIZED)
+    assert bar_store.read_magic_and_count(path) == (bar_store.MAGIC, 4)
+    assert bar_store.read_sources(path).tolist()[-1] == mini_midas.merge.SOURCE_SYNTHESIZED
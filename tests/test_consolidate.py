@@ -0,0 +1,99 @@
+import os
+import numpy as np
+import mini_midas
+
+
+consolidate = mini_midas.consolidate
+DATE_STR = "20261016"
+
+
+def session_minutes():
+    session_open, session_close = mini_midas.gaps.session_minutes(DATE_STR)
+    return np.arange(session_open, session_close)
+
+
+def store_ticks(bars_of, minutes, close=None):
+    bars = bars_of(minutes, close)
+    hours = (bars.minute // 60) % 24
+    for hour in np.unique(hours):
+        mini_midas.tick_log.fold_into_hour_file("tsla", DATE_STR, hour, bars.take(hours == hour))
+
+
+def run(storage, min_coverage=consolidate.MIN_COVERAGE):
+    return consolidate.consolidate_ticker("tsla", DATE_STR, str(storage), min_coverage)
+
+
+def test_full_day_replaces_its_fragments(storage, bars_of):
+    minutes = session_minutes()
+    store_ticks(bars_of, minutes, close=1.0)
+    # the official pull covers the morning
+    mini_midas.tick_log.fold_into_official_file("tsla", DATE_STR, bars_of(minutes[:60], close=2.0))
+    fragments = consolidate.find_fragments("tsla", DATE_STR)
+    assert len(fragments) == 8
+
+    result = run(storage)
+    assert result["valid"]
+    assert (result["bars"], result["in_session"], result["expected"]) == (390, 390, 390)
+    assert result["pruned"] == 8
+    assert not any(os.path.exists(path) for path in fragments)
+    assert consolidate.find_fragments("tsla", DATE_STR) == []
+    assert not os.path.exists(f"{storage}/intraday/{DATE_STR}")
+
+    historical = mini_midas.storage_codec.read_bars(mini_midas.common.get_historical_file_path("tsla", DATE_STR))
+    assert historical.minute.tolist() == minutes.tolist()
+    # official bars win the minutes both have
+    assert historical.close.tolist() == [2.0] * 60 + [1.0] * 330
+    bars, sources = mini_midas.bar_store.read_day_with_sources("tsla", DATE_STR)
+    assert bars.close.tolist() == historical.close.tolist()
+    assert sources[0] == mini_midas.merge.SOURCE_OFFICIAL
+    # the day is final for the aggregate cache
+    bar_path = mini_midas.bar_store.get_day_file_path("tsla", DATE_STR)
+    entry = next(entry for entry in mini_midas.manifest.load("tsla").entries if entry["path"] == bar_path)
+    assert entry["consolidated"]
+
+
+def test_thin_day_keeps_its_fragments(storage, bars_of):
+    minutes = session_minutes()
+    # 85% of the session
+    store_ticks(bars_of, minutes[:int(len(minutes) * 0.85)])
+    fragments = consolidate.find_fragments("tsla", DATE_STR)
+
+    result = run(storage)
+    assert not result["valid"]
+    assert result["pruned"] == 0
+    assert all(os.path.exists(path) for path in fragments)
+    # the historical file is still written, a later run with the rest of the day replaces it
+    assert os.path.exists(mini_midas.common.get_historical_file_path("tsla", DATE_STR))
+    bar_path = mini_midas.bar_store.get_day_file_path("tsla", DATE_STR)
+    assert not any(entry.get("consolidated") for entry in mini_midas.manifest.load("tsla").entries
+                   if entry["path"] == bar_path)
+
+    # the threshold is the caller's
+    assert run(storage, min_coverage=0.8)["valid"]
+
+
+def test_ticks_still_in_the_log_are_compacted_first(storage, bars_of):
+    minutes = session_minutes()
+    store_ticks(bars_of, minutes[:-10])
+    log = mini_midas.tick_log.TickLog("tsla", DATE_STR)
+    for minute in minutes[-10:]:
+        log.append(minute, 1.0, 1.0, 1.0, 1.0, 100)
+    log.close()
+
+    result = run(storage)
+    assert result["valid"]
+    assert result["in_session"] == 390
+
+
+def test_nothing_stored(storage):
+    result = run(storage)
+    assert result["bars"] == 0
+    assert not result["valid"]
+
+
+def test_consolidator_runs_every_ticker_in_worker_processes(storage, bars_of):
+    store_ticks(bars_of, session_minutes())
+    results = consolidate.consolidate(["tsla", "aapl"], DATE_STR, fetch=False, max_workers=2)
+    assert results["tsla"]["valid"]
+    assert results["aapl"]["bars"] == 0
+    assert len(mini_midas.bar_store.read_day("tsla", DATE_STR)) == 390
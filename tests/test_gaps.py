@@ -0,0 +1,148 @@
+import datetime
+import numpy as np
+import pytest
+import mini_midas
+
+
+gaps = mini_midas.gaps
+# a friday with a full session, and the saturday after it
+DATE_STR = "20261016"
+SATURDAY = "20261017"
+
+
+@pytest.mark.parametrize("minutes, start, end, expected", [
+    ([], 0, 5, [(0, 5)]),
+    ([0, 1, 2, 3, 4], 0, 5, []),
+    ([1, 2, 3, 4], 0, 5, [(0, 1)]),
+    ([0, 1, 2, 3], 0, 5, [(4, 5)]),
+    ([0, 4], 0, 5, [(1, 4)]),
+    ([0, 2, 4], 0, 5, [(1, 2), (3, 4)]),
+    # duplicates and minutes outside the range don't count
+    ([-3, 2, 2, 9], 0, 5, [(0, 2), (3, 5)]),
+    ([1], 5, 5, []),
+    ([1], 6, 5, []),
+])
+def test_missing_windows(minutes, start, end, expected):
+    assert gaps.missing_windows(minutes, start, end) == expected
+
+
+def test_missing_windows_cover_exactly_the_missing_minutes():
+    rng = np.random.default_rng(3)
+    for _ in range(50):
+        minutes = rng.integers(0, 100, rng.integers(0, 80))
+        windows = gaps.missing_windows(minutes, 10, 90)
+        missing = sorted(set(range(10, 90)) - set(minutes.tolist()))
+        assert [minute for start, end in windows for minute in range(start, end)] == missing
+        # maximal runs, two windows never touch
+        assert all(end < next_start for (_, end), (next_start, _) in zip(windows, windows[1:]))
+
+
+@pytest.mark.parametrize("windows, expected", [
+    ([], []),
+    ([(5, 8), (0, 2)], [(0, 2), (5, 8)]),
+    ([(0, 5), (3, 8)], [(0, 8)]),
+    ([(0, 5), (5, 8)], [(0, 8)]),
+    ([(0, 10), (2, 3)], [(0, 10)]),
+])
+def test_merge_windows(windows, expected):
+    assert gaps.merge_windows(windows) == expected
+
+
+@pytest.mark.parametrize("windows, covered, expected", [
+    ([(0, 10)], [], [(0, 10)]),
+    ([(0, 10)], [(0, 10)], []),
+    ([(0, 10)], [(-5, 20)], []),
+    ([(0, 10)], [(3, 5)], [(0, 3), (5, 10)]),
+    ([(0, 10)], [(0, 3)], [(3, 10)]),
+    ([(0, 10)], [(7, 12)], [(0, 7)]),
+    ([(0, 10)], [(1, 2), (4, 6), (8, 9)], [(0, 1), (2, 4), (6, 8), (9, 10)]),
+    ([(0, 4), (6, 10)], [(3, 7)], [(0, 3), (7, 10)]),
+    ([(0, 4)], [(10, 20)], [(0, 4)]),
+])
+def test_subtract_windows(windows, covered, expected):
+    assert gaps.subtract_windows(windows, covered) == expected
+
+
+def test_subtract_windows_matches_sets():
+    rng = np.random.default_rng(5)
+
+    def random_windows(count):
+        return gaps.merge_windows([(int(start), int(start + length)) for start, length in
+                                   zip(rng.integers(0, 100, count), rng.integers(1, 15, count))])
+
+    for _ in range(100):
+        windows, covered = random_windows(rng.integers(0, 6)), random_windows(rng.integers(0, 6))
+        remaining = gaps.subtract_windows(windows, covered)
+        minutes = {minute for start, end in windows for minute in range(start, end)}
+        minutes -= {minute for start, end in covered for minute in range(start, end)}
+        assert sorted(minute for start, end in remaining for minute in range(start, end)) == sorted(minutes)
+
+
+def test_clip_and_in_windows():
+    windows = [(0, 5), (10, 15), (20, 25)]
+    assert gaps.clip_windows(windows, 3, 12) == [(3, 5), (10, 12)]
+    assert gaps.clip_windows(windows, 5, 10) == []
+    mask = gaps.in_windows([-1, 0, 4, 5, 9, 10, 14, 15, 24, 25], windows)
+    assert mask.tolist() == [False, True, True, False, False, True, True, False, True, False]
+    assert gaps.in_windows([1, 2], []).tolist() == [False, False]
+    assert gaps.window_minutes(windows) == 15
+
+
+def session_bars(bars_of, holes=()):
+    session_open, session_close = gaps.session_minutes(DATE_STR)
+    minutes = np.arange(session_open, session_close)
+    for start, end in holes:
+        minutes = minutes[(minutes < start) | (minutes >= end)]
+    return bars_of(minutes)
+
+
+def test_find_gaps_after_the_close(storage, bars_of):
+    session_open, session_close = gaps.session_minutes(DATE_STR)
+    assert session_close - session_open == 390
+    hole = (session_open + 60, session_open + 75)
+    after_close = datetime.datetime(2026, 10, 16, 18, 0)
+
+    bars = session_bars(bars_of, [hole])
+    assert gaps.find_gaps("tsla", DATE_STR, bars, after_close) == [hole]
+    assert gaps.find_gaps("tsla", DATE_STR, session_bars(bars_of), after_close) == []
+    assert gaps.find_gaps("tsla", SATURDAY, bars_of([]), after_close) == []
+
+
+def test_find_gaps_stops_before_the_settling_minutes(storage, bars_of):
+    session_open, _ = gaps.session_minutes(DATE_STR)
+    # 10:00, the two minutes before are not expected yet
+    now = datetime.datetime(2026, 10, 16, 10, 0)
+    assert gaps.find_gaps("tsla", DATE_STR, bars_of([]), now) == [(session_open, session_open + 29)]
+
+
+def test_covered_windows_are_not_gaps(storage, bars_of):
+    session_open, _ = gaps.session_minutes(DATE_STR)
+    after_close = datetime.datetime(2026, 10, 16, 18, 0)
+    bars = session_bars(bars_of, [(session_open + 60, session_open + 75)])
+
+    coverage = gaps.Coverage("tsla", DATE_STR)
+    coverage.add([(session_open + 60, session_open + 70)], bars_filled=0)
+    coverage.save()
+
+    reloaded = gaps.Coverage("tsla", DATE_STR)
+    assert reloaded.windows == [(session_open + 60, session_open + 70)]
+    assert reloaded.fetches == 1
+    assert gaps.find_gaps("tsla", DATE_STR, bars, after_close) == [(session_open + 70, session_open + 75)]
+
+
+def test_outputsize_for():
+    now = datetime.datetime(2026, 10, 16, 15, 0)
+    now_minute = gaps.now_minute(now)
+    assert gaps.outputsize_for([], now) == "compact"
+    assert gaps.outputsize_for([(now_minute - 30, now_minute - 20)], now) == "compact"
+    assert gaps.outputsize_for([(now_minute - 300, now_minute - 290), (now_minute - 30, now_minute - 20)], now) == "full"
+
+
+def test_covered_by_response(bars_of):
+    windows = [(100, 110), (200, 210)]
+    assert gaps.covered_by_response(windows, bars_of([]), "full") == []
+    # compact only vouches from its first bar on, full from the start of the day
+    assert gaps.covered_by_response(windows, bars_of(np.arange(150, 220)), "compact") == [(200, 210)]
+    assert gaps.covered_by_response(windows, bars_of(np.arange(150, 220)), "full") == [(100, 110), (200, 210)]
+    # nothing after the newest bar is vouched for
+    assert gaps.covered_by_response(windows, bars_of(np.arange(90, 205)), "full") == [(100, 110), (200, 205)]
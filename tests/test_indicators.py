@@ -0,0 +1,138 @@
+import numpy as np
+import pytest
+import mini_midas
+
+
+indicators = mini_midas.indicators
+# 09:30 of 2026-10-16
+OPEN_MINUTE = mini_midas.series.date_string_to_minute("20261016") + 9 * 60 + 30
+
+
+@pytest.fixture
+def bars(bars_of):
+    rng = np.random.default_rng(4)
+    # two days of a random walk
+    minutes = np.concatenate([OPEN_MINUTE - mini_midas.series.MINUTES_PER_DAY + np.arange(60), OPEN_MINUTE + np.arange(90)])
+    bars = bars_of(minutes, close=100 + rng.normal(0, 0.5, len(minutes)).cumsum())
+    bars.high[:] = bars.close + rng.random(len(minutes))
+    bars.low[:] = bars.close - rng.random(len(minutes))
+    bars.volume[:] = rng.integers(1, 1000, len(minutes))
+    return bars
+
+
+def feed(engine, bars):
+    for index in range(len(bars)):
+        engine.on_bar(bars.minute[index], bars.open[index], bars.high[index], bars.low[index],
+                      bars.close[index], bars.volume[index])
+
+
+def assert_values_close(values, expected):
+    assert values.keys() == expected.keys()
+    for name, value in values.items():
+        if isinstance(value, dict):
+            assert value == pytest.approx(expected[name]), name
+        else:
+            assert value == pytest.approx(expected[name], rel=1e-9), name
+
+
+def test_indicator_is_abstract():
+    with pytest.raises(TypeError):
+        indicators.Indicator()
+
+
+def test_seeding_matches_streaming(bars):
+    seeded = indicators.IndicatorEngine("tsla", persist=False)
+    seeded.seed(bars)
+    streamed = indicators.IndicatorEngine("tsla", persist=False)
+    feed(streamed, bars)
+    assert_values_close(seeded.values(), streamed.values())
+
+    # and both keep agreeing on the bars that follow
+    more = bars.take(slice(len(bars) - 10, len(bars)))
+    more.minute[:] += 10
+    feed(seeded, more)
+    feed(streamed, more)
+    assert_values_close(seeded.values(), streamed.values())
+
+
+def test_values_match_plain_formulas(bars):
+    engine = indicators.IndicatorEngine("tsla", persist=False)
+    engine.seed(bars)
+    values = engine.values()
+    closes = bars.close
+
+    assert values["sma_20"] == pytest.approx(closes[-20:].mean())
+    bollinger = values["bollinger_20"]
+    assert bollinger["upper"] == pytest.approx(closes[-20:].mean() + 2 * closes[-20:].std())
+    assert bollinger["lower"] == pytest.approx(closes[-20:].mean() - 2 * closes[-20:].std())
+
+    ema = closes[0]
+    for close in closes[1:]:
+        ema += 2.0 / 13 * (close - ema)
+    assert values["ema_12"] == pytest.approx(ema)
+
+    today = bars.between(OPEN_MINUTE, OPEN_MINUTE + mini_midas.series.MINUTES_PER_DAY)
+    assert values["vwap"] == pytest.approx(np.dot(today.typical, today.volume) / today.volume.sum())
+    assert values["high_low"] == pytest.approx({"high": today.high.max(), "low": today.low.min()})
+
+
+def test_rsi():
+    rsi = indicators.RSI(3)
+    for close in (1.0, 2.0, 3.0):
+        rsi.update({"close": close})
+    # two changes are not a period yet
+    assert rsi.value() is None
+    rsi.update({"close": 4.0})
+    assert rsi.value() == 100.0
+    # plain means of the first period, then wilder's smoothing
+    rsi.update({"close": 1.0})
+    average_gain, average_loss = 1.0 * 2 / 3, 3.0 / 3
+    assert rsi.value() == pytest.approx(100 - 100 / (1 + average_gain / average_loss))
+    # peeking doesn't change the state
+    assert rsi.peek({"close": 10.0}) > rsi.value()
+    assert rsi.value() == pytest.approx(100 - 100 / (1 + average_gain / average_loss))
+
+
+def test_short_windows_have_no_value():
+    sma, bollinger = indicators.SMA(3), indicators.Bollinger(3)
+    for close in (1.0, 2.0):
+        sma.update({"close": close})
+        bollinger.update({"close": close})
+    assert sma.value() is None
+    assert bollinger.value() is None
+    assert sma.peek({"close": 3.0}) == 2.0
+    assert indicators.EMA(5).value() is None
+
+
+def test_pending_bar_of_the_same_minute_is_replaced(bars_of):
+    engine = indicators.IndicatorEngine("tsla", {"sma": indicators.SMA(2)}, persist=False)
+    engine.on_bar(OPEN_MINUTE, 1.0, 1.0, 1.0, 1.0, 1)
+    engine.on_bar(OPEN_MINUTE + 1, 2.0, 2.0, 2.0, 2.0, 1)
+    engine.on_bar(OPEN_MINUTE + 1, 4.0, 4.0, 4.0, 4.0, 1)
+    assert engine.values()["sma"] == 2.5
+    # a quote older than the pending bar is ignored
+    engine.on_bar(OPEN_MINUTE, 9.0, 9.0, 9.0, 9.0, 1)
+    assert engine.values()["sma"] == 2.5
+    assert list(engine.indicators["sma"].closes) == [1.0]
+
+
+def test_state_survives_a_restart(storage, bars):
+    engine = indicators.IndicatorEngine("tsla")
+    engine.seed(bars)
+    date_str = mini_midas.series.minute_to_date_string(OPEN_MINUTE)
+    # another process reads the values from the state file
+    assert_values_close(indicators.read_values("tsla", date_str), engine.values())
+
+    restored = indicators.IndicatorEngine.load("tsla", date_str)
+    assert_values_close(restored.values(), engine.values())
+    feed(restored, bars_of_next_minute(bars))
+    feed(engine, bars_of_next_minute(bars))
+    assert_values_close(restored.values(), engine.values())
+    assert indicators.IndicatorEngine.load("tsla", "20261015") is None
+    assert indicators.read_values("aapl", date_str) == {}
+
+
+def bars_of_next_minute(bars):
+    last = bars.take(slice(len(bars) - 1, len(bars)))
+    last.minute[:] += 1
+    return last
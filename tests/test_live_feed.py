@@ -0,0 +1,159 @@
+import threading
+import uuid
+import numpy as np
+import pytest
+import mini_midas
+
+
+live_feed = mini_midas.live_feed
+
+
+@pytest.fixture
+def ticker(monkeypatch):
+    """
+    a ring of its own for every test, removed afterwards
+    """
+    monkeypatch.setattr(live_feed, "NAMESPACE", f"test{uuid.uuid4().hex[:12]}")
+    yield "tsla"
+    live_feed.unlink("tsla")
+
+
+def make_reader(ticker):
+    reader = live_feed.LiveFeedReader(ticker)
+    reader.REATTACH_SECONDS = 0.0
+    return reader
+
+
+def publish(writer, minute, price=None, volume=1):
+    price = float(minute) if price is None else price
+    writer.publish(minute, price, price, price, price, volume)
+
+
+def test_reader_without_writer_is_empty(ticker):
+    reader = make_reader(ticker)
+    assert len(reader.read_new()) == 0
+    assert not reader.is_attached
+
+
+def test_reads_what_was_published(ticker):
+    writer = live_feed.LiveFeedWriter(ticker)
+    reader = make_reader(ticker)
+    for minute in (1, 2, 3):
+        publish(writer, minute)
+
+    bars = reader.read_new()
+    assert bars.minute.tolist() == [1, 2, 3]
+    assert bars.close.tolist() == [1.0, 2.0, 3.0]
+
+    # the newest bar seen is read again, it may still change
+    publish(writer, 4)
+    assert reader.read_new().minute.tolist() == [3, 4]
+    writer.close()
+    reader.close()
+
+
+def test_same_minute_rewrites_the_newest_record(ticker):
+    writer = live_feed.LiveFeedWriter(ticker)
+    reader = make_reader(ticker)
+    publish(writer, 1)
+    publish(writer, 2, price=10.0)
+    assert reader.read_new().close.tolist() == [1.0, 10.0]
+
+    publish(writer, 2, price=11.0, volume=5)
+    assert int(writer.ring.header[live_feed.COUNT_FIELD]) == 2
+    bars = reader.read_new()
+    assert bars.minute.tolist() == [2]
+    assert bars.close.tolist() == [11.0]
+    assert bars.volume.tolist() == [5]
+    writer.close()
+    reader.close()
+
+
+def test_wrapped_ring_keeps_the_newest_bars(ticker):
+    writer = live_feed.LiveFeedWriter(ticker, capacity=8)
+    reader = make_reader(ticker)
+    publish(writer, 0)
+    assert reader.read_new().minute.tolist() == [0]
+
+    overruns = live_feed.OVERRUNS.get()
+    for minute in range(1, 20):
+        publish(writer, minute)
+    assert reader.read_new().minute.tolist() == list(range(12, 20))
+    # 1 to 11 were overwritten before the reader came back
+    assert live_feed.OVERRUNS.get() - overruns == 11
+    writer.close()
+    reader.close()
+
+
+def test_reader_is_kept_out_of_a_publish_in_progress(ticker):
+    writer = live_feed.LiveFeedWriter(ticker)
+    reader = make_reader(ticker)
+    publish(writer, 1)
+    reader.read_new()
+
+    # a writer stopped half way through a publish leaves the sequence odd
+    writer.ring.header[live_feed.SEQUENCE_FIELD] += 1
+    reader.RETRIES = 3
+    assert reader.snapshot() is None
+    assert len(reader.read_new()) == 0
+
+    # a restarted writer finishes it, readers carry on with the same ring
+    writer.close()
+    restarted = live_feed.LiveFeedWriter(ticker)
+    assert int(restarted.ring.header[live_feed.SEQUENCE_FIELD]) % 2 == 0
+    publish(restarted, 2)
+    assert reader.read_new().minute.tolist() == [1, 2]
+    restarted.close()
+    reader.close()
+
+
+def test_reader_follows_a_new_ring(ticker):
+    writer = live_feed.LiveFeedWriter(ticker)
+    reader = make_reader(ticker)
+    for minute in (1, 2, 3):
+        publish(writer, minute)
+    assert len(reader.read_new()) == 3
+    writer.close()
+
+    live_feed.unlink(ticker)
+    writer = live_feed.LiveFeedWriter(ticker)
+    publish(writer, 10)
+    # nothing new in the old ring, the reader looks for a replacement and starts it from the beginning
+    assert reader.read_new().minute.tolist() == [10]
+    writer.close()
+    reader.close()
+
+
+def test_concurrent_reads_are_consistent(ticker):
+    """
+    every record carries its minute in every column, a torn read would mix two records
+    """
+    writer = live_feed.LiveFeedWriter(ticker, capacity=64)
+    reader = make_reader(ticker)
+    total = 20000
+    done = threading.Event()
+
+    def write():
+        for minute in range(1, total + 1):
+            writer.publish(minute, float(minute), float(minute), float(minute), float(minute), minute)
+            if minute % 7 == 0:
+                # a second quote of the same minute
+                writer.publish(minute, float(minute), float(minute), float(minute), float(minute), minute)
+        done.set()
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    newest = 0
+    while not done.is_set() or newest < total:
+        bars = reader.read_new()
+        if not len(bars):
+            continue
+        for name in ('open', 'high', 'low', 'close'):
+            assert np.array_equal(getattr(bars, name), bars.minute.astype(np.float64))
+        assert np.array_equal(bars.volume, bars.minute)
+        assert bars.minute[0] >= newest
+        newest = int(bars.minute[-1])
+    thread.join()
+    assert newest == total
+    writer.close()
+    reader.close()
@@ -0,0 +1,111 @@
+import datetime
+import pytest
+import mini_midas
+
+
+market_calendar = mini_midas.market_calendar
+CALENDAR = market_calendar.CALENDAR
+EASTERN = market_calendar.EASTERN
+
+
+def eastern(*args) -> datetime.datetime:
+    return datetime.datetime(*args, tzinfo=EASTERN)
+
+
+@pytest.mark.parametrize("year, expected", [
+    (2024, datetime.date(2024, 3, 31)),
+    (2025, datetime.date(2025, 4, 20)),
+    (2026, datetime.date(2026, 4, 5)),
+])
+def test_easter_sunday(year, expected):
+    assert market_calendar.easter_sunday(year) == expected
+
+
+def test_nth_weekday():
+    # martin luther king jr. day, memorial day, thanksgiving
+    assert market_calendar.nth_weekday(2026, 1, 0, 3) == datetime.date(2026, 1, 19)
+    assert market_calendar.nth_weekday(2026, 5, 0, -1) == datetime.date(2026, 5, 25)
+    assert market_calendar.nth_weekday(2026, 11, 3, 4) == datetime.date(2026, 11, 26)
+    assert market_calendar.nth_weekday(2026, 12, 0, -1) == datetime.date(2026, 12, 28)
+
+
+def test_holidays_of_2026():
+    assert sorted(market_calendar.holidays(2026)) == [
+        datetime.date(2026, 1, 1), datetime.date(2026, 1, 19), datetime.date(2026, 2, 16),
+        datetime.date(2026, 4, 3), datetime.date(2026, 5, 25), datetime.date(2026, 6, 19),
+        # independence day is a saturday, observed on friday
+        datetime.date(2026, 7, 3), datetime.date(2026, 9, 7), datetime.date(2026, 11, 26),
+        datetime.date(2026, 12, 25),
+    ]
+
+
+def test_special_cases():
+    # new year's day 2022 was a saturday, the friday before stayed a trading day
+    assert CALENDAR.is_trading_day(datetime.date(2021, 12, 31))
+    assert CALENDAR.is_holiday(datetime.date(2025, 1, 9))
+    # no juneteenth before 2022
+    assert CALENDAR.is_trading_day(datetime.date(2021, 6, 18))
+    assert not CALENDAR.is_holiday(datetime.date(2026, 10, 17))
+    with pytest.raises(Exception):
+        CALENDAR.session(datetime.date(1999, 1, 4))
+
+
+def test_half_days():
+    assert CALENDAR.is_half_day(datetime.date(2026, 11, 27))
+    assert CALENDAR.is_half_day(datetime.date(2026, 12, 24))
+    assert CALENDAR.session(datetime.date(2026, 12, 24))[1] == eastern(2026, 12, 24, 13, 0)
+    # july 3rd 2026 is the observed independence day, a closure and no half day
+    assert not CALENDAR.is_trading_day(datetime.date(2026, 7, 3))
+    assert not CALENDAR.is_half_day(datetime.date(2026, 7, 3))
+    assert CALENDAR.is_half_day(datetime.date(2025, 7, 3))
+
+    assert market_calendar.is_open(eastern(2026, 12, 24, 12, 59))
+    assert not market_calendar.is_open(eastern(2026, 12, 24, 13, 0))
+    assert market_calendar.has_closed(eastern(2026, 12, 24, 13, 0))
+    assert market_calendar.last_close(eastern(2026, 12, 24, 14, 0)) == eastern(2026, 12, 24, 13, 0)
+
+
+def test_open_and_close_lookups():
+    friday_noon = eastern(2026, 10, 16, 12, 0)
+    assert market_calendar.is_open(friday_noon)
+    assert market_calendar.seconds_until_open(friday_noon) == 0.0
+    assert market_calendar.seconds_until_close(friday_noon) == 4 * 3600
+    assert market_calendar.next_close(friday_noon) == eastern(2026, 10, 16, 16, 0)
+    assert market_calendar.last_close(friday_noon) == eastern(2026, 10, 15, 16, 0)
+    # a naive datetime is the US/Eastern wall clock
+    assert market_calendar.is_open(datetime.datetime(2026, 10, 16, 9, 30))
+    assert not market_calendar.is_open(datetime.datetime(2026, 10, 16, 9, 29))
+
+    saturday = eastern(2026, 10, 17, 12, 0)
+    assert market_calendar.has_closed(saturday)
+    assert market_calendar.next_open(saturday) == eastern(2026, 10, 19, 9, 30)
+    assert market_calendar.last_close(saturday) == eastern(2026, 10, 16, 16, 0)
+
+
+@pytest.mark.parametrize("friday_close, monday_open, hours", [
+    # daylight saving time starts on sunday march 8th, the weekend is an hour shorter
+    (eastern(2026, 3, 6, 16, 0), eastern(2026, 3, 9, 9, 30), 64.5),
+    # and ends on sunday november 1st, an hour longer
+    (eastern(2026, 10, 30, 16, 0), eastern(2026, 11, 2, 9, 30), 66.5),
+])
+def test_sleep_across_dst_changes(friday_close, monday_open, hours):
+    assert market_calendar.next_open(friday_close) == monday_open
+    assert market_calendar.seconds_until_open(friday_close) == hours * 3600
+    # opens are 09:30 on the wall clock whatever the offset
+    assert monday_open.utcoffset() != friday_close.utcoffset()
+
+
+def test_set_clock():
+    class FixedClock:
+        def now(self):
+            return datetime.datetime(2026, 10, 16, 17, 0, tzinfo=datetime.timezone.utc)
+
+        def sleep(self, seconds):
+            pass
+
+    original = market_calendar.set_clock(FixedClock())
+    try:
+        assert market_calendar.now_eastern() == eastern(2026, 10, 16, 13, 0)
+        assert market_calendar.is_open()
+    finally:
+        assert isinstance(market_calendar.set_clock(original), FixedClock)
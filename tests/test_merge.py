@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+import mini_midas
+
+
+merge = mini_midas.merge
+
+
+def reference_merge(runs, precedence):
+    """
+    dict based merge the vectorized one has to agree with: stronger source, then later run, then later bar
+    """
+    best = {}
+    for run_index, (bars, source) in enumerate(runs):
+        sources = merge.source_array(source, len(bars))
+        for index in range(len(bars)):
+            key = (int(precedence[sources[index]]), run_index, index)
+            minute = int(bars.minute[index])
+            if minute not in best or key >= best[minute][0]:
+                best[minute] = (key, float(bars.close[index]), int(sources[index]))
+    minutes = sorted(best)
+    return minutes, [best[minute][1] for minute in minutes], [best[minute][2] for minute in minutes]
+
+
+def test_equal_sources_go_to_the_later_run(bars_of):
+    old = bars_of([1, 2, 3], close=10.0)
+    new = bars_of([2, 3, 4], close=20.0)
+    bars, sources, stats = merge.merge_runs([(old, merge.SOURCE_SYNTHESIZED), (new, merge.SOURCE_SYNTHESIZED)])
+
+    assert bars.minute.tolist() == [1, 2, 3, 4]
+    assert bars.close.tolist() == [10.0, 20.0, 20.0, 20.0]
+    assert sources.tolist() == [merge.SOURCE_SYNTHESIZED] * 4
+    assert (stats.inputs, stats.outputs, stats.duplicates, stats.conflicts) == (6, 4, 2, 2)
+    assert not stats.overrides
+
+
+def test_official_wins_whatever_the_order(bars_of):
+    official = bars_of([1, 2], close=10.0)
+    ticks = bars_of([2, 3], close=20.0)
+    for runs in ([(official, merge.SOURCE_OFFICIAL), (ticks, merge.SOURCE_SYNTHESIZED)],
+                 [(ticks, merge.SOURCE_SYNTHESIZED), (official, merge.SOURCE_OFFICIAL)]):
+        bars, sources, stats = merge.merge_runs(runs)
+        assert bars.minute.tolist() == [1, 2, 3]
+        assert bars.close.tolist() == [10.0, 10.0, 20.0]
+        assert sources.tolist() == [merge.SOURCE_OFFICIAL, merge.SOURCE_OFFICIAL, merge.SOURCE_SYNTHESIZED]
+        assert stats.overrides == {"official>synthesized": 1}
+
+
+def test_identical_duplicates_are_not_conflicts(bars_of):
+    bars, _, stats = merge.merge_runs([(bars_of([1, 2]), merge.SOURCE_UNKNOWN), (bars_of([2]), merge.SOURCE_UNKNOWN)])
+    assert bars.minute.tolist() == [1, 2]
+    assert stats.duplicates == 1
+    assert stats.conflicts == 0
+
+
+def test_per_bar_sources(bars_of):
+    stored = bars_of([1, 2, 3], close=10.0)
+    stored_sources = np.array([merge.SOURCE_OFFICIAL, merge.SOURCE_SYNTHESIZED, merge.SOURCE_UNKNOWN], dtype=np.uint8)
+    ticks = bars_of([1, 2, 3], close=20.0)
+    bars, sources, _ = merge.merge_runs([(stored, stored_sources), (ticks, merge.SOURCE_SYNTHESIZED)])
+
+    # unknown ranks above synthesized by default, equal synthesized goes to the later run
+    assert bars.close.tolist() == [10.0, 20.0, 10.0]
+    assert sources.tolist() == [merge.SOURCE_OFFICIAL, merge.SOURCE_SYNTHESIZED, merge.SOURCE_UNKNOWN]
+
+
+def test_later_bar_of_one_run_wins(bars_of):
+    run = bars_of([1, 1, 2], close=[10.0, 11.0, 12.0])
+    bars, _, stats = merge.merge_runs([(run, merge.SOURCE_OFFICIAL)])
+    assert bars.minute.tolist() == [1, 2]
+    assert bars.close.tolist() == [11.0, 12.0]
+    assert stats.duplicates == 1
+
+
+def test_custom_precedence(bars_of):
+    precedence = merge.parse_precedence("synthesized,official,unknown")
+    bars, _, stats = merge.merge_runs(
+        [(bars_of([1], close=20.0), merge.SOURCE_SYNTHESIZED), (bars_of([1], close=10.0), merge.SOURCE_OFFICIAL)],
+        precedence)
+    assert bars.close.tolist() == [20.0]
+    assert stats.overrides == {"synthesized>official": 1}
+
+
+@pytest.mark.parametrize("spec", ["official,synthesized", "official,unknown,synthesized,official", "official,bogus,unknown"])
+def test_precedence_has_to_order_every_source(spec):
+    with pytest.raises(Exception):
+        merge.parse_precedence(spec)
+
+
+def test_empty_runs():
+    bars, sources, stats = merge.merge_runs([(mini_midas.series.Bars(), merge.SOURCE_OFFICIAL)])
+    assert len(bars) == 0
+    assert len(sources) == 0
+    assert stats.inputs == 0
+    assert len(merge.merge_runs([])[0]) == 0
+
+
+def test_matches_reference_on_random_runs(bars_of):
+    rng = np.random.default_rng(1)
+    for _ in range(100):
+        runs = []
+        for _ in range(rng.integers(1, 5)):
+            minutes = np.sort(rng.integers(0, 30, rng.integers(0, 20)))
+            sources = rng.integers(0, len(merge.SOURCE_CODES), len(minutes)).astype(np.uint8)
+            runs.append((bars_of(minutes, close=rng.random(len(minutes))), sources))
+        bars, sources, stats = merge.merge_runs(runs)
+
+        minutes, closes, expected_sources = reference_merge(runs, merge.PRECEDENCE)
+        assert bars.minute.tolist() == minutes
+        assert bars.close.tolist() == closes
+        assert sources.tolist() == expected_sources
+        assert stats.outputs == len(minutes)
+        assert stats.inputs == sum(len(run_bars) for run_bars, _ in runs)
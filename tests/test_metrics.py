@@ -0,0 +1,28 @@
+import urllib.request
+import mini_midas
+
+
+metrics = mini_midas.metrics
+
+
+def test_server_listens_on_localhost_by_default():
+    registry = metrics.Registry()
+    registry.register(metrics.Counter, "test_calls_total", "calls", ("ticker",)).inc(3, ticker="tsla")
+    server = metrics.MetricsServer(port=0, registry=registry).start()
+    try:
+        assert server.httpd.server_address[0] == "127.0.0.1"
+        with urllib.request.urlopen(server.url, timeout=5) as response:
+            body = response.read().decode()
+        assert 'test_calls_total{ticker="tsla"} 3' in body
+    finally:
+        server.stop()
+
+
+def test_reporting_binds_the_configured_host(monkeypatch, storage):
+    monkeypatch.setenv("MINI_MIDAS_METRICS_PORT", "0")
+    monkeypatch.setenv("MINI_MIDAS_METRICS_HOST", "0.0.0.0")
+    reporting = metrics.Reporting("test")
+    try:
+        assert reporting.server.httpd.server_address[0] == "0.0.0.0"
+    finally:
+        reporting.server.httpd.server_close()
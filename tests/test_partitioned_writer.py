@@ -0,0 +1,39 @@
+import os
+import mini_midas
+
+
+partitioned_writer = mini_midas.partitioned_writer
+DATE_STR = "20261015"
+# 09:30 of DATE_STR
+OPEN_MINUTE = mini_midas.series.date_string_to_minute(DATE_STR) + 9 * 60 + 30
+
+
+def submit(writer, minute):
+    assert writer.submit_bar("tsla", minute, 1.0, 1.0, 1.0, float(minute), 100)
+
+
+def test_bars_reach_the_log_of_their_day(storage):
+    writer = partitioned_writer.PartitionedWriter().start()
+    next_day = OPEN_MINUTE + mini_midas.series.MINUTES_PER_DAY
+    for minute in (OPEN_MINUTE, OPEN_MINUTE + 1, next_day):
+        submit(writer, minute)
+    writer.close()
+
+    logged, _ = mini_midas.tick_log.read_records(mini_midas.common.get_tick_log_path("tsla", DATE_STR))
+    assert logged.minute.tolist() == [OPEN_MINUTE, OPEN_MINUTE + 1]
+    next_date = mini_midas.series.minute_to_date_string(next_day)
+    assert os.path.exists(mini_midas.common.get_tick_log_path("tsla", next_date))
+    # the day rolled, its log was compacted into the bar store
+    assert len(mini_midas.bar_store.read_day("tsla", DATE_STR)) == 2
+
+
+def test_every_bar_reports_its_sync_latency(storage):
+    latencies = []
+    writer = partitioned_writer.PartitionedWriter(batch_size=4, on_synced=latencies.extend).start()
+    for offset in range(10):
+        submit(writer, OPEN_MINUTE + offset)
+    writer.close()
+
+    assert len(latencies) == 10
+    assert all(latency >= 0 for latency in latencies)
+    assert writer.unsynced == {}
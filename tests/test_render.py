@@ -0,0 +1,101 @@
+import os
+import numpy as np
+import pytest
+import mini_midas
+
+
+render = mini_midas.render
+DATE_STR = "20261016"
+
+
+@pytest.fixture
+def renderer():
+    pytest.importorskip("matplotlib")
+    return render.ChartRenderer(figsize=(4, 2), dpi=50)
+
+
+def store_bars(bars_of, ticker="tsla", count=30, close=None):
+    session_open, _ = mini_midas.gaps.session_minutes(DATE_STR)
+    mini_midas.bar_store.merge_bars(
+        ticker, bars_of(session_open + np.arange(count), close=close), mini_midas.merge.SOURCE_OFFICIAL)
+
+
+def test_title(bars_of):
+    bars = bars_of([1, 2, 3], close=[10.0, 12.0, 11.0])
+    assert render.get_title("tsla", bars, DATE_STR, DATE_STR) == \
+        "tsla  20261016  last 11.00 (+10.00%)  high 12.00 low 10.00"
+    assert "20261015-20261016" in render.get_title("tsla", bars, "20261015", DATE_STR)
+
+
+def test_fingerprint_follows_the_day_files(storage, bars_of):
+    assert render.source_files("tsla", DATE_STR, DATE_STR) == []
+    empty = render.fingerprint("tsla", DATE_STR, DATE_STR, "png", (4, 2), 50)
+    store_bars(bars_of)
+    stored = render.fingerprint("tsla", DATE_STR, DATE_STR, "png", (4, 2), 50)
+    assert stored != empty
+    assert stored == render.fingerprint("tsla", DATE_STR, DATE_STR, "png", (4, 2), 50)
+    # chart settings count as well
+    assert stored != render.fingerprint("tsla", DATE_STR, DATE_STR, "svg", (4, 2), 50)
+    assert stored != render.fingerprint("tsla", DATE_STR, DATE_STR, "png", (4, 2), 100)
+    # days outside the range don't
+    next_open, _ = mini_midas.gaps.session_minutes("20261019")
+    mini_midas.bar_store.merge_bars("tsla", bars_of([next_open]), mini_midas.merge.SOURCE_OFFICIAL)
+    assert stored == render.fingerprint("tsla", DATE_STR, DATE_STR, "png", (4, 2), 50)
+
+
+def test_render_skips_unchanged_charts(storage, bars_of, renderer):
+    output = str(storage / "charts")
+    assert renderer.render("tsla", DATE_STR, DATE_STR, output, "png") == "empty"
+    assert not os.path.exists(output)
+
+    store_bars(bars_of)
+    assert renderer.render("tsla", DATE_STR, DATE_STR, output, "png") == "rendered"
+    image_path = f"{output}/tsla.png"
+    with open(image_path, 'rb') as fil:
+        assert fil.read(8) == b"\x89PNG\r\n\x1a\n"
+    assert render.read_fingerprint(image_path) == render.fingerprint("tsla", DATE_STR, DATE_STR, "png", (4, 2), 50)
+    # no temp files left behind
+    assert sorted(os.listdir(output)) == ["tsla.png", f"tsla.png{render.FINGERPRINT_SUFFIX}"]
+
+    assert renderer.render("tsla", DATE_STR, DATE_STR, output, "png") == "skipped"
+    assert renderer.render("tsla", DATE_STR, DATE_STR, output, "png", force=True) == "rendered"
+
+    # a rewritten day file draws the chart again
+    store_bars(bars_of, count=60, close=5.0)
+    assert renderer.render("tsla", DATE_STR, DATE_STR, output, "png") == "rendered"
+    assert renderer.render("tsla", DATE_STR, DATE_STR, output, "png") == "skipped"
+
+
+def test_one_figure_for_every_chart(storage, bars_of, renderer):
+    output = str(storage / "charts")
+    store_bars(bars_of, "tsla")
+    store_bars(bars_of, "aapl", count=10)
+    renderer.render("tsla", DATE_STR, DATE_STR, output, "svg")
+    line = renderer.line
+    renderer.render("aapl", DATE_STR, DATE_STR, output, "svg")
+    assert renderer.line is line
+    assert len(renderer.ax.lines) == 1
+    assert len(line.get_xdata()) == 10
+    assert renderer.ax.get_title().startswith("aapl")
+    with open(f"{output}/aapl.svg", 'r') as fil:
+        assert "<svg" in fil.read()
+
+
+def test_unsupported_format(storage):
+    with pytest.raises(Exception):
+        render.render_charts(["tsla"], DATE_STR, DATE_STR, image_format="jpg")
+    assert render.render_charts([], DATE_STR, DATE_STR) == {}
+
+
+def test_render_charts_in_worker_processes(storage, bars_of):
+    pytest.importorskip("matplotlib")
+    store_bars(bars_of, "tsla")
+    store_bars(bars_of, "aapl")
+    tickers = ["tsla", "aapl", "nvda"]
+    statuses = render.render_charts(tickers, DATE_STR, DATE_STR, max_workers=2, figsize=(4, 2), dpi=50)
+    assert statuses == {"tsla": "rendered", "aapl": "rendered", "nvda": "empty"}
+    output = render.get_output_path(DATE_STR, DATE_STR)
+    assert os.path.exists(f"{output}/tsla.png")
+
+    statuses = render.render_charts(tickers, DATE_STR, DATE_STR, max_workers=2, figsize=(4, 2), dpi=50)
+    assert statuses == {"tsla": "skipped", "aapl": "skipped", "nvda": "empty"}
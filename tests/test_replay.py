@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+import mini_midas
+
+
+replay = mini_midas.replay
+# a thursday and a friday, the friday is replayed
+PREVIOUS_DATE = "20261015"
+DATE_STR = "20261016"
+
+
+def at(date_str, hour, minute):
+    return mini_midas.series.date_string_to_minute(date_str) + hour * 60 + minute
+
+
+def store(root, date_str, bars, ticker="tsla"):
+    mini_midas.bar_store.write_file(
+        f"{root}/bars/{ticker}/{ticker}.{date_str}{mini_midas.bar_store.FILE_SUFFIX}", bars,
+        mini_midas.merge.SOURCE_OFFICIAL)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    return replay.ReplayEngine(["tsla"], DATE_STR, DATE_STR, max_workers=1,
+                               source=str(tmp_path / "source"), output=str(tmp_path / "output"))
+
+
+def test_quotes_accumulate_like_the_api(bars_of):
+    bars = bars_of([at(DATE_STR, 9, 30), at(DATE_STR, 9, 31), at(DATE_STR, 9, 32)], close=[10.0, 12.0, 9.0])
+    bars.high[:] = bars.close + 1
+    bars.low[:] = bars.close - 1
+    stream = replay.QuoteStream("tsla", bars, previous_close=8.0)
+
+    quote = stream.quote(2)["Global Quote"]
+    assert quote["01. symbol"] == "TSLA"
+    assert quote["02. open"] == "10.0000"
+    assert quote["03. high"] == "13.0000"
+    assert quote["04. low"] == "8.0000"
+    assert quote["05. price"] == "9.0000"
+    assert quote["06. volume"] == "300"
+    assert quote["07. latest trading day"] == "2026-10-16"
+    assert quote["08. previous close"] == "8.0000"
+    assert quote["09. change"] == "1.0000"
+    assert quote["10. change percent"] == "12.5000%"
+
+
+def test_previous_close_is_the_last_session_bar(engine, bars_of):
+    # the after hours bar isn't the close the api reports
+    store(engine.source, PREVIOUS_DATE, bars_of(
+        [at(PREVIOUS_DATE, 15, 58), at(PREVIOUS_DATE, 15, 59), at(PREVIOUS_DATE, 17, 0)], close=[7.0, 8.0, 9.0]))
+    store(engine.source, DATE_STR, bars_of([at(DATE_STR, 9, 30)], close=10.0))
+
+    assert engine.previous_close("tsla", DATE_STR) == 8.0
+    assert engine.load_day(DATE_STR)["tsla"].previous_close == 8.0
+    # the friday is the previous session of the monday
+    assert engine.previous_close("tsla", "20261019") == 10.0
+
+
+def test_previous_close_falls_back_to_the_open(engine, bars_of):
+    bars = bars_of([at(DATE_STR, 9, 30)], close=10.0)
+    bars.open[:] = 9.5
+    store(engine.source, DATE_STR, bars)
+    assert engine.previous_close("tsla", DATE_STR) is None
+    assert engine.load_day(DATE_STR)["tsla"].previous_close == 9.5
+
+
+def test_replayed_day_is_stored_like_the_source(engine, bars_of):
+    minutes = at(DATE_STR, 9, 30) + np.arange(30)
+    store(engine.source, DATE_STR, bars_of(minutes))
+    stats = engine.run()
+
+    assert stats["days"] == 1
+    assert stats["quotes"] == 30
+    original = mini_midas.common.DATA_STORAGE_PATH
+    mini_midas.common.DATA_STORAGE_PATH = engine.output
+    try:
+        bars = mini_midas.bar_store.read_day("tsla", DATE_STR)
+    finally:
+        mini_midas.common.DATA_STORAGE_PATH = original
+    assert bars.minute.tolist() == minutes.tolist()
+    assert bars.close.tolist() == minutes.astype(float).tolist()
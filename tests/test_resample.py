@@ -0,0 +1,82 @@
+import numpy as np
+import mini_midas
+
+
+resample = mini_midas.resample
+PAST_DATE = "20261015"
+
+
+def day_minute(date_str, hour, minute):
+    return mini_midas.series.date_string_to_minute(date_str) + hour * 60 + minute
+
+
+def cached_immutable(date_str, interval="5m"):
+    with np.load(resample.get_cache_path("tsla", date_str, interval)) as cached:
+        return bool(cached['immutable'])
+
+
+def test_buckets_are_aligned_to_the_clock(bars_of):
+    start = day_minute(PAST_DATE, 9, 30)
+    bars = bars_of(start + np.array([0, 1, 4, 5, 12]), close=[1.0, 3.0, 2.0, 5.0, 4.0])
+    bars.high[:] = bars.close + 1
+    bars.low[:] = bars.close - 1
+    bars.volume[:] = [10, 20, 30, 40, 0]
+
+    aggregates = resample.resample(bars, 5)
+    assert aggregates['minute'].tolist() == [start, start + 5, start + 10]
+    assert aggregates['open'].tolist() == [1.0, 5.0, 4.0]
+    assert aggregates['high'].tolist() == [4.0, 6.0, 5.0]
+    assert aggregates['low'].tolist() == [0.0, 4.0, 3.0]
+    assert aggregates['close'].tolist() == [2.0, 5.0, 4.0]
+    assert aggregates['volume'].tolist() == [60, 40, 0]
+    # typical price is the close here, weighted by volume
+    assert np.isclose(aggregates['vwap'][0], (1.0 * 10 + 3.0 * 20 + 2.0 * 30) / 60)
+    # no volume, no vwap, the close stands in
+    assert aggregates['vwap'][2] == 4.0
+
+
+def test_daily_bars_group_the_calendar_day(bars_of):
+    bars = bars_of([day_minute(PAST_DATE, 4, 0), day_minute(PAST_DATE, 19, 59), day_minute("20261016", 9, 30)])
+    aggregates = resample.resample(bars, resample.INTERVALS['1d'])
+    assert aggregates['minute'].tolist() == [day_minute(PAST_DATE, 0, 0), day_minute("20261016", 0, 0)]
+    assert aggregates['volume'].tolist() == [200, 100]
+
+
+def test_today_is_recomputed_after_the_close(storage, bars_of):
+    today, _ = mini_midas.common.split_date_string()
+    mini_midas.bar_store.merge_bars("tsla", bars_of([day_minute(today, 9, 30)]))
+    assert len(resample.get_aggregates("tsla", today, "5m")['minute']) == 1
+    assert not cached_immutable(today)
+
+    # the official post-close pull lands after the first read
+    mini_midas.bar_store.merge_bars("tsla", bars_of([day_minute(today, 15, 59)]), mini_midas.merge.SOURCE_OFFICIAL)
+    assert len(resample.get_aggregates("tsla", today, "5m")['minute']) == 2
+
+
+def test_past_day_is_recomputed_until_consolidated(storage, bars_of):
+    mini_midas.bar_store.merge_bars("tsla", bars_of([day_minute(PAST_DATE, 9, 30)]))
+    resample.get_aggregates("tsla", PAST_DATE, "5m")
+    assert not cached_immutable(PAST_DATE)
+
+    # a backfill fills the rest of the day
+    mini_midas.bar_store.merge_bars("tsla", bars_of([day_minute(PAST_DATE, 10, 0)]))
+    assert len(resample.get_aggregates("tsla", PAST_DATE, "5m")['minute']) == 2
+
+
+def test_consolidated_day_is_immutable(storage, bars_of):
+    path = mini_midas.bar_store.get_day_file_path("tsla", PAST_DATE)
+    mini_midas.bar_store.merge_bars("tsla", bars_of([day_minute(PAST_DATE, 9, 30)]))
+    fingerprint = resample.source_fingerprint("tsla", PAST_DATE)
+
+    # a stale fingerprint, the file changed since consolidation wrote it
+    mini_midas.manifest.mark_consolidated("tsla", path, fingerprint + 1)
+    resample.get_aggregates("tsla", PAST_DATE, "5m")
+    assert not cached_immutable(PAST_DATE)
+
+    mini_midas.manifest.mark_consolidated("tsla", path, fingerprint)
+    resample.get_aggregates("tsla", PAST_DATE, "15m")
+    assert cached_immutable(PAST_DATE, "15m")
+    # a rewrite drops the flag again
+    mini_midas.bar_store.merge_bars("tsla", bars_of([day_minute(PAST_DATE, 10, 0)]))
+    resample.get_aggregates("tsla", PAST_DATE, "1h")
+    assert not cached_immutable(PAST_DATE, "1h")
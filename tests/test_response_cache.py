@@ -0,0 +1,118 @@
+import datetime
+import types
+import pytest
+import mini_midas
+
+
+response_cache = mini_midas.response_cache
+EASTERN = mini_midas.market_calendar.EASTERN
+QUOTE = {"Global Quote": {"05. price": "1.0"}}
+
+
+@pytest.fixture
+def at(monkeypatch):
+    """
+    moves the market clock and the expiry clock to a US/Eastern wall clock time
+    """
+    def move(*args):
+        now = datetime.datetime(*args, tzinfo=EASTERN)
+        monkeypatch.setattr(mini_midas.market_calendar, "CLOCK", types.SimpleNamespace(now=lambda: now))
+        monkeypatch.setattr(response_cache, "time", types.SimpleNamespace(time=now.timestamp))
+    return move
+
+
+class CountingFetch:
+    def __init__(self, payload=QUOTE):
+        self.payload = payload
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.payload
+
+
+def test_make_key():
+    assert response_cache.make_key("TIME_SERIES_INTRADAY", "TSLA", "1min") == (
+        "TIME_SERIES_INTRADAY", "tsla", "1min", "compact", "")
+    assert response_cache.make_key("GLOBAL_QUOTE", "tsla") == ("GLOBAL_QUOTE", "tsla", "", "", "")
+
+
+@pytest.mark.parametrize("now, month, expected", [
+    # friday during the session
+    ((2026, 10, 16, 12, 0), None, 55),
+    ((2026, 10, 16, 12, 0), "2026-10", 55),
+    # a finished month doesn't change anymore, whatever the time
+    ((2026, 10, 16, 12, 0), "2026-09", response_cache.MONTH_TTL),
+    ((2026, 10, 16, 18, 0), "2026-09", response_cache.MONTH_TTL),
+    # after the close late bars still come in, a few minutes only
+    ((2026, 10, 16, 18, 0), None, response_cache.AFTER_CLOSE_TTL),
+    ((2026, 10, 16, 18, 0), "2026-10", response_cache.AFTER_CLOSE_TTL),
+    ((2026, 10, 17, 12, 0), None, response_cache.AFTER_CLOSE_TTL),
+])
+def test_ttl(at, now, month, expected):
+    at(*now)
+    cache = response_cache.ResponseCache(use_disk=False)
+    assert cache.ttl(response_cache.make_key("TIME_SERIES_INTRADAY", "tsla", "1min", "full", month)) == expected
+
+
+def test_functions_without_ttl_are_not_cached(at):
+    at(2026, 10, 16, 12, 0)
+    cache = response_cache.ResponseCache(use_disk=False)
+    fetch = CountingFetch()
+    key = response_cache.make_key("OVERVIEW", "tsla")
+    assert cache.ttl(key) == 0
+    cache.get(key, fetch)
+    cache.get(key, fetch)
+    assert fetch.calls == 2
+
+
+def test_memory_hits_until_expiry(at):
+    at(2026, 10, 16, 12, 0, 0)
+    cache = response_cache.ResponseCache(use_disk=False)
+    fetch = CountingFetch()
+    key = response_cache.make_key("GLOBAL_QUOTE", "tsla")
+    assert cache.get(key, fetch) == QUOTE
+    at(2026, 10, 16, 12, 0, 54)
+    assert cache.get(key, fetch) == QUOTE
+    assert fetch.calls == 1
+    at(2026, 10, 16, 12, 0, 55)
+    cache.get(key, fetch)
+    assert fetch.calls == 2
+    assert cache.stats == {"misses": 2, "memory_hits": 1}
+
+
+def test_errors_are_not_cached(at):
+    at(2026, 10, 16, 12, 0)
+    cache = response_cache.ResponseCache(use_disk=False)
+    fetch = CountingFetch({"Note": "Thank you for using Alpha Vantage!"})
+    key = response_cache.make_key("GLOBAL_QUOTE", "tsla")
+    cache.get(key, fetch)
+    cache.get(key, fetch)
+    assert fetch.calls == 2
+
+
+def test_disk_tier_is_shared(at, storage):
+    at(2026, 10, 16, 12, 0)
+    key = response_cache.make_key("TIME_SERIES_INTRADAY", "tsla", "1min", "full", "2026-09")
+    fetch = CountingFetch()
+    response_cache.ResponseCache().get(key, fetch)
+    # another process, nothing in its memory
+    other = response_cache.ResponseCache()
+    assert other.get(key, fetch) == QUOTE
+    assert fetch.calls == 1
+    assert other.stats["disk_hits"] == 1
+
+    at(2026, 10, 17, 12, 1)
+    assert response_cache.ResponseCache().get(key, fetch) == QUOTE
+    assert fetch.calls == 2
+
+
+def test_memory_is_bounded(at):
+    at(2026, 10, 16, 12, 0)
+    cache = response_cache.ResponseCache(capacity=2, use_disk=False)
+    fetch = CountingFetch()
+    for symbol in ("a", "b", "a", "c"):
+        cache.get(response_cache.make_key("GLOBAL_QUOTE", symbol), fetch)
+    # b was the least recently used
+    assert [key[1] for key in cache.memory] == ["a", "c"]
+    assert fetch.calls == 3
@@ -0,0 +1,119 @@
+import concurrent.futures
+import types
+import pytest
+import mini_midas
+
+
+scheduler = mini_midas.scheduler
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    monotonic time that only moves when the scheduler sleeps
+    """
+    fake = types.SimpleNamespace(now=1000.0, sleeps=[])
+    fake.monotonic = lambda: fake.now
+    fake.time = lambda: fake.now
+
+    def sleep(seconds):
+        fake.sleeps.append(seconds)
+        fake.now += seconds
+
+    fake.sleep = sleep
+    monkeypatch.setattr(scheduler, "time", fake)
+    return fake
+
+
+class FakeRetriever:
+    def __init__(self, gap_check_due=False, gaps_filled=None):
+        self.gap_check_due = gap_check_due
+        self.gaps_filled = gaps_filled
+        self.calls = []
+
+    def start(self):
+        self.calls.append("start")
+
+    def is_gap_check_due(self):
+        return self.gap_check_due
+
+    def fill_gaps(self):
+        self.calls.append("fill_gaps")
+        return self.gaps_filled
+
+    def poll_once(self):
+        self.calls.append("poll_once")
+        return {"Global Quote": {}}
+
+    def close_tick_log(self):
+        self.calls.append("close_tick_log")
+
+
+def test_token_bucket_paces_calls(clock):
+    bucket = scheduler.TokenBucket(rate=5, per=60.0)
+    # a full bucket lets the first burst through without waiting
+    assert [bucket.acquire() for _ in range(5)] == [0.0] * 5
+    # then one token every 12 seconds
+    assert bucket.try_acquire() == pytest.approx(12.0)
+    assert bucket.acquire() == pytest.approx(12.0)
+    clock.now += 6.0
+    assert bucket.try_acquire() == pytest.approx(6.0)
+    clock.now += 600.0
+    # refills never go above the capacity
+    assert [bucket.try_acquire() for _ in range(5)] == [0.0] * 5
+    assert bucket.try_acquire() > 0
+
+
+def make_scheduler(retriever, started=True):
+    fetch_scheduler = scheduler.FetchScheduler(["tsla"], token="test")
+    state = fetch_scheduler.states["tsla"]
+    state.retriever = retriever
+    state.started = started
+    return fetch_scheduler, state
+
+
+def test_first_call_bootstraps(storage):
+    fetch_scheduler, state = make_scheduler(FakeRetriever(), started=False)
+    assert fetch_scheduler.fetch(state)
+    assert state.started
+    assert state.retriever.calls == ["start"]
+
+
+@pytest.mark.parametrize("gaps_filled, expected_calls", [
+    (None, ["fill_gaps", "poll_once"]),
+    (0, ["fill_gaps"]),
+    (12, ["fill_gaps"]),
+])
+def test_gap_check_without_gaps_still_polls(storage, gaps_filled, expected_calls):
+    fetch_scheduler, state = make_scheduler(FakeRetriever(gap_check_due=True, gaps_filled=gaps_filled))
+    assert fetch_scheduler.fetch(state)
+    assert state.retriever.calls == expected_calls
+
+
+def test_failed_fetch_restarts_the_ticker(storage):
+    retriever = FakeRetriever()
+    fetch_scheduler, state = make_scheduler(retriever)
+    state.in_flight = True
+    future = concurrent.futures.Future()
+    future.set_exception(Exception("boom"))
+    fetch_scheduler.on_fetch_done(state, future)
+
+    assert retriever.calls == ["close_tick_log"]
+    assert state.retriever is None
+    assert not state.started
+    assert not state.in_flight
+    assert state.failures == 1
+
+    future = concurrent.futures.Future()
+    future.set_result(True)
+    fetch_scheduler.on_fetch_done(state, future)
+    assert state.failures == 0
+    assert state.last_success is not None
+
+
+def test_new_session_bootstraps_every_ticker_again(storage):
+    fetch_scheduler, state = make_scheduler(FakeRetriever())
+    fetch_scheduler.new_session()
+    assert not state.started
+    fetch_scheduler.fetch(state)
+    assert state.retriever.calls == ["start"]
@@ -0,0 +1,91 @@
+import gzip
+import itertools
+import numpy as np
+import pytest
+import mini_midas
+
+
+storage_codec = mini_midas.storage_codec
+META = {"2. Symbol": "tsla", "4. Interval": "1min"}
+# 09:30 of 2026-10-16
+OPEN_MINUTE = mini_midas.series.date_string_to_minute("20261016") + 9 * 60 + 30
+
+
+def payload(bars) -> dict:
+    return storage_codec.bars_to_av_json(META, bars)
+
+
+@pytest.fixture
+def bars(bars_of):
+    rng = np.random.default_rng(2)
+    bars = bars_of(OPEN_MINUTE + np.sort(rng.choice(390, 200, replace=False)),
+                   close=np.round(100 + rng.normal(0, 1, 200).cumsum(), 4), volume=300)
+    bars.high[:] = np.round(bars.close + 0.25, 4)
+    bars.low[:] = np.round(bars.close - 0.25, 4)
+    return bars
+
+
+def assert_same_bars(read, expected):
+    for name in mini_midas.series.COLUMNS:
+        assert np.array_equal(getattr(read, name), getattr(expected, name)), name
+
+
+@pytest.mark.parametrize("compression, encoding", list(itertools.product(storage_codec.COMPRESSIONS, storage_codec.ENCODINGS)))
+def test_every_codec_round_trips(bars, compression, encoding):
+    data = storage_codec.Codec(compression, None, encoding).dumps(payload(bars))
+    assert_same_bars(storage_codec.loads_bars(data), bars)
+    json_obj = storage_codec.loads(data)
+    assert json_obj["Meta Data"] == META
+    assert json_obj[mini_midas.series.TIME_SERIES_KEY] == bars.to_time_series()
+
+
+def test_legacy_files_are_plain_gzip(bars):
+    data = storage_codec.Codec.parse("gzip:1").dumps(payload(bars))
+    assert gzip.decompress(data).startswith(b"{")
+    assert storage_codec.sniff(data)[:2] == ("gzip", "av_json")
+    assert storage_codec.sniff(storage_codec.Codec.parse("zlib:1:delta").dumps(payload(bars)))[:2] == ("zlib", "delta")
+
+
+def test_delta_keeps_prices_finer_than_ticks(bars):
+    json_obj = payload(bars)
+    first_bar = json_obj[mini_midas.series.TIME_SERIES_KEY][mini_midas.series.minutes_to_timestamps(bars.minute[:1])[0]]
+    first_bar["4. close"] = "100.123456"
+    read = storage_codec.loads_bars(storage_codec.Codec.parse("zlib:6:delta").dumps(json_obj))
+    assert read.close[0] == 100.123456
+    assert np.array_equal(read.close[1:], bars.close[1:])
+
+
+def test_empty_day(bars_of):
+    for encoding in storage_codec.ENCODINGS:
+        data = storage_codec.Codec("gzip", 1, encoding).dumps(payload(bars_of([])))
+        assert len(storage_codec.loads_bars(data)) == 0
+
+
+def test_parse_and_errors():
+    codec = storage_codec.Codec.parse("lzma::delta")
+    assert (codec.compression, codec.level, codec.encoding) == ("lzma", 6, "delta")
+    assert repr(storage_codec.Codec.parse("bz2")) == "bz2:9:av_json"
+    with pytest.raises(Exception):
+        storage_codec.Codec.parse("snappy")
+    with pytest.raises(Exception):
+        storage_codec.Codec.parse("gzip:1:xml")
+    with pytest.raises(Exception, match="Unknown storage file format"):
+        storage_codec.loads(b"plain text")
+
+
+def test_tiers(storage, bars, monkeypatch):
+    assert repr(storage_codec.TIER_CODECS[storage_codec.TIER_HOT]) == "gzip:1:av_json"
+    assert repr(storage_codec.TIER_CODECS[storage_codec.TIER_COLD]) == "gzip:9:av_json"
+    hour_path = mini_midas.common.get_intraday_file_path("tsla", "20261016", 9)
+    day_path = mini_midas.common.get_historical_file_path("tsla", "20261016")
+    assert storage_codec.tier_of_path(hour_path) == storage_codec.TIER_HOT
+    assert storage_codec.tier_of_path(day_path) == storage_codec.TIER_COLD
+
+    # files of different codecs are read side by side
+    monkeypatch.setitem(storage_codec.TIER_CODECS, storage_codec.TIER_COLD, storage_codec.Codec.parse("lzma:6:delta"))
+    storage_codec.write_json(hour_path, payload(bars))
+    storage_codec.write_json(day_path, payload(bars))
+    assert storage_codec.sniff(storage_codec.read_file(day_path))[:2] == ("lzma", "delta")
+    assert_same_bars(storage_codec.read_bars(hour_path), bars)
+    assert_same_bars(storage_codec.read_bars(day_path), bars)
+    assert storage_codec.read_json(day_path)["Meta Data"] == META
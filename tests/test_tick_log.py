@@ -0,0 +1,106 @@
+import os
+import numpy as np
+import mini_midas
+
+
+tick_log = mini_midas.tick_log
+DATE_STR = "20261015"
+# 09:30 of DATE_STR
+OPEN_MINUTE = mini_midas.series.date_string_to_minute(DATE_STR) + 9 * 60 + 30
+
+
+def at(*offsets) -> np.ndarray:
+    return OPEN_MINUTE + np.array(offsets, dtype=np.int64)
+
+
+def write_log(bars, ticker="tsla", date_str=DATE_STR):
+    log = tick_log.TickLog(ticker, date_str)
+    for index in range(len(bars)):
+        log.append(bars.minute[index], bars.open[index], bars.high[index], bars.low[index],
+                   bars.close[index], bars.volume[index])
+    log.close()
+    return log.path
+
+
+def test_records_round_trip(storage, bars_of):
+    bars = bars_of(at(0, 1, 2))
+    path = write_log(bars)
+
+    logged, offset = tick_log.read_records(path)
+    assert offset == 3 * tick_log.RECORD_SIZE
+    assert logged.minute.tolist() == bars.minute.tolist()
+    assert logged.close.tolist() == bars.close.tolist()
+    assert logged.volume.tolist() == bars.volume.tolist()
+
+    # only records after the offset
+    logged, _ = tick_log.read_records(path, tick_log.RECORD_SIZE * 2)
+    assert logged.minute.tolist() == [OPEN_MINUTE + 2]
+
+
+def test_torn_record_is_cut_off(storage, bars_of):
+    path = write_log(bars_of(at(0, 1)))
+    with open(path, 'ab') as fil:
+        fil.write(b"\x01" * (tick_log.RECORD_SIZE // 2))
+
+    # reading ignores the partial record, reopening for writes truncates it
+    logged, offset = tick_log.read_records(path)
+    assert len(logged) == 2
+    tick_log.TickLog("tsla", DATE_STR).close()
+    assert os.path.getsize(path) == offset
+
+
+def test_recover_without_log_is_empty(storage):
+    assert len(tick_log.recover("tsla", DATE_STR)) == 0
+
+
+def test_recover_merges_store_and_log(storage, bars_of):
+    official = bars_of(at(0, 1, 2), close=10.0)
+    mini_midas.bar_store.merge_bars("tsla", official, mini_midas.merge.SOURCE_OFFICIAL)
+    # two quotes of the same minute, the later one is the tick
+    write_log(bars_of(at(2, 3, 4, 4), close=[20.0, 20.0, 20.0, 21.0]))
+
+    bars = tick_log.recover("tsla", DATE_STR)
+    assert bars.minute.tolist() == at(0, 1, 2, 3, 4).tolist()
+    # the official bar keeps its minute, ticks only fill what the store doesn't have
+    assert bars.close.tolist() == [10.0, 10.0, 10.0, 20.0, 21.0]
+
+
+def test_compaction_folds_once(storage, bars_of):
+    # minutes of two hours
+    bars = bars_of(at(0, 1, 40))
+    path = write_log(bars)
+
+    assert tick_log.compact_log("tsla", DATE_STR) == 3
+    assert tick_log.read_offset(path) == os.path.getsize(path)
+    stored, sources = mini_midas.bar_store.read_day_with_sources("tsla", DATE_STR)
+    assert stored.minute.tolist() == bars.minute.tolist()
+    assert set(sources.tolist()) == {mini_midas.merge.SOURCE_SYNTHESIZED}
+    for hour in (9, 10):
+        assert os.path.exists(mini_midas.common.get_intraday_file_path("tsla", DATE_STR, hour))
+
+    # nothing new, nothing folded
+    assert tick_log.compact_log("tsla", DATE_STR) == 0
+    write_log(bars_of(at(41)))
+    assert tick_log.compact_log("tsla", DATE_STR) == 1
+    assert len(mini_midas.bar_store.read_day("tsla", DATE_STR)) == 4
+
+
+def test_compaction_keeps_official_bars(storage, bars_of):
+    mini_midas.bar_store.merge_bars("tsla", bars_of(at(0), close=10.0), mini_midas.merge.SOURCE_OFFICIAL)
+    write_log(bars_of(at(0, 1), close=20.0))
+    tick_log.compact_log("tsla", DATE_STR)
+    assert mini_midas.bar_store.read_day("tsla", DATE_STR).close.tolist() == [10.0, 20.0]
+
+
+def test_only_compacted_logs_are_removed(storage, bars_of):
+    path = write_log(bars_of(at(0)))
+    assert not tick_log.LogCompactor.remove_compacted_log("tsla", DATE_STR)
+    assert os.path.exists(path)
+
+    tick_log.compact_log("tsla", DATE_STR)
+    assert tick_log.LogCompactor.remove_compacted_log("tsla", DATE_STR)
+    assert not os.path.exists(path)
+    assert not os.path.exists(f"{path}{tick_log.OFFSET_SUFFIX}")
+    assert tick_log.list_logs() == []
+    # one lock file per ticker is all that stays behind
+    assert sorted(os.listdir(os.path.dirname(path))) == ["tsla.lock"]